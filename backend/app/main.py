@@ -1,14 +1,32 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, List, Optional
+import asyncio
+import json
 import os
-import shutil
 from dotenv import load_dotenv
 
 from app.services.claude_ocr_service import ClaudeOCRService
-from app.services.calculator import CompensatorCalculator
-from app.models.schemas import CalculationRequest, CalculationResult
+from app.services.http_transport import TransportConfig, VisionTransport
+from app.services.image_preprocess import ImagePreprocessor
+from app.services.ocr_backends import merge_token_usage
+from app.services.ocr_cache import OCRCache
+from app.services.ocr_router import OCRRouter
+from app.services.ocr_service import OCRService
+from app.services.job_queue import FINISHED_STATUSES, JobFailedError, JobQueue, JobQueueFullError, validate_webhook_url
+from app.services.upload_ingest import (
+    IngestedUpload, RequestSizeLimitMiddleware, UploadRejectedError, ingest_upload, cleanup_uploads
+)
+from app.services.calculator import TG_PHI_DOMYSLNY, CompensatorCalculator
+from app.services.invoice_aggregator import InvoiceAggregator
+from app.services.catalog import CompensatorCatalog
+from app.services.vectorized_calculator import VectorizedCalculator
+from app.services.batch_calculator import detect_format, iter_batch_results, parse_batch
+from app.services.offer_service import OfferEngine, OfferSizingError, OfferUnavailableError
+from app.models.schemas import CalculationRequest, CalculationResult, OfferRequest
 
 # Load environment variables
 load_dotenv()
@@ -20,7 +38,15 @@ app = FastAPI(
     version="1.1.0"
 )
 
-# CORS - pozwól na requesty z frontendu
+# Maksymalny rozmiar pojedynczego pliku (sprawdzany przy zapisie do pliku tymczasowego)
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(10 * 1024 * 1024)))
+
+# Limit całego requestu - pilnowany już w trakcie odbierania body, zanim
+# Starlette zapisze multipart na dysk (domyślnie 10 faktur + 1 MB na pola formularza)
+MAX_REQUEST_SIZE = int(os.getenv("MAX_REQUEST_SIZE", str(10 * MAX_FILE_SIZE + 1024 * 1024)))
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_REQUEST_SIZE)
+
+# CORS - pozwól na requesty z frontendu (dodany jako ostatni = zewnętrzny, więc 413 też ma nagłówki CORS)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://127.0.0.1:5173", "*"],
@@ -29,19 +55,103 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services - Claude Vision API
+# Initialize services - Vision API (Claude, opcjonalnie GPT-4o jako drugi backend)
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-if not ANTHROPIC_API_KEY:
-    print("⚠️  WARNING: ANTHROPIC_API_KEY nie jest ustawiony! OCR nie będzie działał.")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if not ANTHROPIC_API_KEY and not OPENAI_API_KEY:
+    print("⚠️  WARNING: brak ANTHROPIC_API_KEY i OPENAI_API_KEY! Działa tylko odczyt z warstwy tekstowej PDF.")
     print("⚠️  Ustaw klucz API w pliku .env")
 
-ocr_service = ClaudeOCRService(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
-calculator = CompensatorCalculator()
+# Ile faktur analizujemy równolegle (limit zapytań do Claude naraz)
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+
+# Cache wyników OCR (ta sama faktura = bez ponownego wywołania Claude)
+ocr_cache = OCRCache(
+    db_path=os.getenv("OCR_CACHE_PATH", "./cache/ocr_cache.sqlite3"),
+    ttl_s=int(os.getenv("OCR_CACHE_TTL", str(30 * 24 * 3600))),
+    max_entries=int(os.getenv("OCR_CACHE_MAX_ENTRIES", "5000"))
+)
+
+# Wspólna pula połączeń HTTP dla backendów Vision + deadline, ponowienia, circuit breaker
+vision_transport = VisionTransport(TransportConfig(
+    max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "10")),
+    keepalive_expiry_s=float(os.getenv("HTTP_KEEPALIVE_S", "30")),
+    http2=os.getenv("HTTP_HTTP2", "false").lower() == "true",
+    connect_timeout_s=float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "10")),
+    deadline_s=float(os.getenv("OCR_DEADLINE_S", "120")),
+    max_retries=int(os.getenv("OCR_MAX_RETRIES", "4")),
+    retry_budget_ratio=float(os.getenv("OCR_RETRY_BUDGET_RATIO", "0.2")),
+    breaker_failures=int(os.getenv("OCR_BREAKER_FAILURES", "5")),
+    breaker_reset_s=float(os.getenv("OCR_BREAKER_RESET_S", "30"))
+))
+
+# Preprocessing zdjęć faktur (obrót, kadr, skala szarości, zmniejszenie) w puli procesów
+image_preprocessor = ImagePreprocessor(
+    workers=int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2")),
+    max_px=int(os.getenv("IMAGE_MAX_PX", "1568")),
+    byte_budget=int(os.getenv("IMAGE_BYTE_BUDGET", "350000")),
+    grayscale=os.getenv("IMAGE_GRAYSCALE", "true").lower() == "true"
+)
+
+vision_backends = []
+if ANTHROPIC_API_KEY:
+    vision_backends.append(ClaudeOCRService(
+        api_key=ANTHROPIC_API_KEY, transport=vision_transport, preprocessor=image_preprocessor
+    ))
+if OPENAI_API_KEY:
+    vision_backends.append(OCRService(
+        api_key=OPENAI_API_KEY, transport=vision_transport, preprocessor=image_preprocessor
+    ))
+
+# Router OCR: cache -> warstwa tekstowa PDF -> najszybszy zdrowy backend Vision
+ocr_service = OCRRouter(
+    backends=vision_backends,
+    cache=ocr_cache,
+    max_concurrency=OCR_MAX_CONCURRENCY,
+    hedge=os.getenv("OCR_HEDGE", "false").lower() == "true",
+    invoice_deadline_s=float(os.getenv("OCR_INVOICE_DEADLINE_S", "90")),
+    lite_hedge_delay_s=float(os.getenv("OCR_LITE_HEDGE_DELAY_S", "20")),
+    pack_mode=os.getenv("OCR_PACK_MODE", "auto").lower(),
+    max_backend_calls=int(os.getenv("OCR_MAX_BACKEND_CALLS", str(3 * OCR_MAX_CONCURRENCY)))
+)
+
+# Katalog kompensatorów: wbudowane LOPI LKD + pliki JSON/CSV (przeładowywane bez restartu)
+compensator_catalog = CompensatorCatalog(
+    builtin=CompensatorCalculator.COMPENSATORS_DB,
+    sources=[p.strip() for p in os.getenv("COMPENSATOR_CATALOG_PATHS", "").split(",") if p.strip()],
+    reload_interval_s=float(os.getenv("COMPENSATOR_CATALOG_RELOAD_S", "5"))
+)
+
+calculator = CompensatorCalculator(catalog=compensator_catalog)
+vectorized_calculator = VectorizedCalculator(catalog=compensator_catalog, optimizer=calculator.optimizer)
 
-# Upload directory
-UPLOAD_DIR = "./uploads"
+# Oferty HTML/PDF: cennik i szablon generatora ofert (ten sam kod co CLI),
+# cennik przeładowywany bez restartu
+offer_engine = OfferEngine(
+    generator_dir=os.getenv("OFFER_GENERATOR_DIR", "../generator-ofert"),
+    cennik_path=os.getenv("OFFER_CENNIK_PATH") or None,
+    reload_interval_s=float(os.getenv("OFFER_CENNIK_RELOAD_S", "5"))
+)
+
+# Upload directory - pliki tymczasowe, usuwane po każdym requeście
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Co ile sekund strumień SSE sprawdza postęp zadania
+JOB_EVENTS_POLL_S = float(os.getenv("JOB_EVENTS_POLL_S", "0.5"))
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    """
+    422 jak domyślnie w FastAPI, ale bez odsyłania wartości wejściowych
+
+    Domyślna odpowiedź zawiera "input" - dla NaN/Infinity z body nie da się
+    jej zapisać jako JSON i zamiast 422 leciał błąd 500.
+    """
+    errors = [{"type": e["type"], "loc": list(e["loc"]), "msg": e["msg"]} for e in exc.errors()]
+    return JSONResponse(status_code=422, content={"detail": errors})
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -49,7 +159,7 @@ async def root():
         "status": "online",
         "service": "KompensatorPRO API (Claude Vision)",
         "version": "1.2.0",
-        "ocr_enabled": ANTHROPIC_API_KEY is not None,
+        "ocr_enabled": bool(vision_backends),
         "ocr_model": "claude-sonnet-4-5"
     }
 
@@ -69,9 +179,51 @@ async def calculate_manual(request: CalculationRequest):
         )
         result.zrodlo_danych = "manual"
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Błąd obliczenia: {str(e)}")
 
+@app.post("/api/calculate-batch")
+async def calculate_batch(request: Request):
+    """
+    Obliczenia wsadowe kompensatorów (np. cała sieć sklepów)
+
+    Przyjmuje tablicę JSON, NDJSON albo CSV z polami CalculationRequest
+    (energia_bierna, okres_mc, tg_phi, ma_pv, opcjonalnie id) - w body
+    (Content-Type: application/json, application/x-ndjson, text/csv)
+    albo jako plik w multipart/form-data (pole "file").
+
+    Returns:
+        Strumień NDJSON - jedna linia z wynikiem (lub błędem) na wiersz
+    """
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Brak pliku w polu 'file'")
+        body = await upload.read()
+        fmt = detect_format(upload.content_type, upload.filename)
+    else:
+        body = await request.body()
+        fmt = detect_format(content_type)
+
+    if len(body) > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="Za duże dane wsadowe")
+
+    try:
+        rows = parse_batch(body.decode("utf-8-sig"), fmt)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Niepoprawne dane wsadowe: {str(e)}")
+
+    # Synchroniczny generator - Starlette iteruje go w puli wątków
+    return StreamingResponse(
+        iter_batch_results(vectorized_calculator, rows),
+        media_type="application/x-ndjson"
+    )
+
 @app.post("/api/analyze-invoices")
 async def analyze_invoices(
     files: List[UploadFile] = File(...),
@@ -88,91 +240,469 @@ async def analyze_invoices(
         CalculationResult z rekomendacją
     """
 
-    if not ocr_service:
-        raise HTTPException(
-            status_code=503,
-            detail="OCR nie jest dostępny. Brak klucza API OpenAI."
-        )
+    if len(files) == 0:
+        raise HTTPException(status_code=400, detail="Nie przesłano żadnych plików")
+
+    if len(files) > 10:
+        raise HTTPException(status_code=400, detail="Maksymalnie 10 faktur na raz")
+
+    uploads = []
+    try:
+        # 1. Przyjmij pliki - strumieniowo do plików tymczasowych
+        # (limit rozmiaru, typ po magic bytes, SHA-256 liczony w locie)
+        for file in files:
+            uploads.append(await ingest_upload(file, UPLOAD_DIR, MAX_FILE_SIZE))
+
+        # 2-4. OCR + agregacja + obliczenia w puli wątków - PyMuPDF i Claude API
+        # są synchroniczne, a event loop musi dalej obsługiwać /api/calculate i /api/health
+        return JSONResponse(content=await run_in_threadpool(_run_ocr_pipeline, uploads, ma_pv))
 
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Błąd przetwarzania: {str(e)}")
+
+    finally:
+        # Cleanup - usuń pliki tymczasowe
+        cleanup_uploads(uploads)
+
+def _sse(event: str, data: dict) -> str:
+    """Jedno zdarzenie Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/analyze-invoices/stream")
+async def analyze_invoices_stream(
+    files: List[UploadFile] = File(...),
+    ma_pv: Optional[bool] = Form(False)
+):
+    """
+    Analiza faktur z postępem na żywo (Server-Sent Events)
+
+    Zdarzenia:
+        invoice: wynik OCR jednej faktury, zaraz po jej przeanalizowaniu
+        provisional: wstępny CalculationResult z faktur odczytanych do tej pory
+        result: końcowa odpowiedź - identyczna z /api/analyze-invoices
+        error: błąd ({"status_code", "detail"}) - jak HTTPException w wersji bez strumienia
+    """
     if len(files) == 0:
         raise HTTPException(status_code=400, detail="Nie przesłano żadnych plików")
 
     if len(files) > 10:
         raise HTTPException(status_code=400, detail="Maksymalnie 10 faktur na raz")
 
-    saved_paths = []
+    uploads = []
     try:
-        # 1. Zapisz przesłane pliki
         for file in files:
-            # Walidacja typu pliku
-            if not file.content_type.startswith(('image/', 'application/pdf')):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Nieprawidłowy typ pliku: {file.filename}. Dozwolone: JPG, PNG, PDF"
-                )
-
-            # Zapisz plik
-            file_path = os.path.join(UPLOAD_DIR, file.filename)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-
-            saved_paths.append(file_path)
-
-        # 2. Przeanalizuj faktury przez OCR
-        print(f"📸 Analizuję {len(saved_paths)} faktur przez GPT-4 Vision...")
-        ocr_results = ocr_service.analyze_multiple_invoices(saved_paths)
-
-        # 3. Agreguj dane
-        aggregated = ocr_service.aggregate_invoice_data(ocr_results)
-
-        if not aggregated.get("success"):
-            raise HTTPException(
-                status_code=400,
-                detail=aggregated.get("error", "Nie udało się odczytać faktur")
-            )
-
-        # 4. Oblicz kompensator
-        print(f"🔢 Obliczam kompensator...")
-        result = calculator.calculate_from_multiple_invoices(
-            faktury=aggregated["faktury"],
-            ma_pv=ma_pv
+            uploads.append(await ingest_upload(file, UPLOAD_DIR, MAX_FILE_SIZE))
+    except UploadRejectedError as e:
+        cleanup_uploads(uploads)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    return StreamingResponse(
+        _ocr_events(uploads, ma_pv),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _ocr_events(uploads: List[IngestedUpload], ma_pv: bool):
+    """Strumień SSE dla /api/analyze-invoices/stream"""
+    loop = asyncio.get_running_loop()
+    finished: asyncio.Queue = asyncio.Queue()
+
+    def on_result(index: int, ocr_result: dict) -> None:
+        # Wywoływane z wątków OCR - przekazujemy wynik do event loopa
+        loop.call_soon_threadsafe(finished.put_nowait, (index, ocr_result))
+
+    def run_ocr() -> List[dict]:
+        print(f"📸 Analizuję {len(uploads)} faktur przez Claude Vision (stream)...")
+        return ocr_service.analyze_multiple_invoices(
+            [u.path for u in uploads],
+            file_names=[u.file_name for u in uploads],
+            file_hashes=[u.sha256 for u in uploads],
+            on_result=on_result
         )
 
-        # 5. Dodaj szczegóły OCR do wyniku
-        return JSONResponse(content={
-            **result.model_dump(),
-            "ocr_details": {
-                "faktury_sukces": len(aggregated["faktury"]),
-                "faktury_blad": len(aggregated.get("failed_invoices", [])),
-                "szczegoly": ocr_results
-            }
+    # OCR działa dalej nawet gdy klient się rozłączy - pliki sprzątamy dopiero po nim
+    ocr = asyncio.ensure_future(run_in_threadpool(run_ocr))
+    ocr.add_done_callback(lambda _: cleanup_uploads(uploads))
+    ocr.add_done_callback(lambda _: finished.put_nowait(None))
+
+    aggregator = InvoiceAggregator()
+    done = 0
+    while True:
+        item = await finished.get()
+        if item is None:
+            break
+        index, ocr_result = item
+        done += 1
+        progress = {"gotowe": done, "wszystkie": len(uploads)}
+
+        yield _sse("invoice", {"index": index, **progress, "wynik": ocr_result})
+
+        if ocr_result.get("success"):
+            # Sumy dokładne - kolejność kończenia faktur nie zmienia wyniku
+            aggregator.add(ocr_result)
+            provisional = calculator.calculate_from_aggregate(aggregator, ma_pv)
+            yield _sse("provisional", {**progress, "wynik": provisional.model_dump()})
+
+    try:
+        yield _sse("result", _summarize_ocr_results(await ocr, ma_pv))
+    except HTTPException as e:
+        yield _sse("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        yield _sse("error", {"status_code": 500, "detail": f"Błąd przetwarzania: {str(e)}"})
+
+def _run_ocr_pipeline(
+    uploads: List[IngestedUpload],
+    ma_pv: bool,
+    on_result: Optional[Callable[[int, dict], None]] = None
+) -> dict:
+    """
+    OCR faktur, agregacja danych i obliczenie kompensatora
+
+    Funkcja blokująca (PyMuPDF, synchroniczny klient Claude) - wywoływać
+    przez run_in_threadpool, nigdy bezpośrednio z handlera async.
+
+    Args:
+        uploads: Przyjęte pliki faktur
+        ma_pv: Czy instalacja ma fotowoltaikę
+        on_result: Wywoływane z (indeks pliku, wynik OCR) po każdej fakturze
+    """
+    # 2. Przeanalizuj faktury przez OCR
+    print(f"📸 Analizuję {len(uploads)} faktur przez Claude Vision...")
+    ocr_results = ocr_service.analyze_multiple_invoices(
+        [u.path for u in uploads],
+        file_names=[u.file_name for u in uploads],
+        file_hashes=[u.sha256 for u in uploads],
+        on_result=on_result
+    )
+
+    return _summarize_ocr_results(ocr_results, ma_pv)
+
+def _summarize_ocr_results(ocr_results: List[dict], ma_pv: bool) -> dict:
+    """
+    Agregacja wyników OCR i obliczenie kompensatora (odpowiedź /api/analyze-invoices)
+
+    Raises:
+        HTTPException: żadnej faktury nie udało się odczytać (400)
+    """
+    # 3. Agreguj dane
+    aggregated = ocr_service.aggregate_invoice_data(ocr_results)
+
+    if not aggregated.get("success"):
+        raise HTTPException(
+            status_code=400,
+            detail=aggregated.get("error", "Nie udało się odczytać faktur")
+        )
+
+    # 4. Oblicz kompensator
+    print(f"🔢 Obliczam kompensator...")
+    result = calculator.calculate_from_multiple_invoices(
+        faktury=aggregated["faktury"],
+        ma_pv=ma_pv
+    )
+
+    # 5. Dodaj szczegóły OCR do wyniku
+    return {
+        **result.model_dump(),
+        "ocr_details": {
+            "faktury_sukces": len(aggregated["faktury"]),
+            "faktury_blad": len(aggregated.get("failed_invoices", [])),
+            # Zużycie tokenów Vision (cache_read/cache_write = prompt caching)
+            "tokeny": merge_token_usage(*(r.get("tokeny") for r in ocr_results)),
+            "szczegoly": ocr_results
+        }
+    }
+
+def _process_job(uploads: List[IngestedUpload], ma_pv: bool, save_progress: Callable[[dict], None]) -> dict:
+    """Przetwarza zadanie z kolejki (ten sam pipeline co /api/analyze-invoices)"""
+    def on_result(index: int, ocr_result: dict) -> None:
+        save_progress({
+            "index": index,
+            "file_name": ocr_result.get("file_name"),
+            "success": bool(ocr_result.get("success")),
+            "error": ocr_result.get("error")
         })
 
+    try:
+        return _run_ocr_pipeline(uploads, ma_pv, on_result)
+    except HTTPException as e:
+        raise JobFailedError(e.detail)
+
+# Kolejka zadań analizy faktur - backlog w SQLite, przetrwa restart serwera
+job_queue = JobQueue(
+    db_path=os.getenv("JOBS_DB_PATH", "./cache/jobs.sqlite3"),
+    jobs_dir=os.getenv("JOBS_DIR", "./jobs"),
+    processor=_process_job,
+    worker_count=int(os.getenv("JOB_WORKERS", "2")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "1000")),
+    webhook_allowed_hosts=[h.strip() for h in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()]
+)
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_image_preprocessor():
+    image_preprocessor.close()
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(
+    files: List[UploadFile] = File(...),
+    ma_pv: Optional[bool] = Form(False),
+    webhook_url: Optional[str] = Form(None)
+):
+    """
+    Asynchroniczna analiza faktur - zwraca id zadania od razu
+
+    Stan zadania: GET /api/jobs/{job_id} albo strumień SSE
+    GET /api/jobs/{job_id}/events. Jeśli podano webhook_url, po
+    zakończeniu zadania wysyłany jest na niego POST z jego stanem.
+    """
+    if len(files) == 0:
+        raise HTTPException(status_code=400, detail="Nie przesłano żadnych plików")
+
+    if len(files) > 10:
+        raise HTTPException(status_code=400, detail="Maksymalnie 10 faktur na raz")
+
+    if webhook_url:
+        # Przed przyjęciem plików - bez sensu zapisywać upload do odrzucenia
+        try:
+            await run_in_threadpool(validate_webhook_url, webhook_url, job_queue.webhook_allowed_hosts)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    uploads = []
+    try:
+        for file in files:
+            uploads.append(await ingest_upload(file, UPLOAD_DIR, MAX_FILE_SIZE))
+
+        job_id = await run_in_threadpool(job_queue.submit, uploads, ma_pv, webhook_url)
+
+    except UploadRejectedError as e:
+        cleanup_uploads(uploads)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except JobQueueFullError as e:
+        cleanup_uploads(uploads)
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        # webhook_url przestał przechodzić walidację (zmiana DNS w trakcie uploadu)
+        cleanup_uploads(uploads)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events"
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Stan zadania: status, postęp (faktury przeanalizowane), wynik lub błąd"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Nie ma takiego zadania")
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Postęp zadania jako Server-Sent Events
+
+    Zdarzenie "progress" po każdej przeanalizowanej fakturze, na końcu
+    "done" (z wynikiem) albo "failed" (z błędem) - po nim strumień się zamyka.
+    """
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Nie ma takiego zadania")
+
+    async def events():
+        last = None
+        while not await request.is_disconnected():
+            job = job_queue.get(job_id)
+            if job is None:
+                return
+
+            if job["status"] in FINISHED_STATUSES:
+                yield _sse(job["status"], job)
+                return
+
+            state = (job["status"], job["progress"]["done"])
+            if state != last:
+                last = state
+                yield _sse("progress", {"job_id": job_id, "status": job["status"], "progress": job["progress"]})
+
+            await asyncio.sleep(JOB_EVENTS_POLL_S)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _render_offer(dane: dict, format: str) -> Response:
+    """
+    Oferta jako odpowiedź HTML albo PDF (blokujące przy PDF - przez run_in_threadpool)
+
+    Ceny zakupu (dane["koszty"]) nie trafiają do odpowiedzi.
+    """
+    numer = dane["numer_oferty"]
+    headers = {"X-Offer-Number": numer}
+    if format == "pdf":
+        headers["Content-Disposition"] = f'inline; filename="oferta_{numer.replace("/", "-")}.pdf"'
+        return Response(content=offer_engine.render_pdf(dane), media_type="application/pdf", headers=headers)
+    return HTMLResponse(content=offer_engine.render_html(dane), headers=headers)
+
+def _offer_from_request(request: OfferRequest) -> Response:
+    """
+    Oferta z OfferRequest - z wyniku analizy albo z podanej energii biernej
+
+    Energia bierna bez analizy przechodzi przez kalkulator (jak /api/calculate),
+    więc oferta pokrywa tę samą wymaganą moc co wynik obliczeń.
+    """
+    klient = request.klient.model_dump()
+    if request.analiza is not None:
+        analiza = request.analiza
+    else:
+        analiza = calculator.calculate_compensator(
+            energia_bierna_kwh=request.energia_bierna,
+            okres_mc=request.okres_mc,
+            tg_phi=TG_PHI_DOMYSLNY if request.tg_phi is None else request.tg_phi,
+            ma_pv=request.ma_pv
+        ).model_dump()
+    dane = offer_engine.prepare_from_analysis(klient, analiza, request.metry_przewodu)
+    return _render_offer(dane, request.format)
+
+def _check_offer_available(format: str) -> None:
+    """
+    Raises:
+        HTTPException: brak cennika/generatora albo WeasyPrint dla PDF (503)
+    """
+    if not offer_engine.available:
+        raise HTTPException(status_code=503, detail=f"Generator ofert niedostępny: {offer_engine.error}")
+    if format == "pdf" and not offer_engine.pdf_available:
+        raise HTTPException(status_code=503, detail="PDF niedostępny - brak WeasyPrint na serwerze (użyj format=html)")
+
+@app.post("/api/offers")
+async def create_offer(request: OfferRequest):
+    """
+    Oferta na kompensator (HTML lub PDF) - bez zapisu plików
+
+    Z wyniku /api/analyze-invoices albo /api/calculate (pole analiza)
+    albo z energii biernej i okresu z faktury. Numer oferty w nagłówku
+    X-Offer-Number.
+    """
+    if request.analiza is None and request.energia_bierna is None:
+        raise HTTPException(status_code=400, detail="Podaj wynik analizy (analiza) albo energia_bierna")
+
+    _check_offer_available(request.format)
+    try:
+        return await run_in_threadpool(_offer_from_request, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OfferSizingError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except OfferUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Błąd generowania oferty: {str(e)}")
+
+@app.post("/api/analyze-invoices/offer")
+async def analyze_invoices_offer(
+    files: List[UploadFile] = File(...),
+    nazwa: str = Form(...),
+    adres: str = Form(""),
+    nip: str = Form(""),
+    telefon: str = Form(""),
+    ma_pv: Optional[bool] = Form(False),
+    metry_przewodu: int = Form(5),
+    format: str = Form("html")
+):
+    """
+    Analiza faktur i oferta w jednym requeście
+
+    Ten sam pipeline co /api/analyze-invoices, a z jego wyniku od razu
+    oferta HTML lub PDF - bez drugiego procesu i plików pośrednich.
+    """
+    if format not in ("html", "pdf"):
+        raise HTTPException(status_code=400, detail="format musi być html albo pdf")
+
+    if len(files) == 0:
+        raise HTTPException(status_code=400, detail="Nie przesłano żadnych plików")
+
+    if len(files) > 10:
+        raise HTTPException(status_code=400, detail="Maksymalnie 10 faktur na raz")
+
+    # Przed OCR - nie płacimy za Vision, gdy oferty i tak nie da się zrobić
+    _check_offer_available(format)
+
+    klient = {"nazwa": nazwa, "adres": adres, "nip": nip, "telefon": telefon}
+
+    def pipeline() -> Response:
+        analiza = _run_ocr_pipeline(uploads, ma_pv)
+        try:
+            dane = offer_engine.prepare_from_analysis(klient, analiza, metry_przewodu)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except OfferSizingError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        return _render_offer(dane, format)
+
+    uploads = []
+    try:
+        for file in files:
+            uploads.append(await ingest_upload(file, UPLOAD_DIR, MAX_FILE_SIZE))
+
+        return await run_in_threadpool(pipeline)
+
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except HTTPException:
         raise
+    except OfferUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Błąd przetwarzania: {str(e)}")
 
     finally:
-        # Cleanup - usuń przesłane pliki (opcjonalnie)
-        # for path in saved_paths:
-        #     if os.path.exists(path):
-        #         os.remove(path)
-        pass
+        cleanup_uploads(uploads)
 
 @app.get("/api/compensators")
-async def list_compensators():
-    """Zwraca listę dostępnych kompensatorów"""
-    return {"compensators": calculator.COMPENSATORS_DB}
+async def list_compensators(producent: Optional[str] = None, typ: Optional[str] = None):
+    """Zwraca listę dostępnych kompensatorów (opcjonalnie filtrowaną)"""
+    return {
+        "compensators": compensator_catalog.items(producent, typ),
+        "producenci": compensator_catalog.vendors(),
+        "wersja": compensator_catalog.version
+    }
+
+@app.post("/api/compensators/reload")
+async def reload_compensators():
+    """Przeładowuje katalog kompensatorów z plików (bez restartu serwera)"""
+    version = await run_in_threadpool(compensator_catalog.reload)
+    return {
+        "wersja": version,
+        "pozycji": len(compensator_catalog.items()),
+        "bledy": compensator_catalog.errors
+    }
 
 @app.get("/api/health")
 async def health_check():
     """Sprawdzenie stanu serwisu"""
     return {
         "status": "healthy",
-        "ocr_enabled": ocr_service is not None,
+        "ocr_enabled": bool(vision_backends),
+        "ocr_backends": ocr_service.stats(),
         "upload_dir": UPLOAD_DIR,
-        "uploads_exist": os.path.exists(UPLOAD_DIR)
+        "uploads_exist": os.path.exists(UPLOAD_DIR),
+        "ocr_cache": ocr_cache.stats(),
+        "jobs": job_queue.stats(),
+        "transport": vision_transport.stats(),
+        "image_preprocess": image_preprocessor.stats(),
+        "oferty": offer_engine.stats()
     }
 
 if __name__ == "__main__":
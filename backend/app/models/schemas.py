@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 
 class InvoiceData(BaseModel):
     """Dane wyciągnięte z faktury"""
@@ -12,17 +12,25 @@ class InvoiceData(BaseModel):
 
 class CalculationRequest(BaseModel):
     """Request do ręcznego obliczenia"""
-    energia_bierna: float
+    energia_bierna: float = Field(..., allow_inf_nan=False)
     okres_mc: int = 1
-    tg_phi: float
+    tg_phi: float = Field(..., allow_inf_nan=False)
     ma_pv: bool = False
 
+class CompensatorUnit(BaseModel):
+    """Pozycja zestawu kompensatorów"""
+    model: str = Field(..., description="Model np. LOPI LKD 30 PRO")
+    moc_kvar: int = Field(..., description="Moc jednej sztuki w kvar")
+    cena: int = Field(..., description="Cena jednej sztuki w PLN")
+    ilosc: int = Field(..., description="Liczba sztuk")
+
 class CompensatorRecommendation(BaseModel):
     """Rekomendacja kompensatora"""
     moc_kvar: int = Field(..., description="Moc kompensatora w kvar")
     typ: str = Field(..., description="Typ: dynamiczny lub klasyczny")
-    model: str = Field(..., description="Konkretny model np. LOPI LKD 10 PRO")
+    model: str = Field(..., description="Konkretny model np. LOPI LKD 10 PRO (lub zestaw)")
     cena_szacunkowa: int = Field(..., description="Szacunkowa cena w PLN")
+    zestaw: List[CompensatorUnit] = Field(default_factory=list, description="Najtańszy zestaw pokrywający wymaganą moc")
 
 class CalculationResult(BaseModel):
     """Wynik obliczeń"""
@@ -37,3 +45,26 @@ class CalculationResult(BaseModel):
     obliczenia: dict
     zrodlo_danych: str = Field(default="manual", description="manual lub ocr")
     faktury_przeanalizowane: int = Field(default=1, description="Liczba przeanalizowanych faktur")
+
+class OfferClient(BaseModel):
+    """Dane klienta na ofercie"""
+    nazwa: str = Field(..., min_length=1, description="Nazwa klienta/firmy")
+    adres: str = ""
+    nip: str = ""
+    telefon: str = ""
+
+class OfferRequest(BaseModel):
+    """Request oferty - dane z faktury albo gotowy wynik analizy"""
+    klient: OfferClient
+    analiza: Optional[dict] = Field(None, description="Wynik /api/analyze-invoices lub /api/calculate")
+    energia_bierna: Optional[float] = Field(
+        None, gt=0, allow_inf_nan=False, description="Energia bierna z faktury (gdy bez analizy)"
+    )
+    okres_mc: int = Field(1, ge=1, description="Okres rozliczeniowy w miesiącach")
+    tg_phi: Optional[float] = Field(
+        None, ge=0, le=10, allow_inf_nan=False,
+        description="Współczynnik tgφ z faktury (gdy bez analizy; brak = TG_PHI_DOMYSLNY kalkulatora)"
+    )
+    ma_pv: bool = Field(False, description="Instalacja z fotowoltaiką (gdy bez analizy)")
+    metry_przewodu: int = Field(5, ge=0, description="Długość przewodu do montażu")
+    format: Literal["html", "pdf"] = "html"
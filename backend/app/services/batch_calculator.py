@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+import math
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.services.vectorized_calculator import VectorizedCalculator
+
+# Ile wierszy liczymy naraz (jeden "wsad" kolumn dla kalkulatora)
+BATCH_CHUNK_SIZE = 1000
+
+# Wartości uznawane za "tak" w kolumnie ma_pv (CSV)
+TRUE_VALUES = {"1", "true", "t", "tak", "yes", "y"}
+
+# Zakresy wartości wejściowych - poza nimi wiersz dostaje błąd (nie psuje wsadu)
+ENERGIA_BIERNA_MAX = 1e9  # kvarh w okresie rozliczeniowym
+TG_PHI_MAX = 10.0
+OKRES_MC_MAX = 12
+
+
+def parse_bool(value) -> bool:
+    """Parsuje flagę (bool z JSON albo tekst z CSV)"""
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_float(value) -> float:
+    """Parsuje liczbę (akceptuje też przecinek dziesiętny z polskich CSV)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float(str(value).strip().replace(",", "."))
+
+
+def _in_range(name: str, value: float, low: float, high: float) -> float:
+    """
+    Raises:
+        ValueError: wartość nieskończona, NaN albo poza [low, high]
+    """
+    if not math.isfinite(value) or not low <= value <= high:
+        raise ValueError(f"{name} poza zakresem {low:g}-{high:g}: {value}")
+    return value
+
+
+def normalize_row(raw: Dict) -> Dict:
+    """
+    Waliduje i normalizuje wiersz wejściowy (pola jak w CalculationRequest)
+
+    Raises:
+        ValueError: brak wymaganego pola albo niepoprawna wartość
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Wiersz musi być obiektem JSON")
+    if raw.get("energia_bierna") in (None, ""):
+        raise ValueError("Brak pola energia_bierna")
+    if raw.get("tg_phi") in (None, ""):
+        raise ValueError("Brak pola tg_phi")
+
+    okres_mc = raw.get("okres_mc")
+    okres_mc = _in_range("okres_mc", parse_float(okres_mc), 1, OKRES_MC_MAX) if okres_mc not in (None, "") else 1
+    # Jak w CalculationRequest: 3 albo 3.0, ale nie 1.5
+    if not float(okres_mc).is_integer():
+        raise ValueError(f"okres_mc musi być liczbą całkowitą miesięcy: {okres_mc}")
+
+    return {
+        "id": raw.get("id"),
+        "energia_bierna": _in_range("energia_bierna", parse_float(raw["energia_bierna"]), 0, ENERGIA_BIERNA_MAX),
+        "okres_mc": int(okres_mc),
+        "tg_phi": _in_range("tg_phi", parse_float(raw["tg_phi"]), 0, TG_PHI_MAX),
+        "ma_pv": parse_bool(raw.get("ma_pv", False))
+    }
+
+
+def parse_ndjson(text: str) -> Iterator[Dict]:
+    """Wiersze z NDJSON (jeden obiekt JSON na linię, puste linie pomijane)"""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Przekazujemy dalej - normalize_row zgłosi błąd tylko dla tego wiersza
+            yield line
+
+
+def parse_csv(text: str) -> Iterator[Dict]:
+    """Wiersze z CSV z nagłówkiem (separator ',' lub ';' - wykrywany)"""
+    first_line = text.split("\n", 1)[0]
+    delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+    yield from csv.DictReader(io.StringIO(text), delimiter=delimiter)
+
+
+def parse_batch(text: str, fmt: str) -> Iterator[Dict]:
+    """
+    Parsuje dane wsadowe w formacie json (tablica), ndjson lub csv
+
+    Raises:
+        ValueError: nieznany format albo JSON, który nie jest tablicą
+    """
+    if fmt == "json":
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError("Oczekiwano tablicy JSON")
+        return iter(rows)
+    if fmt == "ndjson":
+        return parse_ndjson(text)
+    if fmt == "csv":
+        return parse_csv(text)
+    raise ValueError(f"Nieobsługiwany format: {fmt}")
+
+
+def detect_format(content_type: str, filename: Optional[str] = None) -> str:
+    """Format danych wsadowych z nazwy pliku lub Content-Type"""
+    if filename:
+        ext = filename.rsplit(".", 1)[-1].lower()
+        if ext in ("ndjson", "jsonl"):
+            return "ndjson"
+        if ext in ("csv", "json"):
+            return ext
+    content_type = (content_type or "").lower()
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    if "csv" in content_type:
+        return "csv"
+    return "json"
+
+
+def _calculate_rows(engine: VectorizedCalculator, rows: List[Dict]) -> List[Dict]:
+    """
+    Wyniki dla poprawnych wierszy - wektorowo, a gdy wsad się wywróci, wiersz po wierszu
+
+    Wiersz, którego nie da się policzyć, dostaje {"error"} zamiast wyniku.
+    """
+    columns = (
+        [row["energia_bierna"] for row in rows],
+        [row["okres_mc"] for row in rows],
+        [row["tg_phi"] for row in rows],
+        [row["ma_pv"] for row in rows]
+    )
+    try:
+        return engine.calculate_rows(*columns)
+    except Exception:
+        if len(rows) == 1:
+            raise
+
+    results = []
+    for row in rows:
+        try:
+            results.extend(_calculate_rows(engine, [row]))
+        except Exception as e:
+            results.append({"error": f"Błąd obliczenia: {str(e)}"})
+    return results
+
+
+def _calculate_chunk(engine: VectorizedCalculator, chunk: List[Dict]) -> Iterator[str]:
+    """Liczy jeden wsad i zwraca linie NDJSON (w kolejności wierszy wejściowych)"""
+    valid = [row for row in chunk if "error" not in row]
+    results = iter(_calculate_rows(engine, valid) if valid else [])
+    for row in chunk:
+        if "error" in row:
+            line = row
+        else:
+            result = next(results)
+            line = {"index": row["index"], "id": row["id"], **result}
+            if "error" not in result:
+                line["zrodlo_danych"] = "batch"
+        yield json.dumps(line, ensure_ascii=False) + "\n"
+
+
+def iter_batch_results(
+    engine: VectorizedCalculator,
+    rows: Iterable[Dict],
+    chunk_size: int = BATCH_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Liczy kompensatory dla wielu wierszy, zwraca strumień linii NDJSON
+
+    Wiersze są liczone wsadami po chunk_size (NumPy na kolumnach),
+    więc pierwsze wyniki wychodzą zanim cały plik zostanie policzony. Błędny wiersz daje
+    linię {"index", "id", "error"} i nie przerywa reszty.
+    """
+    chunk = []
+    for index, raw in enumerate(rows):
+        try:
+            row = normalize_row(raw)
+        except (ValueError, TypeError, OverflowError) as e:
+            row_id = raw.get("id") if isinstance(raw, dict) else None
+            row = {"id": row_id, "error": str(e)}
+
+        chunk.append({"index": index, **row})
+        if len(chunk) >= chunk_size:
+            yield from _calculate_chunk(engine, chunk)
+            chunk = []
+
+    if chunk:
+        yield from _calculate_chunk(engine, chunk)
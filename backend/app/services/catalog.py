@@ -0,0 +1,221 @@
+import csv
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+
+def _vendor_from_model(model: str) -> str:
+    """Producent z nazwy modelu ("LOPI LKD 10 PRO" -> "LOPI")"""
+    return model.split()[0] if model else "?"
+
+
+def normalize_item(raw: Dict, source: str) -> Dict:
+    """
+    Ujednolica pozycję katalogu
+
+    Format COMPENSATORS_DB (model, moc_kvar, cena, typ). Cena to cena
+    sprzedaży - katalog jest publiczny (/api/compensators), więc koszt
+    zakupu (koszt_zakupu z cennika generatora ofert) nigdy jej nie zastępuje.
+
+    Raises:
+        ValueError: brak modelu, mocy lub ceny sprzedaży albo moc niecałkowita
+    """
+    model = (raw.get("model") or "").strip()
+    cena = raw.get("cena")
+    if not model or raw.get("moc_kvar") in (None, "") or cena in (None, ""):
+        raise ValueError(f"Niepełna pozycja katalogu w {source} (wymagane model, moc_kvar, cena): {raw}")
+
+    # Optymalizator zestawów liczy na całkowitych kvar - nie zaokrąglamy po cichu
+    moc_kvar = float(raw["moc_kvar"])
+    if not moc_kvar.is_integer() or moc_kvar <= 0:
+        raise ValueError(f"Moc {raw['moc_kvar']} kvar w {source} ({model}) - obsługiwane są tylko całkowite kvar")
+
+    return {
+        "model": model,
+        "moc_kvar": int(moc_kvar),
+        "cena": int(float(cena)),
+        "typ": (raw.get("typ") or "dynamiczny").strip(),
+        "producent": (raw.get("producent") or _vendor_from_model(model)).strip(),
+        "zrodlo": source
+    }
+
+
+def load_catalog_file(path: str) -> List[Dict]:
+    """
+    Wczytuje pozycje katalogu z pliku JSON lub CSV
+
+    JSON: lista pozycji albo {"compensators": [...]}. CSV: nagłówek
+    z kolumnami model, moc_kvar, cena, typ, producent.
+
+    Raises:
+        ValueError: cennik generatora ofert (ceny zakupu) albo błędna pozycja
+    """
+    source = os.path.basename(path)
+
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            sample = f.readline()
+            f.seek(0)
+            delimiter = ";" if sample.count(";") > sample.count(",") else ","
+            return [normalize_item(row, source) for row in csv.DictReader(f, delimiter=delimiter)]
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        if "kompensatory" in data:
+            raise ValueError("cennik generatora ofert zawiera ceny zakupu - nie może być publicznym katalogiem")
+        data = data.get("compensators", [])
+
+    return [normalize_item(item, source) for item in data]
+
+
+class _CatalogIndex:
+    """
+    Niezmienny snapshot katalogu z posortowanymi indeksami
+
+    Dla każdej pary (producent, typ) - oraz dla None jako "dowolny" -
+    trzyma posortowaną listę mocy i najtańszą pozycję dla każdej mocy,
+    więc wyszukiwanie to bisect, a nie skan całej listy.
+    """
+
+    def __init__(self, items: List[Dict], version: int):
+        self.version = version
+        self.items = sorted(items, key=lambda c: (c["producent"], c["moc_kvar"], c["cena"]))
+        self.indexes: Dict[Tuple[Optional[str], Optional[str]], Tuple[List[int], List[Dict]]] = {}
+
+        groups: Dict[Tuple[Optional[str], Optional[str]], List[Dict]] = {}
+        for item in self.items:
+            for key in (
+                (item["producent"], item["typ"]),
+                (item["producent"], None),
+                (None, item["typ"]),
+                (None, None)
+            ):
+                groups.setdefault(key, []).append(item)
+
+        for key, group in groups.items():
+            cheapest: Dict[int, Dict] = {}
+            for item in group:
+                current = cheapest.get(item["moc_kvar"])
+                if current is None or item["cena"] < current["cena"]:
+                    cheapest[item["moc_kvar"]] = item
+            powers = sorted(cheapest)
+            self.indexes[key] = (powers, [cheapest[p] for p in powers])
+
+
+class CompensatorCatalog:
+    """
+    Katalog kompensatorów wielu producentów
+
+    Ładowany z wbudowanej listy (LOPI LKD) i plików JSON/CSV przy starcie.
+    Pliki są przeładowywane bez restartu, gdy zmieni się ich data
+    modyfikacji (sprawdzane najwyżej co reload_interval_s sekund).
+    Lookupy działają na niezmiennym snapshocie, więc przeładowanie
+    w trakcie obsługi requestu jest bezpieczne.
+    """
+
+    def __init__(
+        self,
+        builtin: Optional[List[Dict]] = None,
+        sources: Optional[List[str]] = None,
+        reload_interval_s: float = 5.0
+    ):
+        self.builtin = builtin or []
+        self.sources = sources or []
+        self.reload_interval_s = reload_interval_s
+        self._mtimes: Dict[str, Optional[float]] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._index = _CatalogIndex([], 0)
+        self.errors: List[str] = []
+        self.reload()
+
+    def _current_mtimes(self) -> Dict[str, Optional[float]]:
+        mtimes = {}
+        for path in self.sources:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def reload(self) -> int:
+        """
+        Wczytuje katalog od nowa (wbudowane pozycje + wszystkie pliki)
+
+        Plik, którego nie da się wczytać, jest pomijany (błąd trafia do
+        self.errors) - reszta katalogu dalej działa.
+
+        Returns:
+            Nowa wersja katalogu
+        """
+        with self._lock:
+            items = [normalize_item(item, "wbudowany") for item in self.builtin]
+            errors = []
+            for path in self.sources:
+                try:
+                    items.extend(load_catalog_file(path))
+                except (OSError, ValueError, KeyError) as e:
+                    errors.append(f"{path}: {str(e)}")
+                    print(f"⚠️  Katalog kompensatorów - pomijam {path}: {str(e)}")
+
+            self._mtimes = self._current_mtimes()
+            self._last_check = time.monotonic()
+            self.errors = errors
+            self._index = _CatalogIndex(items, self._index.version + 1)
+            print(f"📦 Katalog kompensatorów v{self._index.version}: {len(items)} pozycji")
+            return self._index.version
+
+    def _snapshot(self) -> _CatalogIndex:
+        """Aktualny snapshot (z przeładowaniem, jeśli pliki się zmieniły)"""
+        if self.sources and time.monotonic() - self._last_check >= self.reload_interval_s:
+            self._last_check = time.monotonic()
+            if self._current_mtimes() != self._mtimes:
+                self.reload()
+        return self._index
+
+    @property
+    def version(self) -> int:
+        return self._snapshot().version
+
+    def items(self, producent: Optional[str] = None, typ: Optional[str] = None) -> List[Dict]:
+        """Wszystkie pozycje (opcjonalnie tylko danego producenta/typu)"""
+        items = self._snapshot().items
+        return [
+            item for item in items
+            if (producent is None or item["producent"] == producent)
+            and (typ is None or item["typ"] == typ)
+        ]
+
+    def vendors(self) -> List[str]:
+        """Lista producentów w katalogu"""
+        return sorted({item["producent"] for item in self._snapshot().items})
+
+    def power_table(self, producent: Optional[str] = None, typ: Optional[str] = None) -> Tuple[List[int], List[Dict]]:
+        """Posortowane moce i najtańsza pozycja dla każdej mocy"""
+        return self._snapshot().indexes.get((producent, typ), ([], []))
+
+    def find_at_least(self, moc_kvar: float, producent: Optional[str] = None, typ: Optional[str] = None) -> Optional[Dict]:
+        """
+        Najmniejszy (najtańszy przy tej samej mocy) kompensator >= moc_kvar
+
+        Returns:
+            Pozycja katalogu albo None, gdy żaden nie jest wystarczająco duży
+        """
+        powers, items = self.power_table(producent, typ)
+        i = bisect_left(powers, moc_kvar)
+        return items[i] if i < len(items) else None
+
+    def largest(self, producent: Optional[str] = None, typ: Optional[str] = None) -> Optional[Dict]:
+        """Największy kompensator (producenta/typu)"""
+        _, items = self.power_table(producent, typ)
+        return items[-1] if items else None
+
+    def smallest(self, producent: Optional[str] = None, typ: Optional[str] = None) -> Optional[Dict]:
+        """Najmniejszy kompensator (producenta/typu)"""
+        _, items = self.power_table(producent, typ)
+        return items[0] if items else None
@@ -1,87 +1,23 @@
-import base64
-import os
-from typing import List, Dict, Optional
-from anthropic import Anthropic
-from PIL import Image
-import io
+import hashlib
 import json
-import fitz  # PyMuPDF
+from typing import Dict, List, Optional, Tuple
 
-class ClaudeOCRService:
-    """Serwis do rozpoznawania faktur za pomocą Claude Vision (Anthropic)"""
-
-    def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
-
-    def pdf_to_images(self, pdf_path: str, max_pages: int = 15) -> list:
-        """
-        Konwertuje wszystkie strony PDF na obrazy PNG
-        Returns: Lista PNG bytes dla każdej strony (max 15 stron)
-        """
-        doc = fitz.open(pdf_path)
-        images = []
-
-        # Konwertuj wszystkie strony (max 15)
-        num_pages = min(len(doc), max_pages)
-        print(f"📄 PDF ma {len(doc)} stron, konwertuję {num_pages} pierwszych...")
-
-        for page_num in range(num_pages):
-            page = doc.load_page(page_num)
-            # Renderuj stronę jako obraz (wysokiej jakości)
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom
-            png_bytes = pix.tobytes("png")
-            images.append(png_bytes)
-
-        doc.close()
-        return images
+from app.services.http_transport import VisionTransport
+from app.services.image_preprocess import ImagePreprocessor
+from app.services.ocr_backends import VisionBackend
+from app.services.ocr_parsing import (
+    INVOICE_BATCH_TOOL_NAME,
+    INVOICE_TOOL_NAME,
+    invoice_batch_json_schema,
+    invoice_json_schema
+)
 
-    def encode_image_to_base64(self, image_path: str) -> list:
-        """
-        Konwertuje obraz/PDF do base64 + wykrywa media type
-        Automatycznie konwertuje PDF → wiele PNG (wszystkie strony)
-        Returns: Lista [(base64_string, media_type), ...]
-        """
-        # Wykryj typ pliku
-        ext = os.path.splitext(image_path)[1].lower()
-
-        # Jeśli PDF, konwertuj wszystkie strony na PNG
-        if ext == '.pdf':
-            print(f"📄 Konwertuję PDF (wszystkie strony) na obrazy...")
-            png_images = self.pdf_to_images(image_path)
-            results = []
-            for png_bytes in png_images:
-                base64_string = base64.standard_b64encode(png_bytes).decode('utf-8')
-                results.append((base64_string, 'image/png'))
-            return results
-        else:
-            # Normalny obraz - jedna strona
-            media_type_map = {
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.png': 'image/png',
-                '.gif': 'image/gif',
-                '.webp': 'image/webp'
-            }
-            media_type = media_type_map.get(ext, 'image/jpeg')
-
-            with open(image_path, "rb") as image_file:
-                base64_string = base64.standard_b64encode(image_file.read()).decode('utf-8')
+# Model Claude używany do OCR faktur
+OCR_MODEL = "claude-sonnet-4-5"  # Claude Sonnet 4.5 (najnowszy z vision)
 
-            return [(base64_string, media_type)]
-
-    def analyze_invoice(self, image_path: str) -> Dict:
-        """
-        Analizuje pojedynczą fakturę za energię
-
-        Returns:
-            Dict z danymi: energia_bierna_kwh, tg_phi, okres_mc, etc.
-        """
-
-        # Encode image(s) - może być wiele stron dla PDF
-        images = self.encode_image_to_base64(image_path)
-
-        # Prompt dla Claude
-        prompt = """Jesteś ekspertem od analizy faktur za energię elektryczną w Polsce.
+# Prompt dla Claude - stały blok instrukcji wysyłany jako system prompt
+# z cache_control (prompt caching: narzędzie + instrukcje z cache dostawcy)
+OCR_PROMPT = """Jesteś ekspertem od analizy faktur za energię elektryczną w Polsce.
 
 WAŻNE: Analizujesz WSZYSTKIE STRONY faktury (w tym załączniki). Przejrzyj każdą stronę dokładnie!
 
@@ -105,9 +41,9 @@ KRYTYCZNE:
 - Szukaj w ZAŁĄCZNIKACH do faktury - często dane są tam!
 - Jeśli widzisz tabelę z "Licznik energii biernej indukcyjnej" - to jest WŁAŚCIWA wartość!
 - "Energia bierna pojemnościowa" - IGNORUJ
-- Zwróć TYLKO czysty JSON, BEZ żadnych uwag, markdown, ani dodatkowego tekstu!
+- Wynik zapisz narzędziem zapisz_dane_faktury. Jeśli nie znajdziesz energii biernej, ustaw success=false i opisz powód w error.
 
-Format odpowiedzi (TYLKO JSON, nic więcej):
+Format danych (gdyby narzędzie było niedostępne - TYLKO JSON, nic więcej):
 {
     "energia_bierna_kwh": <float>,
     "tg_phi": <float lub null>,
@@ -119,49 +55,147 @@ Format odpowiedzi (TYLKO JSON, nic więcej):
     "error": null
 }"""
 
-        try:
-            # Przygotuj content z wszystkimi stronami
-            content = []
+# Krótka instrukcja po obrazach - jedyny tekst zmieniający prefiks zapytania
+OCR_USER_INSTRUCTION = "Przeanalizuj wszystkie strony powyższej faktury i zapisz dane narzędziem zapisz_dane_faktury."
+
+# Instrukcja dla kilku faktur w jednym zapytaniu
+OCR_BATCH_INSTRUCTION = (
+    "Powyżej jest {count} osobnych faktur, każda poprzedzona nagłówkiem \"Faktura k:\". "
+    "Przeanalizuj każdą fakturę osobno (nie mieszaj danych między fakturami) i zapisz wyniki "
+    "wszystkich faktur jednym wywołaniem narzędzia zapisz_dane_faktur - pole indeks to numer k faktury."
+)
+
+# System prompt z punktem cache (tools + system trafiają do cache razem)
+OCR_SYSTEM = [{"type": "text", "text": OCR_PROMPT, "cache_control": {"type": "ephemeral"}}]
+
+# Narzędzie, którym Claude zwraca dane faktury (schemat z InvoiceData)
+OCR_TOOL = {
+    "name": INVOICE_TOOL_NAME,
+    "description": "Zapisuje dane odczytane z faktury za energię elektryczną",
+    "input_schema": invoice_json_schema()
+}
+
+# Narzędzie dla kilku faktur w jednym zapytaniu
+OCR_BATCH_TOOL = {
+    "name": INVOICE_BATCH_TOOL_NAME,
+    "description": "Zapisuje dane odczytane z kilku faktur za energię elektryczną (po jednym wyniku na fakturę)",
+    "input_schema": invoice_batch_json_schema()
+}
+
+# Oba narzędzia w każdym zapytaniu - ten sam prefiks (tools + system) w cache
+OCR_TOOLS = [OCR_TOOL, OCR_BATCH_TOOL]
+
+# Wersja promptu/schematu/modelu - część klucza cache OCR (zmiana = nowe wpisy)
+OCR_VERSION = f"{OCR_MODEL}:" + hashlib.sha256(
+    (OCR_PROMPT + OCR_USER_INSTRUCTION + json.dumps(OCR_TOOLS, sort_keys=True)).encode('utf-8')
+).hexdigest()[:12]
+
+class ClaudeOCRService(VisionBackend):
+    """Serwis do rozpoznawania faktur za pomocą Claude Vision (Anthropic)"""
+
+    name = "claude"
+    version = OCR_VERSION
+    transport_backend = "anthropic"
+    supports_packing = True
+
+    def __init__(
+        self,
+        api_key: str,
+        transport: Optional[VisionTransport] = None,
+        base_url: Optional[str] = None,
+        preprocessor: Optional[ImagePreprocessor] = None
+    ):
+        """
+        Args:
+            api_key: Klucz API Anthropic
+            transport: Wspólna pula połączeń + deadline/ponowienia/circuit breaker
+            base_url: Inny adres API (np. lokalny stub do benchmarków)
+            preprocessor: Wspólna pula procesów do preprocessingu zdjęć
+        """
+        super().__init__(transport, preprocessor)
+        self.client = self.transport.anthropic_client(api_key, base_url)
+
+    def _create_message(self, deadline_s: Optional[float] = None, **kwargs):
+        """
+        Wywołuje messages.create przez transport (deadline, ponawianie przy
+        429/529, budżet ponowień, circuit breaker)
+        """
+        return self.transport.call(
+            "anthropic",
+            lambda timeout: self.client.messages.create(timeout=timeout, **kwargs),
+            deadline_s=deadline_s
+        )
+
+    @staticmethod
+    def _image_blocks(images: List[Tuple[str, str]]) -> List[Dict]:
+        """Bloki image (base64) dla messages API"""
+        return [
+            {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": media_type,
+                    "data": base64_image
+                }
+            }
+            for base64_image, media_type in images
+        ]
+
+    @staticmethod
+    def _token_usage(response) -> Dict:
+        usage = response.usage
+        return {
+            "input": usage.input_tokens,
+            "output": usage.output_tokens,
+            "cache_read": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_write": getattr(usage, "cache_creation_input_tokens", None) or 0
+        }
+
+    @staticmethod
+    def _tool_output(response, tool_name: str) -> Tuple[Optional[Dict], str]:
+        """(argumenty narzędzia albo None, tekst odpowiedzi - dla parsera awaryjnego)"""
+        tool_use = next(
+            (block for block in response.content if block.type == "tool_use" and block.name == tool_name), None
+        )
+        result_text = "".join(block.text for block in response.content if block.type == "text")
+        print(f"📄 Claude Response: {tool_use.input if tool_use else result_text[:500]}")  # Debug log
+        return (tool_use.input if tool_use else None), result_text
+
+    def _extract_with_vision(self, images: List[Tuple[str, str]], deadline_s: Optional[float] = None) -> Dict:
+        """
+        Wysyła obrazy do Claude Vision z wymuszonym narzędziem OCR_TOOL
 
-            # Dodaj wszystkie obrazy (strony PDF)
-            for base64_image, media_type in images:
-                content.append({
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": media_type,
-                        "data": base64_image
-                    }
-                })
-
-            # Dodaj prompt na końcu
+        Dane przychodzą jako argumenty narzędzia (już sparsowany JSON);
+        gdyby model odpowiedział tekstem - parser awaryjny. Stałe
+        instrukcje idą na początku (system, z cache), obrazy faktury po
+        nich - wynik zawiera zużycie tokenów, w tym odczyt/zapis cache.
+        """
+        try:
+            # Wszystkie obrazy (strony PDF), krótka instrukcja na końcu
+            # (stałe instrukcje są w system prompt)
+            content = self._image_blocks(images)
             content.append({
                 "type": "text",
-                "text": prompt
+                "text": OCR_USER_INSTRUCTION
             })
 
-            response = self.client.messages.create(
-                model="claude-sonnet-4-5",  # Claude Sonnet 4.5 (najnowszy z vision)
+            response = self._create_message(
+                deadline_s=deadline_s,
+                model=OCR_MODEL,
                 max_tokens=2048,  # Zwiększone dla dłuższej analizy
+                tools=OCR_TOOLS,
+                tool_choice={"type": "tool", "name": INVOICE_TOOL_NAME},
+                system=OCR_SYSTEM,
                 messages=[{
                     "role": "user",
                     "content": content
                 }]
             )
 
-            # Wyciągnij tekst z odpowiedzi
-            result_text = response.content[0].text
-            print(f"📄 Claude Response: {result_text[:500]}...")  # Debug log
-
-            # Parse JSON
-            # Usuń markdown jeśli jest
-            result_text = result_text.strip()
-            if result_text.startswith('```json'):
-                result_text = result_text.replace('```json', '').replace('```', '')
-            elif result_text.startswith('```'):
-                result_text = result_text.replace('```', '')
-
-            result = json.loads(result_text.strip())
+            # Dane z narzędzia albo (awaryjnie) tekst odpowiedzi
+            structured, result_text = self._tool_output(response, INVOICE_TOOL_NAME)
+            result = self._parse_response(structured, result_text)
+            result["tokeny"] = self._token_usage(response)
 
             print(f"✅ Parsed result: {result}")
             return result
@@ -173,66 +207,43 @@ Format odpowiedzi (TYLKO JSON, nic więcej):
                 "error": f"Błąd OCR: {str(e)}"
             }
 
-    def analyze_multiple_invoices(self, image_paths: List[str]) -> List[Dict]:
-        """
-        Analizuje wiele faktur i agreguje wyniki
-
-        Args:
-            image_paths: Lista ścieżek do plików faktur
-
-        Returns:
-            Lista wyników dla każdej faktury + zagregowane dane
-        """
-        results = []
-
-        for i, path in enumerate(image_paths, 1):
-            print(f"Analizuję fakturę {i}/{len(image_paths)}: {os.path.basename(path)}")
-            result = self.analyze_invoice(path)
-            result['file_name'] = os.path.basename(path)
-            results.append(result)
-
-        return results
-
-    def aggregate_invoice_data(self, results: List[Dict]) -> Dict:
+    def _extract_batch_with_vision(
+        self,
+        groups: List[List[Tuple[str, str]]],
+        deadline_s: Optional[float] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
         """
-        Agreguje dane z wielu faktur
+        Kilka faktur w jednym zapytaniu (narzędzie OCR_BATCH_TOOL)
 
-        Sumuje energię bierną, oblicza średni tgφ, liczy miesiące
+        Każda faktura poprzedzona nagłówkiem "Faktura k:"; ten sam system
+        prompt i narzędzia co przy pojedynczej fakturze - wspólny cache.
         """
-        successful = [r for r in results if r.get('success', False)]
+        try:
+            content = []
+            for index, images in enumerate(groups, 1):
+                content.append({"type": "text", "text": f"Faktura {index}:"})
+                content.extend(self._image_blocks(images))
+            content.append({
+                "type": "text",
+                "text": OCR_BATCH_INSTRUCTION.format(count=len(groups))
+            })
 
-        if not successful:
-            return {
-                "success": False,
-                "error": "Nie udało się odczytać żadnej faktury",
-                "details": results
-            }
+            response = self._create_message(
+                deadline_s=deadline_s,
+                model=OCR_MODEL,
+                max_tokens=1024 + 512 * len(groups),
+                tools=OCR_TOOLS,
+                tool_choice={"type": "tool", "name": INVOICE_BATCH_TOOL_NAME},
+                system=OCR_SYSTEM,
+                messages=[{
+                    "role": "user",
+                    "content": content
+                }]
+            )
 
-        # Suma energii biernej
-        total_energia_bierna = sum(r['energia_bierna_kwh'] for r in successful)
-
-        # Suma miesięcy
-        total_okres_mc = sum(r.get('okres_mc', 1) for r in successful)
-
-        # Średni tgφ (ważony energią)
-        tg_phi_values = [r for r in successful if r.get('tg_phi')]
-        if tg_phi_values:
-            avg_tg_phi = sum(r['tg_phi'] * r['energia_bierna_kwh'] for r in tg_phi_values) / total_energia_bierna
-        else:
-            # Oblicz z energii czynnej jeśli dostępna
-            energia_czynna = [r for r in successful if r.get('energia_czynna_kwh')]
-            if energia_czynna:
-                total_czynna = sum(r['energia_czynna_kwh'] for r in energia_czynna)
-                avg_tg_phi = total_energia_bierna / total_czynna if total_czynna > 0 else None
-            else:
-                avg_tg_phi = None
+            structured, result_text = self._tool_output(response, INVOICE_BATCH_TOOL_NAME)
+            return self._parse_batch_response(structured, result_text, len(groups)), self._token_usage(response)
 
-        return {
-            "success": True,
-            "energia_bierna_kwh": round(total_energia_bierna, 2),
-            "okres_mc": total_okres_mc,
-            "tg_phi": round(avg_tg_phi, 3) if avg_tg_phi else None,
-            "liczba_faktur": len(successful),
-            "faktury": successful,
-            "failed_invoices": [r for r in results if not r.get('success', False)]
-        }
+        except Exception as e:
+            print(f"❌ OCR Error (zapytanie zbiorcze): {str(e)}")
+            return [{"success": False, "error": f"Błąd OCR: {str(e)}"} for _ in groups], None
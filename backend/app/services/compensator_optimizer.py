@@ -0,0 +1,165 @@
+import math
+import threading
+from functools import reduce
+from typing import Dict, List, Optional, Tuple
+
+from app.services.catalog import CompensatorCatalog
+
+# Ile wyników (wersja katalogu, moc) trzymamy w pamięci
+MEMO_MAX_ENTRIES = 20000
+
+
+class _KnapsackTable:
+    """
+    Tablica DP dla jednej wersji katalogu (rozszerzana w miarę potrzeb)
+
+    best[t] = (koszt, liczba_sztuk, moc) najtańszego zestawu o mocy >= t
+    jednostek (jednostka = NWD mocy w katalogu), choice[t] = ostatnio
+    dołożony kompensator. Krotki porównywane leksykograficznie: najpierw
+    cena, potem mniej sztuk, potem mniejszy nadmiar mocy.
+    """
+
+    def __init__(self, items: List[Dict]):
+        # Odrzuć pozycje zdominowane (inna jest co najmniej tak mocna i nie droższa)
+        items = sorted(items, key=lambda c: (-c["moc_kvar"], c["cena"]))
+        kept = []
+        for item in items:
+            if not any(k["cena"] <= item["cena"] for k in kept):
+                kept.append(item)
+
+        self.items = kept
+        self.unit = reduce(math.gcd, [c["moc_kvar"] for c in kept])
+        self.steps = [(c["moc_kvar"] // self.unit, c["cena"], i) for i, c in enumerate(kept)]
+
+        # Najlepsza cena za kvar - do redukcji bardzo dużych celów
+        self.best_ratio = min(range(len(kept)), key=lambda i: (kept[i]["cena"] / kept[i]["moc_kvar"], -kept[i]["moc_kvar"]))
+        self.max_steps = max(step for step, _, _ in self.steps)
+
+        self.best: List[Tuple[int, int, int]] = [(0, 0, 0)]
+        self.choice: List[int] = [-1]
+
+    def extend(self, target: int) -> None:
+        """Dolicza tablicę do celu target (w jednostkach)"""
+        best, choice, steps = self.best, self.choice, self.steps
+        for t in range(len(best), target + 1):
+            winner = None
+            winner_idx = -1
+            for step, cost, idx in steps:
+                prev = best[t - step] if t > step else (0, 0, 0)
+                candidate = (prev[0] + cost, prev[1] + 1, prev[2] + step)
+                if winner is None or candidate < winner:
+                    winner, winner_idx = candidate, idx
+            best.append(winner)
+            choice.append(winner_idx)
+
+    def solve(self, target: int) -> Dict[int, int]:
+        """Zestaw (indeks pozycji -> ilość) o mocy >= target jednostek"""
+        counts: Dict[int, int] = {}
+
+        # Bardzo duży cel: optymalny zestaw ma mniej niż moc_best pozycji innych
+        # niż "najtańsza za kvar", więc nadmiar ponad moc_best × moc_max
+        # wypełniamy nią od razu, a DP liczy tylko resztę (wynik dokładny)
+        best_step = self.items[self.best_ratio]["moc_kvar"] // self.unit
+        bound = best_step * self.max_steps
+        if target > bound:
+            bulk = (target - bound) // best_step
+            counts[self.best_ratio] = bulk
+            target -= bulk * best_step
+
+        self.extend(target)
+        t = target
+        while t > 0:
+            idx = self.choice[t]
+            counts[idx] = counts.get(idx, 0) + 1
+            t -= self.items[idx]["moc_kvar"] // self.unit
+        return counts
+
+
+class CompensatorOptimizer:
+    """
+    Dobór najtańszego zestawu kompensatorów pokrywającego wymaganą moc
+
+    Nieograniczony problem plecakowy (każdy model w dowolnej liczbie
+    sztuk) rozwiązywany programowaniem dynamicznym po krokach mocy.
+    Wyniki są zapamiętywane per (wersja katalogu, wymagana moc w kvar),
+    a tablica DP jest współdzielona i tylko rozszerzana - kolejne
+    zapytania o mniejsze moce są natychmiastowe.
+    """
+
+    def __init__(self, catalog: CompensatorCatalog, producent: str = "LOPI", typ: str = "dynamiczny"):
+        self.catalog = catalog
+        self.producent = producent
+        self.typ = typ
+        self._lock = threading.Lock()
+        self._version = None
+        self._table: Optional[_KnapsackTable] = None
+        self._memo: Dict[Tuple[int, int], Dict] = {}
+
+    def _current_table(self) -> _KnapsackTable:
+        version = self.catalog.version
+        if version != self._version:
+            _, items = self.catalog.power_table(self.producent, self.typ)
+            if not items:
+                raise ValueError(f"Brak kompensatorów {self.producent} ({self.typ}) w katalogu")
+            self._table = _KnapsackTable(items)
+            self._memo = {}
+            self._version = version
+        return self._table
+
+    def optimize(self, moc_wymagana: float) -> Dict:
+        """
+        Najtańszy zestaw o łącznej mocy >= moc_wymagana (min. jedna sztuka)
+
+        Returns:
+            {"moc_kvar": łączna moc, "cena": łączna cena,
+             "zestaw": [{"model", "moc_kvar", "cena", "ilosc"}, ...]}
+            - nowa kopia, zapamiętany wynik nie wychodzi na zewnątrz
+
+        Raises:
+            ValueError: moc_wymagana nie jest skończoną liczbą (inf, NaN)
+        """
+        if not math.isfinite(moc_wymagana):
+            raise ValueError(f"Wymagana moc musi być skończoną liczbą: {moc_wymagana}")
+        kvar = max(math.ceil(moc_wymagana), 1)
+
+        with self._lock:
+            table = self._current_table()
+            key = (self._version, kvar)
+            cached = self._memo.get(key)
+            if cached is not None:
+                return _copy_result(cached)
+
+            counts = table.solve(-(-kvar // table.unit))
+
+            zestaw = [
+                {
+                    "model": table.items[idx]["model"],
+                    "moc_kvar": table.items[idx]["moc_kvar"],
+                    "cena": table.items[idx]["cena"],
+                    "ilosc": count
+                }
+                for idx, count in sorted(counts.items(), key=lambda kv: -table.items[kv[0]]["moc_kvar"])
+            ]
+            result = {
+                "moc_kvar": sum(z["moc_kvar"] * z["ilosc"] for z in zestaw),
+                "cena": sum(z["cena"] * z["ilosc"] for z in zestaw),
+                "zestaw": zestaw
+            }
+
+            if len(self._memo) >= MEMO_MAX_ENTRIES:
+                self._memo.clear()
+            self._memo[key] = result
+            return _copy_result(result)
+
+
+def _copy_result(result: Dict) -> Dict:
+    """Kopia wyniku optimize() - wywołujący mogą go modyfikować bez psucia pamięci"""
+    return {**result, "zestaw": [dict(z) for z in result["zestaw"]]}
+
+
+def describe_set(zestaw: List[Dict]) -> str:
+    """Opis zestawu do rekomendacji ("2× LOPI LKD 30 PRO + LOPI LKD 10 PRO")"""
+    return " + ".join(
+        z["model"] if z["ilosc"] == 1 else f"{z['ilosc']}× {z['model']}"
+        for z in zestaw
+    )
@@ -0,0 +1,282 @@
+import importlib.util
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, TypeVar
+
+import anthropic
+import httpx
+import openai
+
+# Statusy HTTP, przy których warto ponowić zapytanie (limit / przeciążenie API)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 529}
+
+# Błędy sieci (bez odpowiedzi HTTP) - też przejściowe
+CONNECTION_ERRORS = (anthropic.APIConnectionError, openai.APIConnectionError, httpx.TransportError)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Backend odcięty przez circuit breaker - zapytanie nie zostało wysłane"""
+
+
+class DeadlineExceededError(Exception):
+    """Minął czas przeznaczony na wywołanie (łącznie z ponowieniami)"""
+
+
+@dataclass
+class TransportConfig:
+    """Ustawienia wspólnego transportu HTTP dla backendów Vision"""
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_s: float = 30.0
+    http2: bool = False
+    connect_timeout_s: float = 10.0
+    deadline_s: float = 120.0
+    max_retries: int = 4
+    backoff_base_s: float = 1.0
+    backoff_max_s: float = 30.0
+    retry_budget_ratio: float = 0.2
+    retry_budget_reserve: float = 10.0
+    breaker_failures: int = 5
+    breaker_reset_s: float = 30.0
+
+
+class RetryBudget:
+    """
+    Budżet ponowień (token bucket)
+
+    Każde zapytanie dokłada ratio tokenu, każde ponowienie zabiera jeden.
+    Przy awarii API ponowienia zużywają rezerwę i dalej są ograniczone
+    do ~ratio × liczba zapytań - ponawianie nie zwielokrotnia ruchu.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = reserve
+        self.tokens = reserve
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        """Czy wolno ponowić (zabiera token)"""
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.denied += 1
+            return False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker dla jednego backendu
+
+    Po failures kolejnych błędach przejściowych (5xx, 429, timeout) odcina
+    backend na reset_s sekund - zapytania od razu kończą się
+    CircuitOpenError zamiast czekać na timeout. Potem przepuszcza jedno
+    zapytanie próbne: sukces zamyka obwód, błąd otwiera go ponownie.
+    """
+
+    def __init__(self, name: str, failures: int = 5, reset_s: float = 30.0):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_s = reset_s
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Sprawdza, czy można wysłać zapytanie
+
+        Raises:
+            CircuitOpenError: obwód otwarty (albo trwa już zapytanie próbne)
+        """
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_s:
+                self.state = "half_open"
+                return
+            if self.state != "closed":
+                self.short_circuited += 1
+                raise CircuitOpenError(f"{self.name}: backend chwilowo wyłączony po serii błędów")
+
+    def allows_request(self) -> bool:
+        """Czy zapytanie zostałoby przepuszczone (bez zmiany stanu)"""
+        with self._lock:
+            return self.state == "closed" or (
+                self.state == "open" and time.monotonic() - self.opened_at >= self.reset_s
+            )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"🔌 Circuit breaker {self.name}: otwarty na {self.reset_s:.0f}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class VisionTransport:
+    """
+    Wspólny transport HTTP dla backendów Vision (Anthropic, OpenAI)
+
+    Jedna pula połączeń httpx (limity, keep-alive, opcjonalnie HTTP/2)
+    współdzielona przez klienty SDK, a do tego polityka wywołań: deadline
+    na całe wywołanie z ponowieniami, backoff, budżet ponowień i circuit
+    breaker per backend. SDK dostają max_retries=0 - ponawiamy tylko tu.
+    """
+
+    def __init__(self, config: Optional[TransportConfig] = None):
+        self.config = config or TransportConfig()
+        self.retry_budget = RetryBudget(self.config.retry_budget_ratio, self.config.retry_budget_reserve)
+        self.requests = 0
+        self.retries = 0
+        self.deadlines_exceeded = 0
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+        http2 = self.config.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("⚠️  HTTP/2 wymaga pakietu h2 (pip install httpx[http2]) - używam HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+
+        self.http_client = httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive_connections,
+                keepalive_expiry=self.config.keepalive_expiry_s
+            ),
+            timeout=httpx.Timeout(self.config.deadline_s, connect=self.config.connect_timeout_s),
+            follow_redirects=True
+        )
+
+    def anthropic_client(self, api_key: str, base_url: Optional[str] = None) -> anthropic.Anthropic:
+        """Klient Anthropic na wspólnej puli połączeń"""
+        return anthropic.Anthropic(api_key=api_key, base_url=base_url, max_retries=0, http_client=self.http_client)
+
+    def openai_client(self, api_key: str, base_url: Optional[str] = None) -> openai.OpenAI:
+        """Klient OpenAI na wspólnej puli połączeń"""
+        return openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=self.http_client)
+
+    def breaker(self, backend: str) -> CircuitBreaker:
+        with self._lock:
+            if backend not in self._breakers:
+                self._breakers[backend] = CircuitBreaker(
+                    backend, self.config.breaker_failures, self.config.breaker_reset_s
+                )
+            return self._breakers[backend]
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """
+        Czas oczekiwania przed kolejną próbą
+
+        Respektuje nagłówek retry-after z API, w przeciwnym razie
+        exponential backoff z jitterem (żeby równoległe wątki się nie zsynchronizowały)
+        """
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.config.backoff_max_s)
+                except ValueError:
+                    pass
+
+        delay = min(self.config.backoff_base_s * (2 ** attempt), self.config.backoff_max_s)
+        return delay * (0.5 + random.random() / 2)
+
+    def call(self, backend: str, fn: Callable[[httpx.Timeout], T], deadline_s: Optional[float] = None) -> T:
+        """
+        Wywołuje API z deadlinem, ponowieniami i circuit breakerem
+
+        Args:
+            backend: Nazwa backendu (osobny circuit breaker dla każdego)
+            fn: Wywołanie SDK, dostaje timeout = czas pozostały do deadline'u
+            deadline_s: Limit czasu na całe wywołanie (domyślnie z konfiguracji)
+
+        Raises:
+            CircuitOpenError: backend odcięty po serii błędów
+            DeadlineExceededError: deadline minął przed udaną odpowiedzią
+            Błąd SDK: błąd nieprzejściowy albo wyczerpane ponowienia
+        """
+        breaker = self.breaker(backend)
+        deadline = time.monotonic() + (deadline_s if deadline_s is not None else self.config.deadline_s)
+        self.retry_budget.deposit()
+        with self._lock:
+            self.requests += 1
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                with self._lock:
+                    self.deadlines_exceeded += 1
+                raise DeadlineExceededError(f"{backend}: przekroczony czas odpowiedzi")
+
+            breaker.before_call()
+            try:
+                result = fn(httpx.Timeout(remaining, connect=min(self.config.connect_timeout_s, remaining)))
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                transient = status in RETRYABLE_STATUS_CODES or (status is None and isinstance(e, CONNECTION_ERRORS))
+                if not transient:
+                    # API odpowiedziało (np. 400) - backend działa
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+
+                delay = self._retry_delay(attempt, e)
+                if attempt >= self.config.max_retries or delay >= deadline - time.monotonic():
+                    raise
+                if not self.retry_budget.withdraw():
+                    print(f"⚠️  {backend}: budżet ponowień wyczerpany - nie ponawiam")
+                    raise
+
+                print(f"⏳ {backend} {status or 'connection error'} - ponawiam za {delay:.1f}s "
+                      f"(próba {attempt + 1}/{self.config.max_retries})")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            breaker.record_success()
+            return result
+
+    def stats(self) -> Dict:
+        """Stan puli i polityki wywołań (do /api/health)"""
+        with self._lock:
+            breakers = {
+                name: {"state": b.state, "failures": b.failures, "short_circuited": b.short_circuited}
+                for name, b in self._breakers.items()
+            }
+        return {
+            "max_connections": self.config.max_connections,
+            "max_keepalive_connections": self.config.max_keepalive_connections,
+            "http2": self.http2,
+            "requests": self.requests,
+            "retries": self.retries,
+            "retries_denied": self.retry_budget.denied,
+            "retry_budget_tokens": round(self.retry_budget.tokens, 2),
+            "deadlines_exceeded": self.deadlines_exceeded,
+            "breakers": breakers
+        }
+
+    def close(self) -> None:
+        self.http_client.close()
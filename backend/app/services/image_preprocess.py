@@ -0,0 +1,209 @@
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageOps
+
+# Dłuższy bok obrazu, powyżej którego Claude i tak skaluje w dół
+# (~1.15 MP) - większe zdjęcie to tylko więcej bajtów do wysłania
+MAX_IMAGE_PX = 1568
+MAX_IMAGE_PIXELS = 1_150_000
+
+# Docelowy rozmiar JPEG po kompresji (bajty)
+IMAGE_BYTE_BUDGET = 350_000
+
+# Kolejne jakości JPEG przy dopasowaniu do budżetu
+JPEG_QUALITIES = (85, 75, 65, 55)
+
+# Próg różnicy jasności od tła przy przycinaniu ramki (0-255)
+BORDER_THRESHOLD = 40
+
+# Margines zostawiany wokół treści po przycięciu (ułamek wymiaru)
+BORDER_MARGIN = 0.02
+
+# Rozmiar miniatury do wykrywania ramki (uśrednianie gasi szum zdjęcia)
+BORDER_PROBE_PX = 256
+
+
+def _crop_border(img: Image.Image) -> Image.Image:
+    """
+    Przycina jednolitą ramkę wokół kartki (blat stołu, tło skanera)
+
+    Ramkę szukamy na uśrednionej miniaturze, kolor tła bierzemy z jej
+    rogów. Przycinamy tylko wtedy, gdy treść zajmuje wyraźnie mniej niż
+    całe zdjęcie.
+    """
+    width, height = img.size
+    probe_scale = min(1.0, BORDER_PROBE_PX / max(width, height))
+    probe = (img if img.mode == "L" else img.convert("L")).resize(
+        (max(1, round(width * probe_scale)), max(1, round(height * probe_scale))), Image.BOX
+    )
+    pw, ph = probe.size
+    corners = [probe.getpixel((0, 0)), probe.getpixel((pw - 1, 0)),
+               probe.getpixel((0, ph - 1)), probe.getpixel((pw - 1, ph - 1))]
+    background = sorted(corners)[len(corners) // 2]
+
+    diff = ImageChops.difference(probe, Image.new("L", probe.size, background))
+    bbox = diff.point(lambda p: 255 if p > BORDER_THRESHOLD else 0).getbbox()
+    if bbox is None:
+        return img
+
+    left, top, right, bottom = (round(v / probe_scale) for v in bbox)
+    if (right - left) * (bottom - top) > 0.9 * width * height:
+        return img
+
+    margin_x, margin_y = int(width * BORDER_MARGIN), int(height * BORDER_MARGIN)
+    return img.crop((
+        max(0, left - margin_x), max(0, top - margin_y),
+        min(width, right + margin_x), min(height, bottom + margin_y)
+    ))
+
+
+def preprocess_image(
+    image_path: str,
+    max_px: int = MAX_IMAGE_PX,
+    byte_budget: int = IMAGE_BYTE_BUDGET,
+    grayscale: bool = True
+) -> Tuple[bytes, Dict]:
+    """
+    Przygotowuje zdjęcie faktury do wysłania do Vision
+
+    Obrót wg EXIF, przycięcie ramki, skala szarości, zmniejszenie do
+    rozdzielczości, którą model faktycznie wykorzystuje, i JPEG
+    mieszczący się w byte_budget (niższa jakość, w ostateczności
+    dalsze zmniejszenie).
+
+    Returns:
+        (JPEG bytes, statystyki: bajty i wymiary przed/po)
+    """
+    with open(image_path, "rb") as f:
+        original = f.read()
+
+    mode = "L" if grayscale else "RGB"
+    with Image.open(io.BytesIO(original)) as src:
+        size_in = src.size
+        src.draft(mode, (max_px, max_px))  # JPEG: dekodowanie od razu w mniejszej skali
+        img = ImageOps.exif_transpose(src).convert(mode)
+
+    img = _crop_border(img)
+
+    scale = min(1.0, max_px / max(img.size), (MAX_IMAGE_PIXELS / (img.width * img.height)) ** 0.5)
+    if scale < 1.0:
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+
+    while True:
+        for quality in JPEG_QUALITIES:
+            buffer = io.BytesIO()
+            img.save(buffer, "JPEG", quality=quality, optimize=True)
+            if buffer.tell() <= byte_budget:
+                break
+        if buffer.tell() <= byte_budget or max(img.size) <= 512:
+            break
+        img = img.resize((round(img.width * 0.8), round(img.height * 0.8)), Image.LANCZOS)
+
+    data = buffer.getvalue()
+    return data, {
+        "bytes_in": len(original),
+        "bytes_out": len(data),
+        "size_in": size_in,
+        "size_out": img.size,
+        "quality": quality
+    }
+
+
+class ImagePreprocessor:
+    """
+    Preprocessing zdjęć faktur w puli procesów
+
+    Dekodowanie i kompresja dużych JPEG z telefonu trwa setki ms i
+    trzyma GIL - w osobnym procesie nie blokuje wątków obsługujących
+    zapytania. workers=0 = w bieżącym procesie. Plik, którego Pillow
+    nie otworzy, idzie bez zmian (None).
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_px: int = MAX_IMAGE_PX,
+        byte_budget: int = IMAGE_BYTE_BUDGET,
+        grayscale: bool = True
+    ):
+        """
+        Args:
+            workers: Liczba procesów (0 = bez puli)
+            max_px: Maksymalny dłuższy bok po zmniejszeniu
+            byte_budget: Docelowy rozmiar JPEG (bajty)
+            grayscale: Czy konwertować do skali szarości
+        """
+        self.workers = workers
+        self.max_px = max_px
+        self.byte_budget = byte_budget
+        self.grayscale = grayscale
+        self.images = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: fork procesu z wątkami (uvicorn, httpx) bywa niebezpieczny
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def process(self, image_path: str, max_px: Optional[int] = None) -> Optional[bytes]:
+        """
+        JPEG gotowy do wysłania albo None (nie udało się przetworzyć)
+
+        Args:
+            image_path: Ścieżka do zdjęcia
+            max_px: Inny limit dłuższego boku (np. mniejszy dla lekkiego zapytania)
+        """
+        args = (image_path, max_px or self.max_px, self.byte_budget, self.grayscale)
+        try:
+            if self.workers > 0:
+                try:
+                    data, info = self._executor().submit(preprocess_image, *args).result()
+                except BrokenProcessPool:
+                    with self._lock:
+                        self._pool = None
+                    data, info = preprocess_image(*args)
+            else:
+                data, info = preprocess_image(*args)
+        except Exception as e:
+            print(f"⚠️  Preprocessing obrazu nie powiódł się ({str(e)}) - wysyłam oryginał")
+            with self._lock:
+                self.failed += 1
+            return None
+
+        with self._lock:
+            self.images += 1
+            self.bytes_in += info["bytes_in"]
+            self.bytes_out += info["bytes_out"]
+        print(f"🖼️  Obraz {info['size_in'][0]}x{info['size_in'][1]} {info['bytes_in'] // 1024} KB → "
+              f"{info['size_out'][0]}x{info['size_out'][1]} {info['bytes_out'] // 1024} KB (q{info['quality']})")
+        return data
+
+    def stats(self) -> Dict:
+        """Liczba obrazów i bajty przed/po (do /api/health)"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "images": self.images,
+                "failed": self.failed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,137 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+
+class _ExactSum:
+    """
+    Dokładna suma floatów z dodawaniem i odejmowaniem w O(1)
+
+    Trzyma nienakładające się częściowe sumy (partials Shewchuka, jak
+    w math.fsum). Odjęcie wartości to dodanie jej z minusem - też
+    dokładne, więc po usunięciu faktury suma jest taka, jakby jej nigdy
+    nie było. Partials jest najwyżej kilkadziesiąt (zakres wykładników
+    double), zwykle 1-2.
+    """
+
+    __slots__ = ("_partials",)
+
+    def __init__(self):
+        self._partials: List[float] = []
+
+    def add(self, x: float) -> None:
+        partials = self._partials
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                partials[i] = lo
+                i += 1
+            x = hi
+        partials[i:] = [x]
+
+    @property
+    def value(self) -> float:
+        """Suma poprawnie zaokrąglona do float"""
+        return math.fsum(self._partials)
+
+
+class InvoiceAggregator:
+    """
+    Sumy z wielu faktur liczone przyrostowo
+
+    Trzyma bieżące sumy energii biernej, miesięcy, licznika średniego
+    tgφ (tgφ × energia bierna) i energii czynnej, więc dodanie, usunięcie
+    albo podmiana jednej faktury to O(1) - bez ponownego przeliczania
+    całej listy. Sumy są dokładne (_ExactSum), więc wynik nie zależy od
+    kolejności dodawania ani od wcześniejszych usunięć.
+
+    Jedyne miejsce, w którym liczymy średni tgφ - używają go
+    aggregate_invoice_data (OCR) i calculate_from_multiple_invoices.
+    """
+
+    def __init__(self, invoices: Optional[Iterable[Dict]] = None):
+        self._invoices: Dict[int, Dict] = {}
+        self._next_key = 0
+        self._energia_bierna = _ExactSum()
+        self._tg_licznik = _ExactSum()
+        self._energia_czynna = _ExactSum()
+        self._okres_mc = 0
+        self._tg_liczba = 0
+        self._czynna_liczba = 0
+
+        for invoice in invoices or []:
+            self.add(invoice)
+
+    def _apply(self, invoice: Dict, sign: int) -> None:
+        """Dolicza (sign=1) albo odejmuje (sign=-1) wkład jednej faktury"""
+        energia = float(invoice.get("energia_bierna_kwh") or 0)
+        tg_phi = invoice.get("tg_phi")
+        czynna = invoice.get("energia_czynna_kwh")
+
+        self._energia_bierna.add(sign * energia)
+        self._okres_mc += sign * (invoice.get("okres_mc") or 1)
+        if tg_phi:
+            self._tg_licznik.add(sign * (tg_phi * energia))
+            self._tg_liczba += sign
+        if czynna:
+            self._energia_czynna.add(sign * float(czynna))
+            self._czynna_liczba += sign
+
+    def add(self, invoice: Dict) -> int:
+        """
+        Dodaje fakturę (wynik OCR z success=True)
+
+        Returns:
+            Klucz faktury - do remove() / replace()
+        """
+        key = self._next_key
+        self._next_key += 1
+        self._invoices[key] = invoice
+        self._apply(invoice, 1)
+        return key
+
+    def remove(self, key: int) -> Dict:
+        """Usuwa fakturę dodaną wcześniej przez add() i ją zwraca"""
+        invoice = self._invoices.pop(key)
+        self._apply(invoice, -1)
+        return invoice
+
+    def replace(self, key: int, invoice: Dict) -> None:
+        """Podmienia fakturę (np. po ręcznej poprawce wartości z OCR)"""
+        self._apply(self._invoices[key], -1)
+        self._invoices[key] = invoice
+        self._apply(invoice, 1)
+
+    def __len__(self) -> int:
+        return len(self._invoices)
+
+    @property
+    def invoices(self) -> List[Dict]:
+        """Faktury w kolejności dodania"""
+        return list(self._invoices.values())
+
+    @property
+    def energia_bierna_kwh(self) -> float:
+        return self._energia_bierna.value
+
+    @property
+    def okres_mc(self) -> int:
+        return self._okres_mc
+
+    def tg_phi(self, default: Optional[float] = None) -> Optional[float]:
+        """
+        Średni tgφ ważony energią bierną
+
+        Gdy żadna faktura nie podaje tgφ - liczony z energii czynnej
+        (bierna / czynna), a gdy i tej brak - default.
+        """
+        energia = self.energia_bierna_kwh
+        if self._tg_liczba and energia:
+            return self._tg_licznik.value / energia
+        czynna = self._energia_czynna.value
+        if self._czynna_liczba and czynna > 0:
+            return energia / czynna
+        return default
@@ -0,0 +1,325 @@
+import ipaddress
+import json
+import os
+import queue
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional
+
+from app.services.upload_ingest import IngestedUpload
+
+# Statusy zadania
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+# Timeout wysyłki webhooka (sekundy)
+WEBHOOK_TIMEOUT_S = 10
+
+
+class JobQueueFullError(Exception):
+    """Za dużo zadań czekających w kolejce"""
+
+
+class JobFailedError(Exception):
+    """Błąd przetwarzania zadania z komunikatem dla klienta"""
+
+
+def validate_webhook_url(url: str, allowed_hosts: Optional[List[str]] = None) -> None:
+    """
+    Sprawdza, czy webhook wolno wysłać (ochrona przed SSRF)
+
+    Tylko http(s) i tylko hosty, które rozwiązują się wyłącznie na adresy
+    publiczne - bez localhost, sieci prywatnych, link-local (metadane
+    chmury) i adresów zarezerwowanych. Z allowed_hosts - tylko te hosty.
+
+    Raises:
+        ValueError: adres niedozwolony (komunikat dla klienta)
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("webhook_url musi być adresem http(s)")
+
+    host = parsed.hostname.lower()
+    if allowed_hosts and host not in allowed_hosts:
+        raise ValueError(f"Host {host} nie jest na liście dozwolonych webhooków")
+
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError):
+        raise ValueError(f"Nie można rozwiązać hosta webhooka {host}")
+
+    for address in addresses:
+        # "fe80::1%eth0" - strefa nie jest częścią adresu
+        if not ipaddress.ip_address(address.split("%", 1)[0]).is_global:
+            raise ValueError(f"webhook_url wskazuje na adres niepubliczny ({address})")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Webhook nie podąża za przekierowaniami (mogłyby prowadzić do sieci wewnętrznej)"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_webhook_opener = urllib.request.build_opener(_NoRedirect)
+
+
+class JobQueue:
+    """
+    Trwała kolejka zadań analizy faktur (SQLite + pula wątków)
+
+    submit() przenosi przesłane pliki do katalogu zadania, zapisuje
+    zadanie w bazie i od razu zwraca jego id - HTTP request nie czeka
+    na OCR. Workery przetwarzają zadania po kolei, zapisując postęp po
+    każdej fakturze. Po restarcie zadania "queued" i przerwane "running"
+    wracają do kolejki (pliki leżą na dysku, więc nic nie ginie).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        jobs_dir: str,
+        processor: Callable[[List[IngestedUpload], bool, Callable[[Dict], None]], Dict],
+        worker_count: int = 2,
+        max_pending: int = 1000,
+        retention_s: int = 7 * 24 * 3600,
+        webhook_allowed_hosts: Optional[List[str]] = None
+    ):
+        """
+        Args:
+            db_path: Ścieżka bazy SQLite z zadaniami
+            jobs_dir: Katalog na pliki zadań (jeden podkatalog na zadanie)
+            processor: Funkcja (pliki, ma_pv, zapisz_postęp) -> wynik zadania
+            worker_count: Ile zadań przetwarzać równolegle
+            max_pending: Limit zadań czekających w kolejce
+            retention_s: Po jakim czasie usuwać zakończone zadania
+            webhook_allowed_hosts: Jedyne hosty, na które wolno wysyłać webhooki (None = publiczne adresy)
+        """
+        self.db_path = db_path
+        self.jobs_dir = jobs_dir
+        self.processor = processor
+        self.worker_count = worker_count
+        self.max_pending = max_pending
+        self.retention_s = retention_s
+        self.webhook_allowed_hosts = [h.lower() for h in webhook_allowed_hosts or []]
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        os.makedirs(jobs_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                ma_pv INTEGER NOT NULL,
+                webhook_url TEXT,
+                files TEXT NOT NULL,
+                progress TEXT NOT NULL,
+                result TEXT,
+                error TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        self._conn.commit()
+
+    def start(self) -> None:
+        """Wznawia niedokończone zadania z bazy i uruchamia workery"""
+        if self._workers:
+            return
+
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.retention_s,)
+            )
+            self._conn.execute("UPDATE jobs SET status = ? WHERE status = ?", (JOB_QUEUED, JOB_RUNNING))
+            self._conn.commit()
+            pending = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (JOB_QUEUED,)
+            ).fetchall()
+
+        for (job_id,) in pending:
+            self._queue.put(job_id)
+        if pending:
+            print(f"🔁 Wznawiam {len(pending)} zadań z kolejki")
+
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, uploads: List[IngestedUpload], ma_pv: bool, webhook_url: Optional[str] = None) -> str:
+        """
+        Dodaje zadanie do kolejki (pliki są przenoszone do katalogu zadania)
+
+        Returns:
+            Id zadania
+
+        Raises:
+            JobQueueFullError: kolejka ma już max_pending czekających zadań
+            ValueError: niedozwolony webhook_url (validate_webhook_url)
+        """
+        if webhook_url:
+            validate_webhook_url(webhook_url, self.webhook_allowed_hosts)
+
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        targets = [os.path.join(job_dir, f"{i}{os.path.splitext(u.path)[1]}") for i, u in enumerate(uploads)]
+        files = [{**asdict(upload), "path": target} for upload, target in zip(uploads, targets)]
+        progress = {"total": len(files), "done": 0, "faktury": []}
+
+        # Sprawdzenie limitu i zapis w jednej sekcji krytycznej - równoległe
+        # submit() nie przekroczą max_pending. Zadanie trafia do kolejki workerów
+        # dopiero po przeniesieniu plików.
+        with self._lock:
+            (pending,) = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (JOB_QUEUED,)
+            ).fetchone()
+            if pending >= self.max_pending:
+                raise JobQueueFullError("Kolejka zadań jest pełna, spróbuj później")
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, created_at, ma_pv, webhook_url, files, progress) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, time.time(), int(ma_pv), webhook_url,
+                 json.dumps(files, ensure_ascii=False), json.dumps(progress))
+            )
+            self._conn.commit()
+
+        try:
+            os.makedirs(job_dir)
+            for upload, target in zip(uploads, targets):
+                shutil.move(upload.path, target)
+                upload.path = target
+        except OSError:
+            with self._lock:
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                self._conn.commit()
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        self._queue.put(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Stan zadania (status, postęp, wynik albo błąd) lub None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, created_at, started_at, finished_at, progress, result, error "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "created_at": row[2],
+            "started_at": row[3],
+            "finished_at": row[4],
+            "progress": json.loads(row[5]),
+            "result": json.loads(row[6]) if row[6] else None,
+            "error": row[7]
+        }
+
+    def stats(self) -> Dict:
+        """Liczba zadań w każdym statusie (do /api/health)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {
+            "workers": self.worker_count,
+            "pending": self._queue.qsize(),
+            **{status: count for status, count in rows}
+        }
+
+    def _update(self, job_id: str, **fields) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _worker_loop(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._run_job(job_id)
+            except Exception as e:
+                print(f"❌ Zadanie {job_id}: nieoczekiwany błąd workera: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _run_job(self, job_id: str) -> None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, ma_pv, webhook_url, files, progress FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None or row[0] != JOB_QUEUED:
+            return
+
+        _, ma_pv, webhook_url, files_json, _ = row
+        uploads = [IngestedUpload(**f) for f in json.loads(files_json)]
+        # Zadanie przerwane restartem liczymy od nowa (wyniki OCR są w cache)
+        progress = {"total": len(uploads), "done": 0, "faktury": []}
+        progress_lock = threading.Lock()
+
+        def save_progress(invoice: Dict) -> None:
+            # Wywoływane z wątków OCR po każdej fakturze
+            with progress_lock:
+                progress["faktury"].append(invoice)
+                progress["done"] = len(progress["faktury"])
+                self._update(job_id, progress=json.dumps(progress, ensure_ascii=False))
+
+        print(f"⚙️  Zadanie {job_id}: start ({len(uploads)} plików)")
+        self._update(job_id, status=JOB_RUNNING, started_at=time.time())
+
+        try:
+            result = self.processor(uploads, bool(ma_pv), save_progress)
+            self._update(
+                job_id, status=JOB_DONE, finished_at=time.time(),
+                result=json.dumps(result, ensure_ascii=False)
+            )
+            print(f"✅ Zadanie {job_id}: gotowe")
+        except Exception as e:
+            error = str(e) if isinstance(e, JobFailedError) else f"Błąd przetwarzania: {str(e)}"
+            self._update(job_id, status=JOB_FAILED, finished_at=time.time(), error=error)
+            print(f"❌ Zadanie {job_id}: {error}")
+        finally:
+            shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+
+        if webhook_url:
+            self._send_webhook(webhook_url, self.get(job_id))
+
+    def _send_webhook(self, url: str, job: Dict) -> None:
+        """
+        POST z końcowym stanem zadania (błąd wysyłki tylko logujemy)
+
+        Adres sprawdzamy ponownie tuż przed wysyłką - DNS mógł się zmienić
+        od przyjęcia zadania (zadanie mogło czekać w kolejce nawet po restarcie).
+        """
+        body = json.dumps(job, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            validate_webhook_url(url, self.webhook_allowed_hosts)
+            with _webhook_opener.open(request, timeout=WEBHOOK_TIMEOUT_S) as response:
+                response.read()
+        except Exception as e:
+            print(f"⚠️  Webhook {url} dla zadania {job['job_id']} nie powiódł się: {str(e)}")
@@ -0,0 +1,392 @@
+import base64
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from app.services.http_transport import VisionTransport
+from app.services.image_preprocess import ImagePreprocessor
+from app.services.ocr_parsing import normalize_batch_result, normalize_invoice_result, parse_vision_json
+from app.services.pdf_text_extractor import (
+    extract_invoice_from_text,
+    extract_text_pages,
+    select_pages
+)
+
+# Ile stron PDF wysyłamy do Vision w kolejnych próbach (None = wszystkie)
+# Najpierw tylko najlepiej ocenione strony, szerzej gdy odczyt się nie uda
+PAGE_TOP_K_STEPS = (3, 6, None)
+
+# Maksymalna liczba stron PDF branych pod uwagę
+MAX_PDF_PAGES = 15
+
+# Lekkie zapytanie (hedging): tylko najlepsze strony, mniejszy zoom,
+# zdjęcia zmniejszane do tego rozmiaru dłuższego boku
+LITE_TOP_K = 2
+LITE_ZOOM_FACTOR = 0.6
+LITE_MAX_IMAGE_PX = 1000
+
+# Pakowanie kilku faktur w jedno zapytanie: tylko faktury do tylu stron,
+# szacowany rozmiar strony PDF (skan renderowany do JPEG)
+PACK_MAX_PAGES_PER_INVOICE = 2
+PACK_PDF_PAGE_BYTES = 400_000
+
+# Media type obrazów po rozszerzeniu pliku
+MEDIA_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp'
+}
+
+
+def merge_token_usage(*usages: Optional[Dict]) -> Optional[Dict]:
+    """Suma zużycia tokenów (input/output/cache_read/cache_write) z kilku wywołań"""
+    usages = [u for u in usages if u]
+    if not usages:
+        return None
+    return {key: sum(u.get(key, 0) for u in usages) for key in ("input", "output", "cache_read", "cache_write")}
+
+
+def split_token_usage(usage: Optional[Dict], count: int) -> List[Optional[Dict]]:
+    """Dzieli zużycie tokenów zapytania zbiorczego równo między faktury (reszta na pierwszą)"""
+    if not usage:
+        return [None] * count
+    shares = [{key: value // count for key, value in usage.items()} for _ in range(count)]
+    for key, value in usage.items():
+        shares[0][key] += value % count
+    return shares
+
+
+class OCRBackend:
+    """
+    Wspólny interfejs backendów OCR
+
+    Backend odczytuje jedną fakturę (bez cache - tym zajmuje się OCRRouter)
+    i zwraca dict w formacie wyniku OCR (energia_bierna_kwh, tg_phi,
+    okres_mc, ..., success, error).
+    """
+
+    # Nazwa backendu (statystyki, circuit breaker)
+    name = "ocr"
+    # Wersja modelu/promptu - część klucza cache
+    version = "ocr:1"
+    # Względny koszt wywołania (0 = lokalny, darmowy)
+    cost = 1.0
+
+    def available(self) -> bool:
+        """Czy backend przyjmuje teraz zapytania (np. circuit breaker zamknięty)"""
+        return True
+
+    def analyze_file(self, path: str, deadline: Optional[float] = None, lite: bool = False) -> Dict:
+        """
+        Args:
+            path: Ścieżka do pliku faktury
+            deadline: Chwila (time.monotonic()), po której nie wysyłamy już zapytań
+            lite: Lżejsze zapytanie (mniej stron, mniejsza rozdzielczość) - hedging
+        """
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        """Statystyki backendu (do /api/health), domyślnie brak"""
+        return {}
+
+
+class TextLayerBackend(OCRBackend):
+    """
+    Odczyt z warstwy tekstowej PDF (regexy dostawców, bez sieci i bez kosztów)
+
+    Działa dla faktur generowanych cyfrowo - skany i zdjęcia zwracają
+    success=False i trafiają do backendów Vision.
+    """
+
+    name = "text_layer"
+    version = "text_layer:1"
+    cost = 0.0
+
+    def analyze_file(self, path: str, deadline: Optional[float] = None, lite: bool = False) -> Dict:
+        if os.path.splitext(path)[1].lower() != '.pdf':
+            return {"success": False, "error": "Brak warstwy tekstowej (plik nie jest PDF)"}
+
+        result = extract_invoice_from_text(extract_text_pages(path))
+        if result is None:
+            return {"success": False, "error": "Brak danych o energii biernej w warstwie tekstowej PDF"}
+
+        print(f"📝 Odczytano z warstwy tekstowej PDF: {result}")
+        return result
+
+
+class VisionBackend(OCRBackend):
+    """
+    Baza backendów Vision (Claude, GPT-4o)
+
+    Wspólne: renderowanie stron PDF do JPEG, wybór najlepszych stron
+    (top-k, poszerzany gdy odczyt się nie uda), preprocessing zdjęć
+    (ImagePreprocessor) i odczyt odpowiedzi: dane z tool use /
+    structured output, a gdy ich brak - tolerancyjny parser tekstu.
+    Liczniki parsowania pokazują, ile wywołań uratował parser.
+    Podklasa implementuje tylko _extract_with_vision - wywołanie API.
+    """
+
+    # Nazwa backendu w VisionTransport (circuit breaker)
+    transport_backend = "vision"
+    # Czy backend obsługuje kilka faktur w jednym zapytaniu (analyze_batch)
+    supports_packing = False
+
+    def __init__(
+        self,
+        transport: Optional[VisionTransport] = None,
+        preprocessor: Optional[ImagePreprocessor] = None
+    ):
+        self.transport = transport or VisionTransport()
+        self.preprocessor = preprocessor or ImagePreprocessor(workers=0)
+        self.parse_counters = {"structured_ok": 0, "fallback_ok": 0, "fallback_naprawiony": 0, "blad_parsowania": 0}
+        self._parse_lock = threading.Lock()
+
+    def available(self) -> bool:
+        return self.transport.breaker(self.transport_backend).allows_request()
+
+    def _time_left(self, deadline: Optional[float]) -> Optional[float]:
+        """Czas na wywołanie API: do deadline'u faktury, ale nie dłużej niż deadline transportu"""
+        if deadline is None:
+            return None
+        return min(deadline - time.monotonic(), self.transport.config.deadline_s)
+
+    def _render_params(self, text: str, lite: bool = False) -> tuple:
+        """
+        Dobiera zoom i jakość JPEG dla strony
+
+        Strona z warstwą tekstową ma ostre, wektorowe znaki - wystarczy
+        mniejsza rozdzielczość. Skan (brak tekstu) albo gęsta tabela
+        potrzebują więcej pikseli, żeby model odczytał cyfry.
+        """
+        if not text.strip():
+            zoom, quality = 2.0, 85  # skan
+        elif len(text) > 3000:
+            zoom, quality = 2.0, 80  # gęsta tabela
+        else:
+            zoom, quality = 1.5, 75
+
+        if lite:
+            return zoom * LITE_ZOOM_FACTOR, quality - 10
+        return zoom, quality
+
+    def pdf_to_images(
+        self,
+        pdf_path: str,
+        max_pages: int = MAX_PDF_PAGES,
+        top_k: Optional[int] = None,
+        lite: bool = False
+    ) -> list:
+        """
+        Konwertuje strony PDF na obrazy JPEG
+
+        Strony są oceniane po warstwie tekstowej (słowa kluczowe, tabele)
+        i wysyłane jest tylko top_k najlepszych - regulaminy i pisma
+        przewodnie odpadają. Zoom i jakość dobierane są dla każdej strony.
+
+        Returns: Lista JPEG bytes dla wybranych stron (max 15 stron)
+        """
+        doc = fitz.open(pdf_path)
+        images = []
+
+        num_pages = min(len(doc), max_pages)
+        texts = [doc.load_page(i).get_text() for i in range(num_pages)]
+        selected = select_pages(texts, top_k)
+
+        print(f"📄 PDF ma {len(doc)} stron, konwertuję {len(selected)}: {[i + 1 for i in selected]}")
+
+        for page_num in selected:
+            page = doc.load_page(page_num)
+            zoom, quality = self._render_params(texts[page_num], lite)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            images.append(pix.tobytes("jpg", jpg_quality=quality))
+
+        doc.close()
+        return images
+
+    def encode_image_to_base64(
+        self,
+        image_path: str,
+        top_k: Optional[int] = None,
+        lite: bool = False
+    ) -> List[Tuple[str, str]]:
+        """
+        Konwertuje obraz/PDF do base64 + wykrywa media type
+        Automatycznie konwertuje PDF → JPEG (top_k najlepszych stron),
+        zdjęcia przechodzą przez preprocessing (obrót, kadr, skala szarości,
+        zmniejszenie, budżet bajtów)
+        lite: mniejszy zoom stron PDF, zdjęcia zmniejszone do LITE_MAX_IMAGE_PX
+        Returns: Lista [(base64_string, media_type), ...]
+        """
+        ext = os.path.splitext(image_path)[1].lower()
+
+        # Jeśli PDF, konwertuj strony na JPEG
+        if ext == '.pdf':
+            print(f"📄 Konwertuję PDF na obrazy...")
+            return [
+                (base64.standard_b64encode(jpeg_bytes).decode('utf-8'), 'image/jpeg')
+                for jpeg_bytes in self.pdf_to_images(image_path, top_k=top_k, lite=lite)
+            ]
+
+        jpeg_bytes = self.preprocessor.process(image_path, max_px=LITE_MAX_IMAGE_PX if lite else None)
+        if jpeg_bytes is not None:
+            return [(base64.standard_b64encode(jpeg_bytes).decode('utf-8'), 'image/jpeg')]
+
+        # Obraz, którego nie udało się przetworzyć - oryginał
+        with open(image_path, "rb") as image_file:
+            base64_string = base64.standard_b64encode(image_file.read()).decode('utf-8')
+        return [(base64_string, MEDIA_TYPES.get(ext, 'image/jpeg'))]
+
+    def analyze_file(self, path: str, deadline: Optional[float] = None, lite: bool = False) -> Dict:
+        """
+        Odczyt faktury przez Vision
+
+        PDF: najpierw kilka najlepiej ocenionych stron, przy nieudanym
+        odczycie poszerzamy wybór (aż do wszystkich stron). Lekkie
+        zapytanie (lite) wysyła tylko LITE_TOP_K stron w mniejszej
+        rozdzielczości, bez poszerzania. Po deadline nie wysyłamy
+        kolejnych zapytań.
+        """
+        if os.path.splitext(path)[1].lower() != '.pdf':
+            images = self.encode_image_to_base64(path, lite=lite)
+            return self._extract_with_vision(images, self._time_left(deadline))
+
+        with fitz.open(path) as doc:
+            pages_available = len(doc)
+
+        result = None
+        tokens = None
+        for top_k in ((LITE_TOP_K,) if lite else PAGE_TOP_K_STEPS):
+            time_left = self._time_left(deadline)
+            if time_left is not None and time_left <= 0 and result is not None:
+                print(f"⏱️  Deadline faktury - nie poszerzam wyboru stron ({os.path.basename(path)})")
+                return result
+
+            images = self.encode_image_to_base64(path, top_k=top_k, lite=lite)
+            result = self._extract_with_vision(images, time_left)
+            result["strony"] = {"wyslane": len(images), "dostepne": pages_available}
+            # Tokeny wszystkich prób (poszerzanie stron to kolejne płatne wywołania)
+            tokens = merge_token_usage(tokens, result.get("tokeny"))
+            if tokens:
+                result["tokeny"] = tokens
+            print(f"📊 Strony wysłane do Vision ({self.name}): {len(images)}/{pages_available} "
+                  f"({os.path.basename(path)})")
+
+            if result.get("success") and result.get("energia_bierna_kwh") is not None:
+                return result
+            if lite or top_k is None or top_k >= min(pages_available, MAX_PDF_PAGES):
+                return result
+
+            print(f"🔁 Brak danych na {top_k} stronach - poszerzam wybór stron")
+
+        return result
+
+    def _parse_response(self, structured: Optional[Dict], text: str) -> Dict:
+        """
+        Wynik OCR z odpowiedzi modelu
+
+        Args:
+            structured: Dane z tool use / structured output (None = model odpowiedział tekstem)
+            text: Tekst odpowiedzi - dla parsera awaryjnego
+        """
+        try:
+            if structured is not None:
+                result, counter = normalize_invoice_result(structured), "structured_ok"
+            else:
+                data, repaired = parse_vision_json(text)
+                result = normalize_invoice_result(data)
+                counter = "fallback_naprawiony" if repaired else "fallback_ok"
+        except ValueError as e:
+            counter = "blad_parsowania"
+            print(f"❌ {self.name}: nie udało się odczytać odpowiedzi modelu: {str(e)}")
+            result = {"success": False, "error": f"Błąd odczytu odpowiedzi modelu: {str(e)}"}
+
+        with self._parse_lock:
+            self.parse_counters[counter] += 1
+        return result
+
+    def _parse_batch_response(self, structured: Optional[Dict], text: str, count: int) -> List[Dict]:
+        """Wyniki count faktur z odpowiedzi zbiorczej (jak _parse_response, jeden licznik na zapytanie)"""
+        try:
+            if structured is not None:
+                results, counter = normalize_batch_result(structured, count), "structured_ok"
+            else:
+                data, repaired = parse_vision_json(text)
+                results = normalize_batch_result(data, count)
+                counter = "fallback_naprawiony" if repaired else "fallback_ok"
+        except ValueError as e:
+            counter = "blad_parsowania"
+            print(f"❌ {self.name}: nie udało się odczytać odpowiedzi zbiorczej: {str(e)}")
+            results = [{"success": False, "error": f"Błąd odczytu odpowiedzi modelu: {str(e)}"}] * count
+
+        with self._parse_lock:
+            self.parse_counters[counter] += 1
+        return [dict(result) for result in results]
+
+    def pack_estimate(self, path: str) -> Optional[Tuple[int, int]]:
+        """
+        Szacunek (strony, bajty obrazów) faktury w zapytaniu zbiorczym
+
+        Returns: None, gdy faktura nie nadaje się do pakowania (za dużo stron)
+        """
+        if os.path.splitext(path)[1].lower() != '.pdf':
+            return 1, min(os.path.getsize(path), self.preprocessor.byte_budget)
+
+        with fitz.open(path) as doc:
+            pages = len(doc)
+        if pages > PACK_MAX_PAGES_PER_INVOICE:
+            return None
+        return pages, pages * PACK_PDF_PAGE_BYTES
+
+    def analyze_batch(self, paths: List[str], deadline: Optional[float] = None) -> List[Dict]:
+        """
+        Kilka małych faktur w jednym zapytaniu
+
+        Każda faktura idzie jako osobna grupa obrazów, model zwraca
+        tablicę wyników. Tokeny zapytania są dzielone równo między faktury.
+
+        Returns:
+            Wyniki w kolejności paths (nieudane - do odczytu osobnym zapytaniem)
+        """
+        groups = [self.encode_image_to_base64(path, top_k=PACK_MAX_PAGES_PER_INVOICE) for path in paths]
+        print(f"📦 {self.name}: {len(paths)} faktur w jednym zapytaniu "
+              f"({sum(len(g) for g in groups)} obrazów)")
+
+        results, usage = self._extract_batch_with_vision(groups, self._time_left(deadline))
+        for result, tokens in zip(results, split_token_usage(usage, len(results))):
+            result["pakiet"] = len(paths)
+            if tokens:
+                result["tokeny"] = tokens
+        return results
+
+    def stats(self) -> Dict:
+        """Liczniki parsowania odpowiedzi i odsetek błędów"""
+        with self._parse_lock:
+            counters = dict(self.parse_counters)
+        total = sum(counters.values())
+        counters["odsetek_bledow_parsowania"] = round(counters["blad_parsowania"] / total, 3) if total else None
+        return counters
+
+    def _extract_with_vision(self, images: List[Tuple[str, str]], deadline_s: Optional[float] = None) -> Dict:
+        """
+        Wysyła obrazy [(base64, media_type)] do modelu i zwraca wynik OCR
+
+        deadline_s: limit czasu wywołania (None = domyślny z transportu)
+        """
+        raise NotImplementedError
+
+    def _extract_batch_with_vision(
+        self,
+        groups: List[List[Tuple[str, str]]],
+        deadline_s: Optional[float] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Wysyła kilka faktur (grupy obrazów) w jednym zapytaniu
+
+        Returns: (wyniki w kolejności groups, tokeny całego zapytania)
+        """
+        raise NotImplementedError
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 zawartości pliku (czytane kawałkami, bez ładowania całości do RAM)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Trwały cache wyników OCR (SQLite)
+
+    Klucz = SHA-256 pliku + wersja promptu/modelu, więc ta sama faktura
+    przesłana ponownie nie kosztuje kolejnego wywołania Vision API.
+    Wpisy wygasają po TTL, a przy przekroczeniu max_entries usuwane są
+    najdawniej używane (LRU).
+    """
+
+    def __init__(self, db_path: str, ttl_s: int = 30 * 24 * 3600, max_entries: int = 5000):
+        self.db_path = db_path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        # Jedno połączenie współdzielone przez wątki OCR (dostęp pod lockiem)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_last_access ON ocr_results(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(file_hash: str, version: str) -> str:
+        """Klucz cache: hash pliku + wersja promptu/modelu"""
+        return f"{version}:{file_hash}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Zwraca wynik z cache lub None (liczy trafienia/pudła)"""
+        return self.get_first([key])
+
+    def get_first(self, keys: List[str]) -> Optional[Dict]:
+        """
+        Pierwszy (wg kolejności keys) aktualny wynik z cache lub None
+
+        Jedno wyszukiwanie = jedno trafienie albo jedno pudło, niezależnie
+        od liczby kluczy (np. ten sam plik pod wersjami kilku backendów).
+        """
+        now = time.time()
+        with self._lock:
+            rows = dict(
+                (key, (result, created_at)) for key, result, created_at in self._conn.execute(
+                    f"SELECT key, result, created_at FROM ocr_results WHERE key IN ({','.join('?' * len(keys))})",
+                    keys
+                )
+            )
+            expired = [key for key, (_, created_at) in rows.items() if now - created_at > self.ttl_s]
+            if expired:
+                self._conn.executemany("DELETE FROM ocr_results WHERE key = ?", [(key,) for key in expired])
+                self._conn.commit()
+
+            key = next((key for key in keys if key in rows and key not in expired), None)
+            if key is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE ocr_results SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(rows[key][0])
+
+    def set(self, key: str, result: Dict) -> None:
+        """Zapisuje wynik i w razie potrzeby usuwa najdawniej używane wpisy"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, result, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), now, now)
+            )
+            self._conn.execute("DELETE FROM ocr_results WHERE created_at < ?", (now - self.ttl_s,))
+            self._conn.execute("""
+                DELETE FROM ocr_results WHERE key IN (
+                    SELECT key FROM ocr_results ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Statystyki cache do /api/health"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s
+        }
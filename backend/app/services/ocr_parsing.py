@@ -0,0 +1,210 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from app.models.schemas import InvoiceData
+from app.services.pdf_text_extractor import NUM, parse_number
+
+# Nazwa narzędzia (tool use), którym model zwraca dane faktury
+INVOICE_TOOL_NAME = "zapisz_dane_faktury"
+
+# Narzędzie dla kilku faktur w jednym zapytaniu (tablica wyników)
+INVOICE_BATCH_TOOL_NAME = "zapisz_dane_faktur"
+
+# Pola liczbowe - tolerujemy "612,5" i "612.5 kWh" z odpowiedzi tekstowej
+_NUMERIC_FIELDS = ("energia_bierna_kwh", "tg_phi", "energia_czynna_kwh", "okres_mc")
+
+_FENCE = re.compile(r"```(?:json)?")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_DECIMAL_COMMA = re.compile(r"(:\s*-?\d+),(\d+)")
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_NUMBER_IN_TEXT = re.compile(r"(-?)" + NUM)
+
+
+def invoice_json_schema() -> Dict:
+    """
+    JSON Schema odpowiedzi OCR wyprowadzony z InvoiceData
+
+    Wszystkie pola danych mogą być null (model musi móc zgłosić, że
+    czegoś nie znalazł), a success/error mówią, czy odczyt się udał.
+    Wszystkie pola są wymagane i bez dodatkowych - tak wymaga tryb
+    strict w OpenAI; Anthropic przyjmuje ten sam schemat.
+    """
+    source = InvoiceData.model_json_schema()
+    properties = {}
+    for name, field in source["properties"].items():
+        types = [option["type"] for option in field.get("anyOf", [field]) if option.get("type") != "null"]
+        properties[name] = {"type": [types[0], "null"], "description": field.get("description", name)}
+
+    properties["success"] = {"type": "boolean", "description": "Czy udało się odczytać energię bierną"}
+    properties["error"] = {"type": ["string", "null"], "description": "Powód niepowodzenia (gdy success=false)"}
+
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+def invoice_batch_json_schema() -> Dict:
+    """Schemat odpowiedzi dla kilku faktur: tablica wyników z numerem faktury (indeks od 1)"""
+    item = invoice_json_schema()
+    item["properties"] = {
+        "indeks": {"type": "integer", "description": "Numer faktury w zapytaniu (od 1)"},
+        **item["properties"]
+    }
+    item["required"] = list(item["properties"])
+    return {
+        "type": "object",
+        "properties": {"faktury": {"type": "array", "items": item}},
+        "required": ["faktury"],
+        "additionalProperties": False
+    }
+
+
+def _first_json_object(text: str) -> str:
+    """Pierwszy zbalansowany obiekt {...} w tekście (pomija nawiasy w stringach)"""
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("Brak obiektu JSON w odpowiedzi")
+
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    # Ucięta odpowiedź (max_tokens) - próbujemy domknąć
+    return text[start:] + "}" * depth
+
+
+def _repair(candidate: str) -> str:
+    """Typowe usterki JSON z modeli: przecinek na końcu, True/None, przecinek dziesiętny, apostrofy"""
+    repaired = _TRAILING_COMMA.sub(r"\1", candidate)
+    repaired = _DECIMAL_COMMA.sub(r"\1.\2", repaired)
+    repaired = re.sub(r"\b(True|False|None)\b", lambda m: _PYTHON_LITERALS[m.group(1)], repaired)
+    if '"' not in repaired:
+        repaired = repaired.replace("'", '"')
+    return repaired
+
+
+def parse_vision_json(text: str) -> Tuple[Dict, bool]:
+    """
+    Tolerancyjny parser JSON z tekstowej odpowiedzi modelu
+
+    Usuwa bloki markdown, wycina pierwszy obiekt {...} spośród
+    ewentualnego komentarza i naprawia typowe usterki.
+
+    Returns:
+        (dane, czy trzeba było naprawiać)
+
+    Raises:
+        ValueError: w odpowiedzi nie ma dającego się odczytać obiektu JSON
+    """
+    text = _FENCE.sub("", text).strip()
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return data, False
+    except json.JSONDecodeError:
+        pass
+
+    candidate = _first_json_object(text)
+    for attempt in (candidate, _repair(candidate)):
+        try:
+            data = json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data, True
+    raise ValueError(f"Nie udało się odczytać JSON z odpowiedzi: {text[:200]}")
+
+
+def _to_number(value):
+    """Liczba z tekstu odpowiedzi ("1.234,56 kWh" -> 1234.56) - polski format jak w warstwie tekstowej PDF"""
+    if isinstance(value, str):
+        match = _NUMBER_IN_TEXT.search(value)
+        if match is None:
+            return None
+        number = parse_number(match.group(2))
+        return -number if match.group(1) else number
+    return value
+
+
+def normalize_invoice_result(data: Dict) -> Dict:
+    """
+    Wynik OCR w jednolitym formacie (walidacja typów przez InvoiceData)
+
+    Odczyt bez energii biernej albo z success=false zwracamy jako
+    nieudany - VisionBackend poszerzy wtedy wybór stron.
+
+    Raises:
+        ValueError: dane nie pasują do InvoiceData (np. tekst zamiast liczby)
+    """
+    data = {**data}
+    for field in _NUMERIC_FIELDS:
+        data[field] = _to_number(data.get(field))
+
+    if data.get("success") is False or data.get("energia_bierna_kwh") is None:
+        return {
+            **{k: v for k, v in data.items() if k in InvoiceData.model_fields},
+            "success": False,
+            "error": data.get("error") or "Nie znaleziono energii biernej na fakturze"
+        }
+
+    if data.get("okres_mc") is None:
+        data["okres_mc"] = 1
+    try:
+        invoice = InvoiceData.model_validate({k: v for k, v in data.items() if k in InvoiceData.model_fields})
+    except ValidationError as e:
+        raise ValueError(f"Niepoprawne dane faktury: {e.errors()[0]['loc'][0]}: {e.errors()[0]['msg']}")
+
+    return {**invoice.model_dump(), "success": True, "error": None}
+
+
+def normalize_batch_result(data: Dict, count: int) -> List[Dict]:
+    """
+    Wyniki kilku faktur z jednej odpowiedzi, w kolejności faktur
+
+    Faktura, której brakuje w odpowiedzi albo z niepoprawnymi danymi,
+    dostaje wynik nieudany (router odczyta ją wtedy osobnym zapytaniem).
+
+    Raises:
+        ValueError: odpowiedź nie zawiera tablicy "faktury"
+    """
+    items = data.get("faktury")
+    if not isinstance(items, list):
+        raise ValueError("Brak tablicy faktury w odpowiedzi")
+
+    by_index = {}
+    for position, item in enumerate(items, 1):
+        if isinstance(item, dict):
+            index = _to_number(item.get("indeks"))
+            by_index.setdefault(int(index) if index is not None else position, item)
+
+    results = []
+    for index in range(1, count + 1):
+        item = by_index.get(index)
+        if item is None:
+            results.append({"success": False, "error": "Brak wyniku dla tej faktury w odpowiedzi zbiorczej"})
+            continue
+        try:
+            results.append(normalize_invoice_result(item))
+        except ValueError as e:
+            results.append({"success": False, "error": str(e)})
+    return results
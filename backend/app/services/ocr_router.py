@@ -0,0 +1,680 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.invoice_aggregator import InvoiceAggregator
+from app.services.ocr_backends import OCRBackend, TextLayerBackend
+from app.services.ocr_cache import OCRCache, file_sha256
+
+# Ile ostatnich wywołań backendu bierzemy do p50/p95 i odsetka błędów
+LATENCY_WINDOW = 200
+
+# Limity paczki (kilka faktur w jednym zapytaniu Vision)
+PACK_MAX_INVOICES = 8
+PACK_MAX_IMAGES = 12
+PACK_MAX_BYTES = 4_000_000
+
+# Tryby pakowania: auto (gdy pojedyncze zapytania nie mieszczą się
+# w max_concurrency), always, off
+PACK_MODES = ("auto", "always", "off")
+
+
+class LatencyTracker:
+    """Kroczące statystyki backendu: p50/p95 czasu odpowiedzi i odsetek błędów"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency_s: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((latency_s, ok))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(latency for latency, _ in self._samples)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    def error_rate(self) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return None
+        return sum(not ok for _, ok in samples) / len(samples)
+
+
+class OCRRouter:
+    """
+    Router zapytań OCR między backendami
+
+    Kolejność dla każdej faktury: cache -> warstwa tekstowa PDF (darmowa)
+    -> najszybszy zdrowy backend Vision (najniższe kroczące p50, odsetek
+    błędów poniżej progu, circuit breaker zamknięty). Nieudany odczyt
+    przechodzi na kolejny backend. Opcjonalny hedging: jeśli pierwszy
+    backend nie odpowie w swoim p95, równolegle startuje drugi i wygrywa
+    pierwszy udany wynik.
+
+    Każda faktura ma deadline (invoice_deadline_s) na wszystkie próby
+    Vision łącznie. Hedging w obrębie backendu: gdy odpowiedź nie przyjdzie
+    w lite_hedge_delay_s, równolegle idzie lżejsze zapytanie (mniej stron,
+    mniejsza rozdzielczość) i wygrywa pierwszy kompletny wynik. Liczniki
+    startów i wygranych hedgingu są w stats() - do strojenia progów.
+    """
+
+    def __init__(
+        self,
+        backends: List[OCRBackend],
+        free_backends: Optional[List[OCRBackend]] = None,
+        cache: Optional[OCRCache] = None,
+        max_concurrency: int = 4,
+        hedge: bool = False,
+        min_samples: int = 20,
+        max_error_rate: float = 0.5,
+        invoice_deadline_s: Optional[float] = None,
+        lite_hedge_delay_s: Optional[float] = None,
+        pack_mode: str = "auto",
+        max_backend_calls: Optional[int] = None
+    ):
+        """
+        Args:
+            backends: Backendy Vision (kolejność = priorytet, zanim zbierzemy statystyki)
+            free_backends: Lokalne backendy próbowane najpierw (domyślnie warstwa tekstowa PDF)
+            cache: Cache wyników OCR (None = bez cache)
+            max_concurrency: Ile faktur analizować równolegle
+            hedge: Czy wysyłać zapasowe zapytanie do drugiego backendu po p95 pierwszego
+            min_samples: Ile wywołań potrzeba, żeby ufać statystykom backendu
+            max_error_rate: Powyżej tego odsetka błędów backend uznajemy za niezdrowy
+            invoice_deadline_s: Limit czasu na odczyt jednej faktury przez Vision (None = bez limitu)
+            lite_hedge_delay_s: Po ilu sekundach bez odpowiedzi wysłać lżejsze zapytanie
+                                (None = bez hedgingu w obrębie backendu)
+            pack_mode: Pakowanie małych faktur w jedno zapytanie: auto / always / off
+            max_backend_calls: Limit równoczesnych wywołań backendów z deadline'em/hedgingiem
+                               w całym procesie (domyślnie 3 × max_concurrency)
+        """
+        self.backends = backends
+        self.free_backends = free_backends if free_backends is not None else [TextLayerBackend()]
+        self.cache = cache
+        self.max_concurrency = max(1, max_concurrency)
+        self.hedge = hedge
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.invoice_deadline_s = invoice_deadline_s or None
+        self.lite_hedge_delay_s = lite_hedge_delay_s or None
+        if pack_mode not in PACK_MODES:
+            raise ValueError(f"Nieznany tryb pakowania: {pack_mode} (dozwolone: {', '.join(PACK_MODES)})")
+        self.pack_mode = pack_mode
+        self.pack_counters = {"paczki": 0, "faktury_w_paczkach": 0, "ponowione_osobno": 0}
+        self.trackers = {b.name: LatencyTracker() for b in self.free_backends + backends}
+        self.counters = {
+            b.name: {
+                "wybrany": 0,
+                "hedge_start": 0,
+                "hedge_wygrany": 0,
+                "lite_hedge_start": 0,
+                "lite_hedge_wygrany": 0,
+                "hedge_pominiety": 0,
+                "deadline_przekroczony": 0
+            }
+            for b in backends
+        }
+        self._counters_lock = threading.Lock()
+        # Wywołania backendów przy hedgingu i deadline'ach (osobno od puli
+        # faktur - bez zakleszczeń). Pula jest wspólna dla wszystkich
+        # requestów, więc zajmujemy wątek dopiero po wzięciu slotu: zadanie
+        # nigdy nie czeka w kolejce puli, hedge bez wolnego slotu jest
+        # pomijany, a przegrane zapytania dobiegające w tle trzymają slot.
+        self.max_backend_calls = max(1, max_backend_calls or 3 * self.max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_backend_calls)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_backend_calls, thread_name_prefix="ocr-backend"
+        )
+
+    def _count(self, backend: OCRBackend, counter: str) -> None:
+        with self._counters_lock:
+            self.counters[backend.name][counter] += 1
+
+    @staticmethod
+    def _time_left(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    @staticmethod
+    def _complete(result: Dict) -> bool:
+        """Udany odczyt z energią bierną (lekkie zapytanie może jej nie znaleźć)"""
+        return bool(result.get("success")) and result.get("energia_bierna_kwh") is not None
+
+    def _deadline_result(self, backend: OCRBackend) -> Dict:
+        self._count(backend, "deadline_przekroczony")
+        print(f"⏱️  {backend.name}: przekroczony czas analizy faktury ({self.invoice_deadline_s:.0f}s)")
+        return {
+            "success": False,
+            "error": f"Przekroczony czas analizy faktury ({self.invoice_deadline_s:.0f}s)",
+            "backend": backend.name
+        }
+
+    def _call(
+        self,
+        backend: OCRBackend,
+        path: str,
+        deadline: Optional[float] = None,
+        lite: bool = False,
+        abandoned: Optional[threading.Event] = None
+    ) -> Dict:
+        """
+        Wywołanie backendu z pomiarem czasu (wyjątek = nieudany odczyt)
+
+        Lekkie zapytania nie trafiają do p50/p95 - zaniżałyby ranking backendu.
+        Zapytanie, którego wyścig jest już rozstrzygnięty (abandoned) albo
+        którego deadline minął, nie jest wysyłane.
+        """
+        if (abandoned is not None and abandoned.is_set()) or self._time_left(deadline) == 0.0:
+            return {"success": False, "error": "Zapytanie porzucone przed wysłaniem", "backend": backend.name}
+
+        start = time.monotonic()
+        try:
+            result = backend.analyze_file(path, deadline=deadline, lite=lite)
+        except Exception as e:
+            print(f"❌ OCR Error ({backend.name}): {str(e)}")
+            result = {"success": False, "error": f"Błąd OCR: {str(e)}"}
+        if not lite:
+            self.trackers[backend.name].record(time.monotonic() - start, bool(result.get("success")))
+        result["backend"] = backend.name
+        if lite:
+            result["hedge"] = "lite"
+        return result
+
+    def _submit(
+        self,
+        abandoned: threading.Event,
+        backend: OCRBackend,
+        path: str,
+        deadline: Optional[float],
+        lite: bool = False,
+        optional: bool = False
+    ) -> Optional[Future]:
+        """
+        Wywołanie backendu w tle, o ile jest wolny slot
+
+        Zapytanie główne czeka na slot najwyżej do deadline'u, hedge (optional)
+        nie czeka wcale.
+
+        Returns:
+            Future albo None, gdy slotu nie ma
+        """
+        return self._submit_in_slot(deadline, optional, self._call, backend, path, deadline, lite, abandoned)
+
+    def _submit_in_slot(self, deadline: Optional[float], optional: bool, fn: Callable, *args) -> Optional[Future]:
+        """fn(*args) w puli wywołań backendów - slot zwalnia się po zakończeniu fn"""
+        if not self._slots.acquire(timeout=0.0 if optional else self._time_left(deadline)):
+            return None
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _call_with_lite_hedge(self, backend: OCRBackend, path: str, deadline: Optional[float]) -> Dict:
+        """
+        Zapytanie do backendu ograniczone deadlinem faktury
+
+        Gdy odpowiedź nie przyjdzie w lite_hedge_delay_s, równolegle idzie
+        lżejsze zapytanie do tego samego backendu - wygrywa pierwszy
+        kompletny wynik.
+        """
+        if deadline is None and self.lite_hedge_delay_s is None:
+            return self._call(backend, path)
+
+        abandoned = threading.Event()
+        try:
+            primary = self._submit(abandoned, backend, path, deadline)
+            if primary is None:
+                return self._deadline_result(backend)
+            futures: Dict[Future, bool] = {primary: False}
+
+            if self.lite_hedge_delay_s is not None:
+                delay = self.lite_hedge_delay_s
+                time_left = self._time_left(deadline)
+                done, _ = wait(futures, timeout=delay if time_left is None else min(delay, time_left))
+                if not done and self._time_left(deadline) != 0.0:
+                    hedge = self._submit(abandoned, backend, path, deadline, lite=True, optional=True)
+                    if hedge is None:
+                        self._count(backend, "hedge_pominiety")
+                    else:
+                        print(f"🏁 {backend.name} bez odpowiedzi po {delay:.1f}s - lżejsze zapytanie "
+                              f"({os.path.basename(path)})")
+                        self._count(backend, "lite_hedge_start")
+                        futures[hedge] = True
+
+            result = None
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=self._time_left(deadline), return_when=FIRST_COMPLETED)
+                if not done:
+                    # Zapytania dobiegną w tle (transport i tak tnie je po deadline)
+                    return self._deadline_result(backend)
+                for future in done:
+                    lite = futures[future]
+                    candidate = future.result()
+                    if self._complete(candidate) or (not lite and candidate.get("success")):
+                        if lite:
+                            self._count(backend, "lite_hedge_wygrany")
+                        return candidate
+                    # Przy porażce obu zwracamy błąd pełnego zapytania
+                    if result is None or not lite:
+                        result = candidate
+            return result
+        finally:
+            abandoned.set()
+
+    def _healthy(self, backend: OCRBackend) -> bool:
+        tracker = self.trackers[backend.name]
+        if not backend.available():
+            return False
+        return len(tracker) < self.min_samples or tracker.error_rate() <= self.max_error_rate
+
+    def ranked_backends(self) -> List[OCRBackend]:
+        """
+        Backendy Vision od najszybszego zdrowego
+
+        Backend bez wystarczającej liczby pomiarów idzie na początek
+        (w kolejności konfiguracji) - inaczej nigdy by ich nie zebrał.
+        Niezdrowe są na końcu - używane tylko, gdy nie ma innych.
+        """
+        def p50(backend):
+            tracker = self.trackers[backend.name]
+            return tracker.percentile(50) if len(tracker) >= self.min_samples else 0.0
+
+        healthy = [b for b in self.backends if self._healthy(b)]
+        unhealthy = [b for b in self.backends if b not in healthy]
+        return sorted(healthy, key=p50) + unhealthy
+
+    def _hedged_call(
+        self,
+        primary: OCRBackend,
+        secondary: OCRBackend,
+        path: str,
+        deadline: Optional[float] = None
+    ) -> Dict:
+        """Primary, a po jego p95 bez odpowiedzi także secondary - wygrywa pierwszy udany wynik"""
+        delay = self.trackers[primary.name].percentile(95)
+        abandoned = threading.Event()
+        try:
+            first = self._submit(abandoned, primary, path, deadline)
+            if first is None:
+                return self._deadline_result(primary)
+            futures: Dict[Future, OCRBackend] = {first: primary}
+
+            time_left = self._time_left(deadline)
+            done, _ = wait(futures, timeout=delay if time_left is None else min(delay, time_left))
+            if not done and self._time_left(deadline) != 0.0:
+                hedge = self._submit(abandoned, secondary, path, deadline, optional=True)
+                if hedge is None:
+                    self._count(secondary, "hedge_pominiety")
+                else:
+                    print(f"🏁 {primary.name} bez odpowiedzi po {delay:.1f}s (p95) - hedge do {secondary.name}")
+                    self._count(secondary, "hedge_start")
+                    futures[hedge] = secondary
+
+            result = None
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=self._time_left(deadline), return_when=FIRST_COMPLETED)
+                if not done:
+                    return self._deadline_result(primary)
+                for future in done:
+                    result = future.result()
+                    if result.get("success"):
+                        if futures[future] is secondary:
+                            self._count(secondary, "hedge_wygrany")
+                        # Przegrany dalej działa w tle - jego czas trafi do statystyk
+                        return result
+            return result
+        finally:
+            abandoned.set()
+
+    def _analyze_vision(self, path: str, deadline: Optional[float] = None) -> Dict:
+        """Odczyt przez backendy Vision (ranking, hedging, przejście na kolejny przy błędzie)"""
+        ranked = self.ranked_backends()
+        if not ranked:
+            return {"success": False, "error": "Brak skonfigurowanego backendu Vision (klucz API)"}
+
+        result = None
+        i = 0
+        while i < len(ranked):
+            backend = ranked[i]
+            self._count(backend, "wybrany")
+            can_hedge = (
+                self.hedge and i + 1 < len(ranked)
+                and len(self.trackers[backend.name]) >= self.min_samples
+            )
+            if can_hedge:
+                result = self._hedged_call(backend, ranked[i + 1], path, deadline)
+                i += 2
+            else:
+                result = self._call_with_lite_hedge(backend, path, deadline)
+                i += 1
+
+            if result.get("success"):
+                return result
+            if self._time_left(deadline) == 0.0:
+                return result
+            if i < len(ranked):
+                print(f"↪️  {backend.name}: {result.get('error')} - próbuję {ranked[i].name}")
+
+        return result
+
+    def _deadline(self) -> Optional[float]:
+        return time.monotonic() + self.invoice_deadline_s if self.invoice_deadline_s else None
+
+    def _analyze_local(self, image_path: str, file_hash: Optional[str]) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Odczyt bez Vision: cache, potem darmowe backendy
+
+        Returns:
+            (wynik albo None - potrzebny Vision, hash pliku)
+        """
+        if self.cache is not None:
+            file_hash = file_hash or file_sha256(image_path)
+            cached = self.cache.get_first([
+                OCRCache.make_key(file_hash, backend.version) for backend in self.free_backends + self.backends
+            ])
+            if cached is not None:
+                print(f"⚡ Cache OCR: {os.path.basename(image_path)}")
+                return {**cached, "cache_hit": True}, file_hash
+
+        for backend in self.free_backends:
+            result = self._call(backend, image_path)
+            if result.get("success"):
+                self._store(result, file_hash)
+                return result, file_hash
+        return None, file_hash
+
+    def _store(self, result: Dict, file_hash: Optional[str]) -> None:
+        """Zapisuje udany odczyt w cache (błąd może być przejściowy - nie zapisujemy)"""
+        if self.cache is None or not result.get("success"):
+            return
+        backend = next(b for b in self.free_backends + self.backends if b.name == result["backend"])
+        # Bez tokenów - trafienie w cache nic nie kosztuje
+        cached = {k: v for k, v in result.items() if k != "tokeny"}
+        self.cache.set(OCRCache.make_key(file_hash, backend.version), cached)
+
+    def analyze_invoice(self, image_path: str, file_hash: Optional[str] = None) -> Dict:
+        """
+        Analizuje pojedynczą fakturę za energię
+
+        Jeśli ta sama faktura (ten sam hash pliku) była już odczytana
+        tą samą wersją któregokolwiek backendu, wynik wraca z cache.
+        Odczyt przez Vision jest ograniczony invoice_deadline_s.
+
+        Args:
+            image_path: Ścieżka do pliku faktury
+            file_hash: SHA-256 pliku, jeśli już policzony (np. przy uploadzie)
+
+        Returns:
+            Dict z danymi: energia_bierna_kwh, tg_phi, okres_mc, etc.
+        """
+        result, file_hash = self._analyze_local(image_path, file_hash)
+        if result is None:
+            result = self._analyze_vision(image_path, self._deadline())
+            self._store(result, file_hash)
+        return result
+
+    def _packing_backend(self) -> Optional[OCRBackend]:
+        """Najszybszy zdrowy backend obsługujący zapytania zbiorcze"""
+        for backend in self.ranked_backends():
+            if getattr(backend, "supports_packing", False) and self._healthy(backend):
+                return backend
+        return None
+
+    def plan_packs(
+        self,
+        backend: OCRBackend,
+        paths: List[str],
+        max_concurrency: Optional[int] = None
+    ) -> Tuple[List[List[int]], List[int]]:
+        """
+        Dzieli faktury na paczki (jedno zapytanie na paczkę) i pojedyncze zapytania
+
+        Do paczek trafiają tylko małe faktury (backend.pack_estimate), paczka
+        ma limit faktur, stron i bajtów obrazów. W trybie auto pakujemy
+        tylko wtedy, gdy pojedynczych zapytań jest więcej niż max_concurrency
+        - paczek jest wtedy tyle, żeby wszystkie poszły w jednej "rundzie"
+        zamiast kilku kolejnych. Tryb always pakuje wszystko, co się da.
+
+        Args:
+            backend: Backend, który dostanie paczki
+            paths: Ścieżki faktur czekających na Vision
+            max_concurrency: Liczba równoczesnych zapytań (domyślnie z konstruktora)
+
+        Returns:
+            (paczki - listy indeksów w paths, indeksy do pojedynczych zapytań)
+        """
+        if self.pack_mode == "off" or len(paths) < 2:
+            return [], list(range(len(paths)))
+
+        estimates, singles = {}, []
+        for i, path in enumerate(paths):
+            try:
+                estimate = backend.pack_estimate(path)
+            except Exception:
+                estimate = None
+            if estimate is None:
+                singles.append(i)
+            else:
+                estimates[i] = estimate
+
+        if self.pack_mode == "auto":
+            max_concurrency = max_concurrency or self.max_concurrency
+            if len(paths) <= max_concurrency:
+                return [], list(range(len(paths)))
+            slots = max(1, max_concurrency - len(singles))
+            per_pack = -(-len(estimates) // slots)
+        else:
+            # Równe paczki zamiast pełnych i jednej resztki
+            per_pack = -(-len(estimates) // -(-len(estimates) // PACK_MAX_INVOICES)) if estimates else 1
+        per_pack = min(per_pack, PACK_MAX_INVOICES)
+
+        packs, current, pages, size = [], [], 0, 0
+        for i, (invoice_pages, invoice_bytes) in estimates.items():
+            if current and (
+                len(current) >= per_pack
+                or pages + invoice_pages > PACK_MAX_IMAGES
+                or size + invoice_bytes > PACK_MAX_BYTES
+            ):
+                packs.append(current)
+                current, pages, size = [], 0, 0
+            current.append(i)
+            pages += invoice_pages
+            size += invoice_bytes
+        if current:
+            packs.append(current)
+
+        # Paczka z jedną fakturą to zwykłe zapytanie
+        singles += [pack[0] for pack in packs if len(pack) == 1]
+        return [pack for pack in packs if len(pack) > 1], sorted(singles)
+
+    def _call_pack(self, backend: OCRBackend, paths: List[str], deadline: Optional[float] = None) -> List[Dict]:
+        """
+        Zapytanie zbiorcze (bez wpływu na p50/p95 - inny czas niż pojedyncze)
+
+        Idzie przez tę samą pulę slotów co pojedyncze zapytania. Bez slotu
+        przed deadline'em albo bez odpowiedzi do deadline'u wszystkie
+        faktury paczki kończą się błędem deadline'u.
+        """
+        future = self._submit_in_slot(deadline, False, self._send_pack, backend, paths, deadline)
+        if future is not None:
+            done, _ = wait([future], timeout=self._time_left(deadline))
+            if done:
+                return future.result()
+        # Zapytanie (jeśli wyszło) dobiegnie w tle - transport tnie je po deadline
+        result = self._deadline_result(backend)
+        return [dict(result) for _ in paths]
+
+    def _send_pack(self, backend: OCRBackend, paths: List[str], deadline: Optional[float]) -> List[Dict]:
+        if self._time_left(deadline) == 0.0:
+            return [{"success": False, "error": "Zapytanie porzucone przed wysłaniem", "backend": backend.name}
+                    for _ in paths]
+        try:
+            results = backend.analyze_batch(paths, deadline=deadline)
+        except Exception as e:
+            print(f"❌ OCR Error ({backend.name}, zapytanie zbiorcze): {str(e)}")
+            results = [{"success": False, "error": f"Błąd OCR: {str(e)}"} for _ in paths]
+
+        with self._counters_lock:
+            self.pack_counters["paczki"] += 1
+            self.pack_counters["faktury_w_paczkach"] += len(paths)
+        for result in results:
+            result["backend"] = backend.name
+        return results
+
+    def analyze_multiple_invoices(
+        self,
+        image_paths: List[str],
+        max_concurrency: Optional[int] = None,
+        file_names: Optional[List[str]] = None,
+        file_hashes: Optional[List[str]] = None,
+        on_result: Optional[Callable[[int, Dict], None]] = None
+    ) -> List[Dict]:
+        """
+        Analizuje wiele faktur równolegle (ograniczona liczba zapytań naraz)
+
+        Najpierw cache i warstwa tekstowa dla wszystkich plików, potem
+        Vision: małe faktury mogą pójść w paczkach (plan_packs), reszta
+        osobnymi zapytaniami. Faktura nieodczytana w paczce dostaje
+        osobne zapytanie - w ramach tego samego deadline'u co paczka.
+
+        Args:
+            image_paths: Lista ścieżek do plików faktur
+            max_concurrency: Maks. liczba równoczesnych zapytań do API
+                             (domyślnie wartość z konstruktora, 1 = sekwencyjnie)
+            file_names: Oryginalne nazwy plików (gdy pliki leżą pod nazwami tymczasowymi)
+            file_hashes: SHA-256 plików policzone przy uploadzie (klucz cache)
+            on_result: Wywoływane z (indeks pliku, wynik) zaraz po przeanalizowaniu
+                       każdej faktury - w kolejności kończenia, nie plików
+
+        Returns:
+            Lista wyników dla każdej faktury (w kolejności image_paths)
+        """
+        total = len(image_paths)
+        workers = min(max_concurrency or self.max_concurrency, total) if total else 1
+        file_names = [name or os.path.basename(path) for path, name in zip(image_paths, file_names or [None] * total)]
+        file_hashes = list(file_hashes or [None] * total)
+        results: List[Optional[Dict]] = [None] * total
+
+        def finish(i: int, result: Dict) -> None:
+            result['file_name'] = file_names[i]
+            results[i] = result
+            if on_result is not None:
+                on_result(i, result)
+
+        def analyze_single(i: int, deadline: Optional[float] = None) -> None:
+            print(f"Analizuję fakturę {i + 1}/{total}: {file_names[i]}")
+            result = self._analyze_vision(image_paths[i], deadline if deadline is not None else self._deadline())
+            self._store(result, file_hashes[i])
+            finish(i, result)
+
+        def analyze_pack(backend: OCRBackend, pack: List[int]) -> None:
+            print(f"Analizuję faktury {[i + 1 for i in pack]}/{total} w jednym zapytaniu")
+            deadline = self._deadline()
+            for i, result in zip(pack, self._call_pack(backend, [image_paths[i] for i in pack], deadline)):
+                if result.get("success"):
+                    self._store(result, file_hashes[i])
+                    finish(i, result)
+                else:
+                    with self._counters_lock:
+                        self.pack_counters["ponowione_osobno"] += 1
+                    analyze_single(i, deadline)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ocr") as executor:
+            pending = []
+            local = executor.map(lambda i: self._analyze_local(image_paths[i], file_hashes[i]), range(total))
+            for i, (result, file_hash) in enumerate(local):
+                file_hashes[i] = file_hash
+                if result is None:
+                    pending.append(i)
+                else:
+                    finish(i, result)
+
+            backend = self._packing_backend() if len(pending) > 1 and self.pack_mode != "off" else None
+            packs, singles = [], list(range(len(pending)))
+            if backend is not None:
+                packs, singles = self.plan_packs(backend, [image_paths[i] for i in pending], workers)
+
+            futures = [executor.submit(analyze_pack, backend, [pending[j] for j in pack]) for pack in packs]
+            futures += [executor.submit(analyze_single, pending[j]) for j in singles]
+            for future in futures:
+                future.result()
+
+        return results
+
+    def aggregate_invoice_data(self, results: List[Dict]) -> Dict:
+        """
+        Agreguje dane z wielu faktur
+
+        Sumuje energię bierną, oblicza średni tgφ, liczy miesiące
+        """
+        successful = [r for r in results if r.get('success', False)]
+
+        if not successful:
+            return {
+                "success": False,
+                "error": "Nie udało się odczytać żadnej faktury",
+                "details": results
+            }
+
+        # Sumy i średni tgφ (ważony energią) - wspólne z kalkulatorem
+        aggregator = InvoiceAggregator(successful)
+        avg_tg_phi = aggregator.tg_phi()
+
+        return {
+            "success": True,
+            "energia_bierna_kwh": round(aggregator.energia_bierna_kwh, 2),
+            "okres_mc": aggregator.okres_mc,
+            "tg_phi": round(avg_tg_phi, 3) if avg_tg_phi else None,
+            "liczba_faktur": len(successful),
+            "faktury": successful,
+            "failed_invoices": [r for r in results if not r.get('success', False)]
+        }
+
+    def stats(self) -> Dict:
+        """p50/p95, odsetek błędów i liczniki hedgingu per backend (do /api/health)"""
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+
+        stats = {}
+        for backend in self.free_backends + self.backends:
+            tracker = self.trackers[backend.name]
+            counters = self.counters.get(backend.name, {})
+            if counters.get("lite_hedge_start"):
+                counters = {
+                    **counters,
+                    "lite_hedge_skutecznosc": round(counters["lite_hedge_wygrany"] / counters["lite_hedge_start"], 3)
+                }
+            stats[backend.name] = {
+                "p50_s": rounded(tracker.percentile(50)),
+                "p95_s": rounded(tracker.percentile(95)),
+                "error_rate": rounded(tracker.error_rate()),
+                "probki": len(tracker),
+                "zdrowy": self._healthy(backend),
+                **counters
+            }
+            parsing = backend.stats()
+            if parsing:
+                stats[backend.name]["parsowanie"] = parsing
+        return {
+            "hedge": self.hedge,
+            "lite_hedge_delay_s": self.lite_hedge_delay_s,
+            "invoice_deadline_s": self.invoice_deadline_s,
+            "max_backend_calls": self.max_backend_calls,
+            "pakowanie": {"tryb": self.pack_mode, **self.pack_counters},
+            "backendy": stats
+        }
@@ -1,96 +1,165 @@
-import base64
-import os
-from typing import List, Dict, Optional
-from openai import OpenAI
-from PIL import Image
-import io
-
-class OCRService:
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+from app.services.http_transport import VisionTransport
+from app.services.image_preprocess import ImagePreprocessor
+from app.services.ocr_backends import VisionBackend
+from app.services.ocr_parsing import (
+    INVOICE_BATCH_TOOL_NAME,
+    INVOICE_TOOL_NAME,
+    invoice_batch_json_schema,
+    invoice_json_schema
+)
+
+# Model OpenAI używany do OCR faktur
+OCR_MODEL = "gpt-4o"
+
+# Prompt dla GPT-4 Vision
+OCR_PROMPT = """Jesteś ekspertem od analizy faktur za energię elektryczną w Polsce.
+
+Przeanalizuj tę fakturę i wyciągnij następujące informacje:
+
+1. **Energia bierna indukcyjna** (w kWh) - szukaj: "energia bierna indukcyjna", "energia reaktywna", "reactive energy"
+2. **Współczynnik tgφ** (tangent phi) - szukaj: "tg φ", "tgfi", "tan φ"
+3. **Okres rozliczeniowy** - ile miesięcy obejmuje faktura (zwykle 1-4 miesiące)
+4. **Energia czynna pobrana** (w kWh) - opcjonalnie
+5. **Dostawca energii** - Tauron, PGE, Energa, Enea, etc.
+
+WAŻNE:
+- Jeśli faktura jest za kilka miesięcy (np. 2 miesiące), wpisz liczbę miesięcy
+- Jeśli nie ma tgφ na fakturze, możesz go obliczyć: tgφ = energia_bierna / energia_czynna
+- Jeśli jest "energia bierna pojemnościowa", IGNORUJ ją - potrzebujemy tylko INDUKCYJNEJ
+
+Zwróć dane w formacie JSON:
+{
+    "energia_bierna_kwh": <float>,
+    "tg_phi": <float lub null>,
+    "okres_mc": <int>,
+    "energia_czynna_kwh": <float lub null>,
+    "dostawca": "<string lub null>",
+    "data_faktury": "<string lub null>",
+    "success": true,
+    "error": null
+}
+
+Jeśli nie możesz odczytać danych, zwróć:
+{
+    "success": false,
+    "error": "Opis problemu"
+}"""
+
+# Structured output: odpowiedź zgodna ze schematem z InvoiceData (tryb strict)
+OCR_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": INVOICE_TOOL_NAME, "strict": True, "schema": invoice_json_schema()}
+}
+
+# Kilka faktur w jednym zapytaniu: tablica wyników
+OCR_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": INVOICE_BATCH_TOOL_NAME, "strict": True, "schema": invoice_batch_json_schema()}
+}
+
+OCR_BATCH_INSTRUCTION = (
+    "Powyżej jest {count} osobnych faktur, każda poprzedzona nagłówkiem \"Faktura k:\". "
+    "Przeanalizuj każdą osobno i zwróć wyniki w tablicy faktury - pole indeks to numer k faktury."
+)
+
+# Wersja promptu/schematu/modelu - część klucza cache OCR
+OCR_VERSION = f"{OCR_MODEL}:" + hashlib.sha256(
+    (OCR_PROMPT + json.dumps(OCR_RESPONSE_FORMAT, sort_keys=True)).encode('utf-8')
+).hexdigest()[:12]
+
+
+class OCRService(VisionBackend):
     """Serwis do rozpoznawania faktur za pomocą GPT-4 Vision"""
 
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
-
-    def encode_image_to_base64(self, image_path: str) -> str:
-        """Konwertuje obraz do base64"""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    name = "openai"
+    version = OCR_VERSION
+    transport_backend = "openai"
+    supports_packing = True
+
+    def __init__(
+        self,
+        api_key: str,
+        transport: Optional[VisionTransport] = None,
+        base_url: Optional[str] = None,
+        preprocessor: Optional[ImagePreprocessor] = None
+    ):
+        # Wspólna pula połączeń i preprocessing z ClaudeOCRService (gdy podano te same obiekty)
+        super().__init__(transport, preprocessor)
+        self.client = self.transport.openai_client(api_key, base_url)
+
+    @staticmethod
+    def _image_parts(images: List[Tuple[str, str]]) -> List[Dict]:
+        """Obrazy jako data URL dla chat.completions"""
+        return [
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:{media_type};base64,{base64_image}"
+                }
+            }
+            for base64_image, media_type in images
+        ]
 
-    def analyze_invoice(self, image_path: str) -> Dict:
+    def _complete(self, content: List[Dict], response_format: Dict, max_tokens: int, deadline_s: Optional[float]):
         """
-        Analizuje pojedynczą fakturę za energię
+        chat.completions przez transport; zwraca (structured albo None, tekst, tokeny)
 
-        Returns:
-            Dict z danymi: energia_bierna_kwh, tg_phi, okres_mc, etc.
+        JSON zgodny ze schematem; odmowa (refusal) albo inny tekst -> parser awaryjny
         """
+        response = self.transport.call("openai", lambda timeout: self.client.chat.completions.create(
+            model=OCR_MODEL,
+            messages=[
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            max_tokens=max_tokens,
+            temperature=0.1,  # Niska temperatura = bardziej deterministyczne
+            response_format=response_format,
+            timeout=timeout
+        ), deadline_s=deadline_s)
+
+        message = response.choices[0].message
+        result_text = message.content or getattr(message, "refusal", None) or ""
+        print(f"📄 GPT-4 Response: {result_text[:500]}...")  # Log first 500 chars
 
-        # Encode image
-        base64_image = self.encode_image_to_base64(image_path)
-
-        # Prompt dla GPT-4 Vision
-        prompt = """
-        Jesteś ekspertem od analizy faktur za energię elektryczną w Polsce.
-
-        Przeanalizuj tę fakturę i wyciągnij następujące informacje:
-
-        1. **Energia bierna indukcyjna** (w kWh) - szukaj: "energia bierna indukcyjna", "energia reaktywna", "reactive energy"
-        2. **Współczynnik tgφ** (tangent phi) - szukaj: "tg φ", "tgfi", "tan φ"
-        3. **Okres rozliczeniowy** - ile miesięcy obejmuje faktura (zwykle 1-4 miesiące)
-        4. **Energia czynna pobrana** (w kWh) - opcjonalnie
-        5. **Dostawca energii** - Tauron, PGE, Energa, Enea, etc.
-
-        WAŻNE:
-        - Jeśli faktura jest za kilka miesięcy (np. 2 miesiące), wpisz liczbę miesięcy
-        - Jeśli nie ma tgφ na fakturze, możesz go obliczyć: tgφ = energia_bierna / energia_czynna
-        - Jeśli jest "energia bierna pojemnościowa", IGNORUJ ją - potrzebujemy tylko INDUKCYJNEJ
-
-        Zwróć dane w formacie JSON:
-        {
-            "energia_bierna_kwh": <float>,
-            "tg_phi": <float lub null>,
-            "okres_mc": <int>,
-            "energia_czynna_kwh": <float lub null>,
-            "dostawca": "<string lub null>",
-            "data_faktury": "<string lub null>",
-            "success": true,
-            "error": null
+        try:
+            structured = json.loads(result_text)
+        except json.JSONDecodeError:
+            structured = None
+        if not isinstance(structured, dict):
+            structured = None
+
+        # OpenAI cache'uje prefiks (prompt jest na początku) automatycznie
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        tokens = {
+            "input": usage.prompt_tokens - cached,
+            "output": usage.completion_tokens,
+            "cache_read": cached,
+            "cache_write": 0
         }
+        return structured, result_text, tokens
 
-        Jeśli nie możesz odczytać danych, zwróć:
-        {
-            "success": false,
-            "error": "Opis problemu"
-        }
+    def _extract_with_vision(self, images: List[Tuple[str, str]], deadline_s: Optional[float] = None) -> Dict:
         """
+        Wysyła obrazy do GPT-4 Vision ze structured output (OCR_RESPONSE_FORMAT)
 
+        Odpowiedź jest JSON-em zgodnym ze schematem; parser awaryjny
+        łapie odmowy i nietypowe odpowiedzi.
+        """
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",  # lub "gpt-4-vision-preview"
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=500,
-                temperature=0.1  # Niska temperatura = bardziej deterministyczne
-            )
-
-            # Wyciągnij JSON z odpowiedzi
-            result_text = response.choices[0].message.content
-            print(f"📄 GPT-4 Response: {result_text[:500]}...")  # Log first 500 chars
+            content = [{"type": "text", "text": OCR_PROMPT}] + self._image_parts(images)
+            structured, result_text, tokens = self._complete(content, OCR_RESPONSE_FORMAT, 500, deadline_s)
 
-            # Parse JSON (GPT-4 powinien zwrócić czysty JSON)
-            import json
-            result = json.loads(result_text.strip().replace('```json', '').replace('```', ''))
+            result = self._parse_response(structured, result_text)
+            result["tokeny"] = tokens
 
             print(f"✅ Parsed result: {result}")
             return result
@@ -102,66 +171,24 @@ class OCRService:
                 "error": f"Błąd OCR: {str(e)}"
             }
 
-    def analyze_multiple_invoices(self, image_paths: List[str]) -> List[Dict]:
-        """
-        Analizuje wiele faktur i agreguje wyniki
-
-        Args:
-            image_paths: Lista ścieżek do plików faktur
-
-        Returns:
-            Lista wyników dla każdej faktury + zagregowane dane
-        """
-        results = []
-
-        for i, path in enumerate(image_paths, 1):
-            print(f"Analizuję fakturę {i}/{len(image_paths)}: {os.path.basename(path)}")
-            result = self.analyze_invoice(path)
-            result['file_name'] = os.path.basename(path)
-            results.append(result)
-
-        return results
-
-    def aggregate_invoice_data(self, results: List[Dict]) -> Dict:
-        """
-        Agreguje dane z wielu faktur
-
-        Sumuje energię bierną, oblicza średni tgφ, liczy miesiące
-        """
-        successful = [r for r in results if r.get('success', False)]
-
-        if not successful:
-            return {
-                "success": False,
-                "error": "Nie udało się odczytać żadnej faktury",
-                "details": results
-            }
+    def _extract_batch_with_vision(
+        self,
+        groups: List[List[Tuple[str, str]]],
+        deadline_s: Optional[float] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """Kilka faktur w jednym zapytaniu (OCR_BATCH_RESPONSE_FORMAT)"""
+        try:
+            content = [{"type": "text", "text": OCR_PROMPT}]
+            for index, images in enumerate(groups, 1):
+                content.append({"type": "text", "text": f"Faktura {index}:"})
+                content.extend(self._image_parts(images))
+            content.append({"type": "text", "text": OCR_BATCH_INSTRUCTION.format(count=len(groups))})
+
+            structured, result_text, tokens = self._complete(
+                content, OCR_BATCH_RESPONSE_FORMAT, 200 + 300 * len(groups), deadline_s
+            )
+            return self._parse_batch_response(structured, result_text, len(groups)), tokens
 
-        # Suma energii biernej
-        total_energia_bierna = sum(r['energia_bierna_kwh'] for r in successful)
-
-        # Suma miesięcy
-        total_okres_mc = sum(r.get('okres_mc', 1) for r in successful)
-
-        # Średni tgφ (ważony energią)
-        tg_phi_values = [r for r in successful if r.get('tg_phi')]
-        if tg_phi_values:
-            avg_tg_phi = sum(r['tg_phi'] * r['energia_bierna_kwh'] for r in tg_phi_values) / total_energia_bierna
-        else:
-            # Oblicz z energii czynnej jeśli dostępna
-            energia_czynna = [r for r in successful if r.get('energia_czynna_kwh')]
-            if energia_czynna:
-                total_czynna = sum(r['energia_czynna_kwh'] for r in energia_czynna)
-                avg_tg_phi = total_energia_bierna / total_czynna if total_czynna > 0 else None
-            else:
-                avg_tg_phi = None
-
-        return {
-            "success": True,
-            "energia_bierna_kwh": round(total_energia_bierna, 2),
-            "okres_mc": total_okres_mc,
-            "tg_phi": round(avg_tg_phi, 3) if avg_tg_phi else None,
-            "liczba_faktur": len(successful),
-            "faktury": successful,
-            "failed_invoices": [r for r in results if not r.get('success', False)]
-        }
+        except Exception as e:
+            print(f"❌ OCR Error (zapytanie zbiorcze): {str(e)}")
+            return [{"success": False, "error": f"Błąd OCR: {str(e)}"} for _ in groups], None
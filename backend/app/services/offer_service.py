@@ -0,0 +1,277 @@
+import hashlib
+import importlib.util
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.services.calculator import STAWKA_KARY_KVARH
+
+
+class OfferUnavailableError(Exception):
+    """Nie da się przygotować oferty - brak generatora ofert, cennika albo WeasyPrint (PDF)"""
+
+
+class OfferSizingError(Exception):
+    """Wymagana moc przekracza to, co da się zaoferować z cennika (MAKS_SZTUK generatora)"""
+
+
+def check_invoice_values(energia_bierna: float, okres_mc: int) -> None:
+    """
+    Raises:
+        ValueError: energia bierna nie jest dodatnią liczbą skończoną albo okres_mc < 1
+    """
+    if not math.isfinite(energia_bierna) or energia_bierna <= 0:
+        raise ValueError(f"Energia bierna musi być liczbą dodatnią (jest {energia_bierna})")
+    if okres_mc < 1:
+        raise ValueError(f"Okres rozliczeniowy musi wynosić co najmniej 1 miesiąc (jest {okres_mc})")
+
+
+def _load_module(name: str, path: str):
+    """Moduł Pythona z pliku (generator-ofert nie jest pakietem)"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    if spec is None or not os.path.exists(path):
+        raise OfferUnavailableError(f"Brak pliku {path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _PriceList:
+    """Niezmienny snapshot cennika: (moc, koszt, klucz) kompensatorów posortowane po mocy"""
+
+    def __init__(self, cennik: Dict, version: int):
+        self.cennik = cennik
+        self.version = version
+        self.models = sorted(
+            (float(item["moc_kvar"]), float(item["koszt_zakupu"]), key)
+            for key, item in cennik["kompensatory"].items()
+        )
+        if not self.models or any(power <= 0 for power, _, _ in self.models):
+            raise ValueError("Cennik bez kompensatorów albo z mocą <= 0")
+        self.keys = [key for _, _, key in self.models]
+
+
+class OfferEngine:
+    """
+    Oferty HTML/PDF na kompensator - wspólny silnik wyceny dla API
+
+    Koszty, oszczędności, ROI i szablon oferty pochodzą z modułu generatora
+    ofert (generator-ofert/generator.py), więc CLI i API liczą oferty tym
+    samym kodem; stawka kary jest ta sama co w kalkulatorze. cennik.json
+    wczytujemy raz i przeładowujemy, gdy zmieni się jego data modyfikacji
+    (sprawdzane najwyżej co reload_interval_s sekund). Oferta powstaje
+    w pamięci - bez drugiego procesu i bez plików pośrednich.
+    """
+
+    def __init__(self, generator_dir: str, cennik_path: Optional[str] = None, reload_interval_s: float = 5.0):
+        """
+        Args:
+            generator_dir: Katalog generatora ofert (generator.py, generator_pdf.py)
+            cennik_path: Cennik (domyślnie cennik.json w katalogu generatora)
+            reload_interval_s: Co ile sekund najwyżej sprawdzać zmianę cennika
+        """
+        self.generator_dir = generator_dir
+        self.cennik_path = cennik_path or os.path.join(generator_dir, "cennik.json")
+        self.reload_interval_s = reload_interval_s
+        self._lock = threading.Lock()
+        self._pdf_lock = threading.Lock()
+        self._generator = None
+        self._pdf_module = None
+        self._renderer = None
+        self._price_list: Optional[_PriceList] = None
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._numbers = itertools.count(1)
+        self.error: Optional[str] = None
+        self.counters = {"html": 0, "pdf": 0}
+        try:
+            self.reload()
+        except OfferUnavailableError:
+            pass
+
+    def _current_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.cennik_path)
+        except OSError:
+            return None
+
+    def reload(self) -> int:
+        """
+        Wczytuje cennik od nowa (moduł generatora - tylko za pierwszym razem)
+
+        Niepoprawny cennik nie zastępuje poprzedniego - błąd trafia do
+        self.error, a oferty dalej liczone są według ostatniej dobrej wersji.
+
+        Returns:
+            Wersja cennika
+
+        Raises:
+            OfferUnavailableError: nie ma ani generatora, ani żadnej poprawnej wersji cennika
+        """
+        with self._lock:
+            self._mtime = self._current_mtime()
+            self._last_check = time.monotonic()
+            try:
+                if self._generator is None:
+                    self._generator = _load_module(
+                        "generator_ofert", os.path.join(self.generator_dir, "generator.py")
+                    )
+                with open(self.cennik_path, "r", encoding="utf-8") as f:
+                    price_list = _PriceList(json.load(f), self.version + 1)
+            except (OSError, ValueError, KeyError, TypeError, OfferUnavailableError) as e:
+                self.error = str(e) if isinstance(e, OfferUnavailableError) else f"{self.cennik_path}: {str(e)}"
+                print(f"⚠️  Cennik ofert - nie udało się wczytać: {self.error}")
+                if self._price_list is None or self._generator is None:
+                    raise OfferUnavailableError(f"Generator ofert niedostępny ({self.error})")
+                return self._price_list.version
+
+            self.error = None
+            self._price_list = price_list
+            print(f"💰 Cennik ofert v{price_list.version}: {len(price_list.keys)} modeli")
+            return price_list.version
+
+    def _snapshot(self) -> _PriceList:
+        """Aktualny cennik (z przeładowaniem, jeśli plik się zmienił)"""
+        if time.monotonic() - self._last_check >= self.reload_interval_s:
+            self._last_check = time.monotonic()
+            if self._price_list is None or self._current_mtime() != self._mtime:
+                self.reload()
+        if self._price_list is None:
+            raise OfferUnavailableError(f"Generator ofert niedostępny ({self.error})")
+        return self._price_list
+
+    @property
+    def version(self) -> int:
+        return self._price_list.version if self._price_list else 0
+
+    @property
+    def available(self) -> bool:
+        try:
+            self._snapshot()
+            return True
+        except OfferUnavailableError:
+            return False
+
+    def prepare(
+        self,
+        klient: Dict,
+        energia_bierna: float,
+        okres_mc: int,
+        metry_przewodu: int = 5,
+        moc_kvar: Optional[float] = None,
+        data: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Dane oferty (przygotuj_dane_oferty z generatora)
+
+        Args:
+            klient: nazwa, adres, nip, telefon
+            moc_kvar: Wymagana moc - oferowany jest najtańszy model (i liczba sztuk), który ją
+                      pokrywa (dobierz_kompensator generatora); brak - liczona jak w CLI
+
+        Returns:
+            Dane do szablonu oferty (z kluczem 'koszty' - ceny zakupu, nie pokazywać klientowi)
+
+        Raises:
+            ValueError: niepoprawna energia bierna albo okres (check_invoice_values)
+            OfferSizingError: wymagana moc za duża na ofertę z cennika
+        """
+        check_invoice_values(energia_bierna, okres_mc)
+        price_list = self._snapshot()
+        data = data or datetime.now()
+        # Numer unikalny w procesie: skrót treści zapytania + licznik
+        partia = hashlib.sha256(
+            json.dumps([klient, energia_bierna, okres_mc, metry_przewodu], sort_keys=True, default=str).encode()
+        ).hexdigest()[:6]
+        try:
+            return self._generator.przygotuj_dane_oferty(
+                price_list.cennik,
+                {"adres": "", "nip": "", "telefon": "", **klient},
+                energia_bierna,
+                okres_mc,
+                metry_przewodu,
+                self._generator.generuj_numer_oferty(data, partia, next(self._numbers)),
+                data,
+                moc_kvar=moc_kvar
+            )
+        except self._generator.ZaDuzaMocError as e:
+            raise OfferSizingError(str(e))
+
+    def prepare_from_analysis(self, klient: Dict, analiza: Dict, metry_przewodu: int = 5) -> Dict:
+        """
+        Dane oferty z wyniku /api/analyze-invoices albo /api/calculate
+
+        Raises:
+            ValueError: wynik nie zawiera poprawnych danych z faktury (dane.energia_bierna, dane.okres_mc)
+        """
+        try:
+            dane = analiza["dane"]
+            energia_bierna = float(dane["energia_bierna"])
+            okres_mc = int(dane.get("okres_mc") or 1)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Wynik analizy nie zawiera danych z faktury (dane.energia_bierna)")
+
+        obliczenia = analiza.get("obliczenia") or {}
+        moc_kvar = obliczenia.get("moc_wymagana") or analiza.get("moc_kvar")
+        return self.prepare(klient, energia_bierna, okres_mc, metry_przewodu, moc_kvar)
+
+    def render_html(self, dane: Dict) -> str:
+        """Oferta HTML (escapowane dane klienta)"""
+        html = self._generator.generuj_oferte_html(dane)
+        self.counters["html"] += 1
+        return html
+
+    def _pdf_renderer(self):
+        """Rozgrzany RendererPDF z generatora (fonty i CSS oferty ładowane raz)"""
+        if self._renderer is None:
+            with self._pdf_lock:
+                if self._pdf_module is None:
+                    self._pdf_module = _load_module(
+                        "generator_ofert_pdf", os.path.join(self.generator_dir, "generator_pdf.py")
+                    )
+                if not self._pdf_module.WEASYPRINT_AVAILABLE:
+                    raise OfferUnavailableError("PDF niedostępny - brak WeasyPrint (lub bibliotek Pango)")
+                if self._renderer is None:
+                    self._renderer = self._pdf_module.RendererPDF(self._generator.OFERTA_CSS)
+        return self._renderer
+
+    @property
+    def pdf_available(self) -> bool:
+        try:
+            self._pdf_renderer()
+            return True
+        except OfferUnavailableError:
+            return False
+
+    def render_pdf(self, dane: Dict) -> bytes:
+        """
+        Oferta PDF z HTML w pamięci (blokujące - wywoływać z puli wątków)
+
+        Raises:
+            OfferUnavailableError: WeasyPrint nie jest zainstalowany
+        """
+        renderer = self._pdf_renderer()
+        html = self._generator.generuj_oferte_html(dane, css=False)
+        # WeasyPrint nie gwarantuje bezpieczeństwa wątków - jeden PDF naraz
+        with self._pdf_lock:
+            pdf = renderer.render(html)
+        self.counters["pdf"] += 1
+        return pdf
+
+    def stats(self) -> Dict:
+        """Stan silnika ofert dla /api/health"""
+        return {
+            "dostepny": self._price_list is not None,
+            "cennik": self.cennik_path,
+            "wersja_cennika": self.version,
+            "modele": len(self._price_list.keys) if self._price_list else 0,
+            "stawka_kary_kvarh": STAWKA_KARY_KVARH,
+            "blad": self.error,
+            "oferty": dict(self.counters),
+            "pdf": None if self._pdf_module is None else bool(self._pdf_module.WEASYPRINT_AVAILABLE)
+        }
@@ -0,0 +1,254 @@
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+import fitz  # PyMuPDF
+
+# Liczba w polskim formacie: "1 234,56", "1.234,56", "1234.5", "612"
+NUM = r"(\d{1,3}(?:[ \u00a0.]\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?)"
+
+# Jednostki energii biernej spotykane na fakturach (bez kWh - to energia czynna)
+UNIT_BIERNA = r"(?:kvarh|kvar\s*h|kwarh)"
+
+# Próg rozliczeniowy w opisie pozycji ("ponad tg 0,4") - to nie jest ilość
+TG_THRESHOLD = re.compile(r"(?:ponad|powy[żz]ej)?\s*tg\s*(?:φ|ϕ|fi|phi)?\s*[=:]?\s*0[.,]\d+", re.IGNORECASE)
+
+# Wiarygodny odczyt z warstwy tekstowej - poza tym zakresem (albo przy
+# tgφ ponad TG_PHI_MAX_TEXT) oddajemy fakturę do Vision
+ENERGIA_BIERNA_MIN_TEXT = 1.0
+ENERGIA_BIERNA_MAX_TEXT = 1e8
+TG_PHI_MAX_TEXT = 3.0
+
+# Pozycja energii biernej indukcyjnej - etykieta różni się u dostawców,
+# kolejność "jednostka / ilość" w tabeli też (Tauron/Energa: ilość po jm,
+# PGE/Enea: kolumna ilości przed jm)
+SUPPLIER_PARSERS = {
+    "Tauron": {
+        "wykryj": r"tauron",
+        "etykiety": [r"energia\s+bierna\s+indukcyjna", r"en\.\s*bierna\s+ind"],
+        "ilosc_po_jednostce": True,
+    },
+    "PGE": {
+        "wykryj": r"\bpge\b",
+        "etykiety": [r"energia\s+bierna\s+indukcyjna", r"energia\s+bierna\s+ind\."],
+        "ilosc_po_jednostce": False,
+    },
+    "Enea": {
+        "wykryj": r"\benea\b",
+        "etykiety": [r"energia\s+bierna\s+indukcyjna", r"pob[oó]r\s+energii\s+biernej\s+indukcyjnej"],
+        "ilosc_po_jednostce": False,
+    },
+    "Energa": {
+        "wykryj": r"\benerga\b",
+        "etykiety": [r"energia\s+bierna\s+indukcyjna", r"en\.\s*bierna\s+indukcyjna"],
+        "ilosc_po_jednostce": True,
+    },
+}
+
+# Ile znaków za etykietą szukamy wartości (komórki tabeli bywają w kolejnych liniach)
+VALUE_WINDOW = 160
+
+DATE_PATTERN = r"(\d{4}-\d{2}-\d{2}|\d{2}[./-]\d{2}[./-]\d{4})"
+PERIOD_PATTERN = re.compile(
+    r"(?:okres\s+rozliczeniowy|za\s+okres|okres)[^\d]{0,40}" + DATE_PATTERN + r"\s*(?:-|–|do)\s*" + DATE_PATTERN,
+    re.IGNORECASE
+)
+TG_PHI_PATTERN = re.compile(r"tg\s*(?:φ|ϕ|fi|phi)\s*[=:]?\s*(0[.,]\d+)", re.IGNORECASE)
+CZYNNA_PATTERN = re.compile(
+    r"energia\s+czynna[^\n]{0,80}?" + NUM + r"\s*kwh|energia\s+czynna[^\n]{0,40}?kwh\s*" + NUM,
+    re.IGNORECASE
+)
+
+
+def parse_number(value: str) -> float:
+    """Parsuje liczbę w polskim formacie ("1 234,56" -> 1234.56, "0.570" -> 0.57)"""
+    value = value.replace(" ", "").replace("\u00a0", "")
+    if "," in value:
+        value = value.replace(".", "").replace(",", ".")
+    elif re.fullmatch(r"[1-9]\d{0,2}(?:\.\d{3})+", value):
+        value = value.replace(".", "")
+    return float(value)
+
+
+def parse_date(value: str) -> date:
+    """Parsuje datę RRRR-MM-DD lub DD.MM.RRRR"""
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+        year, month, day = value.split("-")
+    else:
+        day, month, year = re.split(r"[./-]", value)
+    return date(int(year), int(month), int(day))
+
+
+# Wagi słów kluczowych przy ocenie, czy strona zawiera dane do kompensacji
+PAGE_KEYWORDS = [
+    (r"energi[ai]\s+biern\w*\s+indukcyjn", 6.0),
+    (r"energi[ai]\s+biern", 3.0),
+    (r"kvarh|kvar\s*h|kwarh", 3.0),
+    (r"tg\s*(?:φ|ϕ|fi|phi)", 2.0),
+    (r"licznik", 1.0),
+    (r"rozliczeni", 1.0),
+    (r"okres\s+rozliczeniowy", 1.0),
+    (r"energi[ai]\s+czynn", 1.0),
+    (r"za[łl][ąa]cznik", 1.0),
+    # Strony, które prawie nigdy nie zawierają rozliczenia
+    (r"regulamin|og[óo]lne\s+warunki|rodo|dane\s+osobowe|reklamacj", -3.0),
+]
+
+
+def score_page(text: str) -> float:
+    """
+    Ocena przydatności strony dla OCR (im więcej, tym lepiej)
+
+    Suma wag słów kluczowych + gęstość liczb (tabele rozliczeniowe).
+    Strona bez warstwy tekstowej (skan) dostaje 0 - nie da się jej ocenić.
+    """
+    if not text.strip():
+        return 0.0
+
+    score = 0.0
+    for pattern, weight in PAGE_KEYWORDS:
+        score += weight * min(len(re.findall(pattern, text, re.IGNORECASE)), 3)
+
+    # Tabele z rozliczeniem to dużo liczb na stronie
+    numbers = len(re.findall(r"\d+[.,]\d+", text))
+    score += min(numbers / 20, 3.0)
+    return score
+
+
+def select_pages(pages: List[str], top_k: Optional[int]) -> List[int]:
+    """
+    Wybiera top_k najlepiej ocenionych stron (indeksy w kolejności stron)
+
+    Bez warstwy tekstowej (skan) wybiera pierwsze top_k stron.
+    top_k=None = wszystkie strony.
+    """
+    if top_k is None or top_k >= len(pages):
+        return list(range(len(pages)))
+
+    scores = [score_page(text) for text in pages]
+    if not any(scores):
+        return list(range(top_k))
+
+    best = sorted(range(len(pages)), key=lambda i: scores[i], reverse=True)[:top_k]
+    return sorted(best)
+
+
+def mentions_reactive_energy(text: str) -> bool:
+    """Czy strona zawiera informacje o energii biernej"""
+    return re.search(r"energi[ai]\s+biern", text, re.IGNORECASE) is not None
+
+
+def detect_supplier(text: str) -> Optional[str]:
+    """Rozpoznaje dostawcę energii po nazwie w tekście faktury"""
+    for supplier, parser in SUPPLIER_PARSERS.items():
+        if re.search(parser["wykryj"], text, re.IGNORECASE):
+            return supplier
+    return None
+
+
+def _find_reactive_energy(text: str, supplier: Optional[str]) -> Optional[float]:
+    """Szuka ilości energii biernej indukcyjnej za etykietą pozycji"""
+    parsers = [SUPPLIER_PARSERS[supplier]] if supplier else list(SUPPLIER_PARSERS.values())
+
+    for parser in parsers:
+        if parser["ilosc_po_jednostce"]:
+            value_pattern = re.compile(UNIT_BIERNA + r"\s*" + NUM, re.IGNORECASE)
+        else:
+            value_pattern = re.compile(NUM + r"\s*" + UNIT_BIERNA, re.IGNORECASE)
+
+        for label in parser["etykiety"]:
+            for match in re.finditer(label, text, re.IGNORECASE):
+                window = text[match.end():match.end() + VALUE_WINDOW]
+                # Nie wchodź w kolejną pozycję (np. energia bierna pojemnościowa)
+                window = re.split(r"pojemno", window, flags=re.IGNORECASE)[0]
+                # "ponad tg 0,4 kvarh 350" - 0,4 to próg, nie ilość
+                window = TG_THRESHOLD.sub(" ", window)
+                value = value_pattern.search(window)
+                if value:
+                    return parse_number(value.group(1))
+
+    return None
+
+
+def _is_plausible(energia_bierna: float, energia_czynna: Optional[float]) -> bool:
+    """
+    Czy odczyt z warstwy tekstowej jest wiarygodny
+
+    Taki wynik trafia do cache na długo i omija Vision - przy wątpliwościach
+    lepiej zapłacić za jedno zapytanie niż liczyć kompensator z błędnej liczby.
+    """
+    if not ENERGIA_BIERNA_MIN_TEXT <= energia_bierna <= ENERGIA_BIERNA_MAX_TEXT:
+        return False
+    if energia_czynna is not None and (energia_czynna <= 0 or energia_bierna / energia_czynna > TG_PHI_MAX_TEXT):
+        return False
+    return True
+
+
+def _find_period_months(text: str) -> Optional[int]:
+    """Liczba miesięcy okresu rozliczeniowego (z dat od-do)"""
+    match = PERIOD_PATTERN.search(text)
+    if not match:
+        return None
+    try:
+        start, end = parse_date(match.group(1)), parse_date(match.group(2))
+    except ValueError:
+        return None
+    days = (end - start).days + 1
+    if days <= 0:
+        return None
+    return max(1, round(days / 30.4))
+
+
+def extract_text_pages(pdf_path: str, max_pages: int = 15) -> List[str]:
+    """Tekst z warstwy tekstowej PDF (pusty string dla stron-skanów)"""
+    with fitz.open(pdf_path) as doc:
+        return [doc.load_page(i).get_text() for i in range(min(len(doc), max_pages))]
+
+
+def extract_invoice_from_text(pages: List[str]) -> Optional[Dict]:
+    """
+    Próbuje odczytać dane faktury z warstwy tekstowej PDF (bez Vision API)
+
+    Faktury Tauron/PGE/Enea/Energa generowane cyfrowo mają tabelę energii
+    biernej w warstwie tekstowej - wtedy nie trzeba renderować stron.
+
+    Returns:
+        Dict w formacie wyniku OCR albo None, gdy brakuje energii biernej
+        lub okresu rozliczeniowego albo odczyt jest niewiarygodny (wtedy trzeba użyć Vision)
+    """
+    text = "\n".join(pages)
+    if not text.strip() or not mentions_reactive_energy(text):
+        return None
+
+    supplier = detect_supplier(text)
+    energia_bierna = _find_reactive_energy(text, supplier)
+    okres_mc = _find_period_months(text)
+    if energia_bierna is None or okres_mc is None:
+        return None
+
+    energia_czynna = None
+    czynna_match = CZYNNA_PATTERN.search(text)
+    if czynna_match:
+        energia_czynna = parse_number(czynna_match.group(1) or czynna_match.group(2))
+
+    if not _is_plausible(energia_bierna, energia_czynna):
+        return None
+
+    tg_phi = None
+    tg_match = TG_PHI_PATTERN.search(text)
+    if tg_match:
+        tg_phi = parse_number(tg_match.group(1))
+    elif energia_czynna:
+        tg_phi = round(energia_bierna / energia_czynna, 3)
+
+    return {
+        "energia_bierna_kwh": energia_bierna,
+        "tg_phi": tg_phi,
+        "okres_mc": okres_mc,
+        "energia_czynna_kwh": energia_czynna,
+        "dostawca": supplier,
+        "data_faktury": None,
+        "success": True,
+        "error": None,
+        "zrodlo": "text_layer"
+    }
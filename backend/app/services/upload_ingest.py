@@ -0,0 +1,169 @@
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+# Rozmiar kawałka przy strumieniowym zapisie uploadu
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Sygnatury plików (magic bytes) -> (media type, rozszerzenie)
+# Typ rozpoznajemy po zawartości, nie po nagłówku Content-Type od klienta
+FILE_SIGNATURES = [
+    (b"%PDF-", "application/pdf", ".pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"GIF87a", "image/gif", ".gif"),
+    (b"GIF89a", "image/gif", ".gif"),
+]
+
+
+class UploadRejectedError(Exception):
+    """Plik odrzucony przy przyjmowaniu (za duży lub nieobsługiwany typ)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Limit rozmiaru body requestu - pilnowany w trakcie odbierania
+
+    Starlette zapisuje cały multipart do plików tymczasowych, zanim handler
+    zobaczy pierwszy plik, więc limit w ingest_upload działa dopiero po fakcie.
+    Tu odrzucamy request od razu po Content-Length, a bez niego (chunked)
+    przerywamy odbiór, gdy przyjęte bajty przekroczą limit - zanim reszta
+    trafi na dysk.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _too_large(self) -> str:
+        return f"Za duży request (limit {self.max_bytes / (1024 * 1024):.1f} MB)"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": self._too_large()})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI przepuszcza HTTPException z parsowania body - klient dostaje 413
+                    raise HTTPException(status_code=413, detail=self._too_large())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+@dataclass
+class IngestedUpload:
+    """Przesłany plik zapisany w katalogu tymczasowym"""
+    path: str
+    file_name: str
+    sha256: str
+    media_type: str
+    size: int
+
+
+def sniff_file_type(head: bytes) -> Optional[tuple]:
+    """Rozpoznaje typ pliku po pierwszych bajtach -> (media type, rozszerzenie)"""
+    for signature, media_type, ext in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return media_type, ext
+
+    # WEBP: "RIFF" + 4 bajty rozmiaru + "WEBP"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+
+    return None
+
+
+async def ingest_upload(upload: UploadFile, upload_dir: str, max_size: int) -> IngestedUpload:
+    """
+    Strumieniowo zapisuje upload do pliku tymczasowego
+
+    W jednym przebiegu: liczy SHA-256, rozpoznaje typ po magic bytes
+    i pilnuje limitu rozmiaru (przerywa zapis zaraz po przekroczeniu).
+    Przy błędzie plik tymczasowy jest usuwany.
+
+    Raises:
+        UploadRejectedError: plik za duży (413) lub nieobsługiwany typ (400)
+    """
+    file_name = os.path.basename(upload.filename or "faktura")
+    digest = hashlib.sha256()
+    size = 0
+    file_type = None
+    tmp_path = None
+    tmp_file = None
+
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+
+            if file_type is None:
+                # Typ znany po pierwszym kawałku - dopiero wtedy tworzymy plik
+                file_type = sniff_file_type(chunk[:16])
+                if file_type is None:
+                    raise UploadRejectedError(
+                        f"Nieprawidłowy typ pliku: {file_name}. Dozwolone: JPG, PNG, PDF"
+                    )
+                fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix="upload_", suffix=file_type[1])
+                tmp_file = os.fdopen(fd, "wb")
+
+            size += len(chunk)
+            if size > max_size:
+                raise UploadRejectedError(
+                    f"Plik {file_name} jest za duży (maks. {max_size // (1024 * 1024)} MB)",
+                    status_code=413
+                )
+
+            digest.update(chunk)
+            await run_in_threadpool(tmp_file.write, chunk)
+
+        if file_type is None:
+            raise UploadRejectedError(f"Pusty plik: {file_name}")
+
+        tmp_file.close()
+        return IngestedUpload(
+            path=tmp_path,
+            file_name=file_name,
+            sha256=digest.hexdigest(),
+            media_type=file_type[0],
+            size=size
+        )
+
+    except BaseException:
+        if tmp_file is not None:
+            tmp_file.close()
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    finally:
+        await upload.close()
+
+
+def cleanup_uploads(uploads: List[IngestedUpload]) -> None:
+    """Usuwa pliki tymczasowe uploadów"""
+    for upload in uploads:
+        if os.path.exists(upload.path):
+            os.remove(upload.path)
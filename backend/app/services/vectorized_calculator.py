@@ -0,0 +1,224 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.calculator import ROI_BRAK_OSZCZEDNOSCI, STAWKA_KARY_KVARH, CompensatorCalculator
+from app.services.catalog import CompensatorCatalog
+from app.services.compensator_optimizer import CompensatorOptimizer, describe_set
+
+# Progi tgφ -> zapas mocy (te same co w CompensatorCalculator._calculate_raw)
+ZAPAS_PROGI = [0.6, 0.5, 0.45]
+ZAPAS_WARTOSCI = [1.6, 1.5, 1.4]
+ZAPAS_MINIMALNY = 1.3
+ZAPAS_PV = 1.25
+
+GODZIN_W_MIESIACU = 730
+TG_PHI_DOCELOWY = 0.38
+
+
+def round_half_even(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    Zaokrąglenie zgodne co do bitu z wbudowanym round(x, ndigits)
+
+    np.round mnoży przez 10^n, więc dla wartości leżących tuż przy
+    połówce (np. 0.15 = 0.1499999...) może wybrać inną stronę niż
+    Python. Takie przypadki (bardzo rzadkie) oraz ogromne wartości,
+    przy których mnożenie traci precyzję, liczymy skalarnie.
+    """
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    rounded = np.round(values, ndigits)
+
+    frac = scaled - np.floor(scaled)
+    near_half = np.isfinite(values) & ((np.abs(frac - 0.5) < 1e-6) | (np.abs(scaled) >= 2.0 ** 52))
+    for i in np.flatnonzero(near_half):
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+class VectorizedCalculator:
+    """
+    Obliczenia kompensatorów na kolumnach (NumPy)
+
+    Ta sama matematyka co CompensatorCalculator.calculate_compensator,
+    ale dla tysięcy wierszy naraz - do obliczeń wsadowych i analiz
+    "co jeśli". Wyniki są identyczne (co do bitu) ze ścieżką skalarną.
+    """
+
+    def __init__(
+        self,
+        catalog: Optional[CompensatorCatalog] = None,
+        producent: str = "LOPI",
+        optimizer: Optional[CompensatorOptimizer] = None
+    ):
+        self.catalog = catalog or CompensatorCatalog(builtin=CompensatorCalculator.COMPENSATORS_DB)
+        self.optimizer = optimizer or CompensatorOptimizer(self.catalog, producent, "dynamiczny")
+
+    def _select_sets(self, moc_wymagana: np.ndarray):
+        """
+        Najtańsze zestawy dla każdego wiersza
+
+        Optymalizator liczy tylko unikalne wartości wymaganej mocy (w pełnych
+        kvar) - w typowym wsadzie to kilkaset wartości na tysiące wierszy.
+
+        Returns:
+            (indeks zestawu dla wiersza, lista zestawów)
+        """
+        kvar = np.maximum(np.ceil(moc_wymagana), 1)
+        unique, inverse = np.unique(kvar, return_inverse=True)
+        sets = [self.optimizer.optimize(float(k)) for k in unique]
+        return inverse.reshape(kvar.shape), sets
+
+    def calculate_arrays(
+        self,
+        energia_bierna_kwh,
+        okres_mc,
+        tg_phi,
+        ma_pv,
+        moc_czynna_kw=None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Oblicza moc kompensatora, model, kary i ROI dla kolumn danych
+
+        Args:
+            energia_bierna_kwh: Energia bierna w kWh
+            okres_mc: Okres rozliczeniowy w miesiącach
+            tg_phi: Współczynnik tgφ
+            ma_pv: Flagi instalacji PV
+            moc_czynna_kw: Moc czynna (opcjonalnie, NaN/0 = brak)
+
+        Returns:
+            Dict tablic: moc_kvar, cena, zestaw_idx (indeks w liście zestawy),
+            kary_pln, roi_lata oraz wartości pośrednie (srednia_kvar, zapas,
+            moc_wymagana, qc_wzor)
+        """
+        energia = np.asarray(energia_bierna_kwh, dtype=np.float64)
+        okres = np.asarray(okres_mc, dtype=np.int64)
+        tg = np.asarray(tg_phi, dtype=np.float64)
+        pv = np.asarray(ma_pv, dtype=bool)
+
+        # 1. Średnia moc bierna
+        godziny = okres * GODZIN_W_MIESIACU
+        srednia_kvar = energia / godziny
+
+        # 2. Zapas zależny od tgφ (drabinka progów) + dodatek dla PV
+        zapas = np.select([tg >= prog for prog in ZAPAS_PROGI], ZAPAS_WARTOSCI, ZAPAS_MINIMALNY)
+        zapas = np.where(pv, zapas * ZAPAS_PV, zapas)
+        moc_metoda1 = srednia_kvar * zapas
+
+        # 3. Wzór QC = P × (tgφ₁ - tgφ₂), P szacowane z energii gdy brak mocy czynnej
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moc_czynna_szac = (energia / tg) / godziny
+            qc_wzor = np.where(tg > 0, moc_czynna_szac * (tg - TG_PHI_DOCELOWY), np.nan)
+
+            if moc_czynna_kw is not None:
+                moc_czynna = np.asarray(moc_czynna_kw, dtype=np.float64)
+                ma_moc = np.nan_to_num(moc_czynna) != 0
+                qc_wzor = np.where(ma_moc, moc_czynna * (tg - TG_PHI_DOCELOWY), qc_wzor)
+
+            moc_wymagana = np.where(qc_wzor > 0, np.maximum(moc_metoda1, qc_wzor), moc_metoda1)
+
+        # 4. Najtańszy zestaw z katalogu pokrywający wymaganą moc
+        zestaw_idx, zestawy = self._select_sets(moc_wymagana)
+        moc_kvar = np.array([z["moc_kvar"] for z in zestawy], dtype=np.int64)[zestaw_idx]
+        cena = np.array([z["cena"] for z in zestawy], dtype=np.int64)[zestaw_idx]
+
+        # 5. Kary i ROI
+        kary_mc = energia * STAWKA_KARY_KVARH / okres
+        oszczednosc_rok = kary_mc * 12
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roi = np.where(
+                oszczednosc_rok > 0,
+                round_half_even(cena / oszczednosc_rok, 1),
+                float(ROI_BRAK_OSZCZEDNOSCI)
+            )
+
+        return {
+            "srednia_kvar": srednia_kvar,
+            "zapas": zapas,
+            "moc_wymagana": moc_wymagana,
+            "qc_wzor": qc_wzor,
+            "moc_kvar": moc_kvar,
+            "cena": cena,
+            "zestaw_idx": zestaw_idx,
+            "zestawy": zestawy,
+            "kary_mc": kary_mc,
+            "oszczednosc_rok": oszczednosc_rok,
+            "kary_pln": np.rint(kary_mc).astype(np.int64),
+            "roi_lata": roi
+        }
+
+    def calculate_rows(
+        self,
+        energia_bierna_kwh: List[float],
+        okres_mc: List[int],
+        tg_phi: List[float],
+        ma_pv: List[bool]
+    ) -> List[Dict]:
+        """
+        Obliczenia wsadowe - wyniki w formacie CalculationResult.model_dump()
+
+        Zaokrąglenia liczone na tablicach, do Pythona schodzimy dopiero
+        przy składaniu słowników wynikowych.
+        """
+        if not energia_bierna_kwh:
+            return []
+
+        arrays = self.calculate_arrays(energia_bierna_kwh, okres_mc, tg_phi, ma_pv)
+        zestawy = arrays["zestawy"]
+        opisy = [describe_set(z["zestaw"]) for z in zestawy]
+
+        srednia = round_half_even(arrays["srednia_kvar"], 2).tolist()
+        moc_wymagana = round_half_even(arrays["moc_wymagana"], 2).tolist()
+        qc_raw = arrays["qc_wzor"]
+        qc = round_half_even(np.nan_to_num(qc_raw), 2).tolist()
+        qc_truthy = (~np.isnan(qc_raw) & (qc_raw != 0)).tolist()
+        moc_kvar = arrays["moc_kvar"].tolist()
+        zestaw_idx = arrays["zestaw_idx"].tolist()
+        kary = arrays["kary_pln"].tolist()
+        rok = np.rint(arrays["oszczednosc_rok"]).astype(np.int64).tolist()
+        roi = arrays["roi_lata"].tolist()
+
+        # Kilka możliwych wartości zapasu - formatowanie z cache
+        zapas_labels = {}
+        zapas = arrays["zapas"].tolist()
+
+        rows = []
+        for i in range(len(moc_kvar)):
+            zestaw = zestawy[zestaw_idx[i]]
+            if zapas[i] not in zapas_labels:
+                zapas_labels[zapas[i]] = f"{round((zapas[i] - 1) * 100)}%"
+
+            rows.append({
+                "moc_kvar": moc_kvar[i],
+                "typ": "dynamiczny",
+                "rekomendacja": {
+                    "moc_kvar": moc_kvar[i],
+                    "typ": "dynamiczny",
+                    "model": opisy[zestaw_idx[i]],
+                    "cena_szacunkowa": zestaw["cena"],
+                    "zestaw": zestaw["zestaw"]
+                },
+                "roi_lata": roi[i],
+                "kary_pln": kary[i],
+                "oszczednosc_mc": kary[i],
+                "oszczednosc_rok": rok[i],
+                "dane": {
+                    "energia_bierna": energia_bierna_kwh[i],
+                    "tg_phi": tg_phi[i],
+                    "ma_pv": ma_pv[i],
+                    "okres_mc": okres_mc[i]
+                },
+                "obliczenia": {
+                    "srednia_kvar": srednia[i],
+                    "moc_wymagana": moc_wymagana[i],
+                    "qc_wzor": qc[i] if qc_truthy[i] else None,
+                    "zapas_zastosowany": zapas_labels[zapas[i]],
+                    "metoda": "inteligentna (zależna od tgφ)",
+                    "min_lopi": "5 kvar"
+                },
+                "zrodlo_danych": "manual",
+                "faktury_przeanalizowane": 1
+            })
+
+        return rows
@@ -0,0 +1,108 @@
+"""
+Benchmark doboru zestawu kompensatorów (app/services/compensator_optimizer.py)
+
+Na losowych katalogach (N modeli, moce całkowite kvar) mierzy czas
+optimize() dla zimnej tablicy DP i dla wyniku z pamięci. Z --verify
+porównuje wynik z pełnym przeglądem zestawów na małym katalogu
+(najniższa cena, potem mniej sztuk, potem mniejszy nadmiar mocy).
+
+    python scripts/bench_optimizer.py
+    python scripts/bench_optimizer.py --sizes 8,100,500 --targets 5000,1000000 --verify
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.catalog import CompensatorCatalog  # noqa: E402
+from app.services.compensator_optimizer import CompensatorOptimizer  # noqa: E402
+
+
+def random_catalog(size: int, seed: int) -> CompensatorCatalog:
+    """Katalog size modeli LOPI: moce 5-200 kvar, cena ~ moc z rozrzutem"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(size):
+        moc = rng.randint(1, 40) * 5
+        items.append({
+            "model": f"BENCH {i} {moc}",
+            "moc_kvar": moc,
+            "cena": int(moc * rng.uniform(60, 140) + 1500),
+            "typ": "dynamiczny",
+            "producent": "LOPI"
+        })
+    return CompensatorCatalog(builtin=items)
+
+
+def brute_force(items, kvar: int):
+    """(cena, sztuki, moc) najlepszego zestawu o mocy >= kvar - pełny przegląd"""
+    best = None
+
+    def search(i, moc, cena, sztuki):
+        nonlocal best
+        if moc >= kvar:
+            candidate = (cena, sztuki, moc)
+            if best is None or candidate < best:
+                best = candidate
+            return
+        if i == len(items):
+            return
+        item = items[i]
+        for count in range(-(-(kvar - moc) // item["moc_kvar"]) + 1):
+            search(i + 1, moc + count * item["moc_kvar"], cena + count * item["cena"], sztuki + count)
+
+    search(0, 0, 0, 0)
+    return best
+
+
+def verify(max_kvar: int, seed: int) -> int:
+    """Liczba celów 1..max_kvar, dla których optymalizator różni się od pełnego przeglądu"""
+    rng = random.Random(seed)
+    items = [
+        {"model": f"V {moc}", "moc_kvar": moc, "cena": int(moc * rng.uniform(60, 140) + 1500),
+         "typ": "dynamiczny", "producent": "LOPI"}
+        for moc in (5, 10, 15, 20, 25, 30, 40, 50, 75)
+    ]
+    optimizer = CompensatorOptimizer(CompensatorCatalog(builtin=items))
+    mismatches = 0
+    for kvar in range(1, max_kvar + 1):
+        result = optimizer.optimize(kvar)
+        got = (result["cena"], sum(z["ilosc"] for z in result["zestaw"]), result["moc_kvar"])
+        if got != brute_force(items, kvar):
+            mismatches += 1
+            print(f"   ✗ {kvar} kvar: {got} != {brute_force(items, kvar)}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="8,100,500", help="Liczby modeli w katalogu")
+    parser.add_argument("--targets", default="5000,50000,1000000", help="Wymagane moce (kvar)")
+    parser.add_argument("--repeat", type=int, default=1000, help="Powtórzenia dla wyniku z pamięci")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verify", action="store_true", help="Porównaj z pełnym przeglądem (1..259 kvar)")
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        for target in (int(t) for t in args.targets.split(",")):
+            optimizer = CompensatorOptimizer(random_catalog(size, args.seed))
+
+            start = time.perf_counter()
+            result = optimizer.optimize(target)
+            cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                optimizer.optimize(target)
+            warm = (time.perf_counter() - start) / args.repeat
+
+            sztuki = sum(z["ilosc"] for z in result["zestaw"])
+            print(f"{size:>4} modeli  {target:>8} kvar  zimno {cold * 1e3:8.2f} ms  "
+                  f"z pamięci {warm * 1e6:6.1f} µs  ({sztuki} szt., {result['moc_kvar']} kvar)")
+
+    if args.verify:
+        mismatches = verify(259, args.seed)
+        print(f"Zgodność z pełnym przeglądem 1..259 kvar: {'OK' if not mismatches else f'{mismatches} różnic'}")
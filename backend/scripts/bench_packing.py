@@ -0,0 +1,77 @@
+"""
+Benchmark pakowania faktur w jedno zapytanie Vision (OCRRouter.pack_mode)
+
+Dla 2, 5 i 10 małych faktur porównuje łączny czas analizy, liczbę
+zapytań i tokeny przy zapytaniu na fakturę (off), pakowaniu tylko
+gdy fan-out się nie mieści (auto) i pakowaniu zawsze (always).
+Stub powinien doliczać czas generowania odpowiedzi - przy długich
+odpowiedziach paczka jest wolniejsza od pojedynczego zapytania.
+
+    python scripts/vision_stub_server.py --port 8900 --latency-ms 1500 --ms-per-output-token 15 &
+    python scripts/bench_packing.py --base-url http://127.0.0.1:8900 --concurrency 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.claude_ocr_service import ClaudeOCRService  # noqa: E402
+from app.services.http_transport import TransportConfig, VisionTransport  # noqa: E402
+from app.services.image_preprocess import ImagePreprocessor  # noqa: E402
+from app.services.ocr_backends import merge_token_usage  # noqa: E402
+from app.services.ocr_router import OCRRouter  # noqa: E402
+
+
+def make_scan(path: str, seed: int) -> None:
+    """Mały skan faktury (jedna strona)"""
+    img = Image.new("L", (1200, 1700), 245)
+    draw = ImageDraw.Draw(img)
+    for y in range(100, 1600, 40):
+        draw.rectangle((100, y, 300 + (y * (seed + 7)) % 700, y + 18), fill=40)
+    img.save(path, "JPEG", quality=80)
+
+
+def run(base_url: str, service: ClaudeOCRService, paths, concurrency: int, mode: str):
+    router = OCRRouter(backends=[service], free_backends=[], max_concurrency=concurrency, pack_mode=mode)
+    before = httpx.get(base_url + "/stats").json()["requests"]
+    start = time.perf_counter()
+    results = router.analyze_multiple_invoices(paths)
+    elapsed = time.perf_counter() - start
+    requests = httpx.get(base_url + "/stats").json()["requests"] - before
+    assert all(r.get("success") for r in results), results
+    tokens = merge_token_usage(*(r.get("tokeny") for r in results))
+    return elapsed, requests, tokens
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8900")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--sizes", default="2,5,10")
+    args = parser.parse_args()
+
+    corpus = tempfile.mkdtemp(prefix="invoice-scans-")
+    sizes = [int(n) for n in args.sizes.split(",")]
+    all_paths = [os.path.join(corpus, f"{i}.jpg") for i in range(max(sizes))]
+    for i, path in enumerate(all_paths):
+        make_scan(path, i)
+
+    transport = VisionTransport(TransportConfig(deadline_s=120))
+    service = ClaudeOCRService(
+        "stub", transport=transport, base_url=args.base_url, preprocessor=ImagePreprocessor(workers=0)
+    )
+
+    for count in sizes:
+        for mode in ("off", "auto", "always"):
+            elapsed, requests, tokens = run(args.base_url, service, all_paths[:count], args.concurrency, mode)
+            print(f"{count:>3} faktur  {mode:<6}  {elapsed * 1000:6.0f} ms  zapytania {requests:>2}  "
+                  f"tokeny wej. {tokens['input']:>6}  wyj. {tokens['output']:>5}  "
+                  f"cache {tokens['cache_read'] + tokens['cache_write']:>6}")
+
+    transport.close()
@@ -0,0 +1,93 @@
+"""
+Benchmark transportu Vision na lokalnym stubie (scripts/vision_stub_server.py)
+
+Porównuje współdzieloną pulę połączeń (VisionTransport) z klientem
+tworzonym na każde wywołanie i pokazuje p50/p95/p99 oraz liczbę
+otwartych połączeń TCP.
+
+    python scripts/vision_stub_server.py --port 8900 &
+    python scripts/bench_transport.py --base-url http://127.0.0.1:8900 --requests 500 --concurrency 32
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.http_transport import TransportConfig, VisionTransport  # noqa: E402
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def run(base_url: str, requests: int, concurrency: int, shared: bool, config: TransportConfig, backend: str):
+    transport = VisionTransport(config) if shared else None
+
+    def one(_):
+        t = transport or VisionTransport(config)
+        start = time.perf_counter()
+        try:
+            if backend == "openai":
+                client = t.openai_client("stub", base_url + "/v1")
+                t.call("openai", lambda timeout: client.chat.completions.create(
+                    model="gpt-4o", messages=[{"role": "user", "content": "x"}], timeout=timeout
+                ))
+            else:
+                client = t.anthropic_client("stub", base_url)
+                t.call("anthropic", lambda timeout: client.messages.create(
+                    model="claude-sonnet-4-5", max_tokens=16,
+                    messages=[{"role": "user", "content": "x"}], timeout=timeout
+                ))
+            ok = True
+        except Exception:
+            ok = False
+        finally:
+            if transport is None:
+                t.close()
+        return time.perf_counter() - start, ok
+
+    before = httpx.get(base_url + "/stats").json()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    after = httpx.get(base_url + "/stats").json()
+
+    latencies = [r[0] * 1000 for r in results]
+    label = "wspólna pula" if shared else "klient na wywołanie"
+    print(f"{label:<22} max_conn={config.max_connections:<4} {requests / elapsed:7.1f} req/s  "
+          f"p50 {percentile(latencies, 50):6.1f} ms  p95 {percentile(latencies, 95):6.1f} ms  "
+          f"p99 {percentile(latencies, 99):6.1f} ms  błędy {sum(not r[1] for r in results):4d}  "
+          f"nowe połączenia {after['connections'] - before['connections']}")
+    if transport is not None:
+        stats = transport.stats()
+        print(f"{'':<22} ponowienia {stats['retries']}, odrzucone przez budżet {stats['retries_denied']}, "
+              f"breakery {stats['breakers']}")
+        transport.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8900")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-connections", type=int, nargs="+", default=[4, 32])
+    parser.add_argument("--deadline-s", type=float, default=30.0)
+    parser.add_argument("--backend", choices=["anthropic", "openai"], default="anthropic")
+    args = parser.parse_args()
+
+    for max_connections in args.max_connections:
+        config = TransportConfig(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            deadline_s=args.deadline_s,
+            backoff_base_s=0.05
+        )
+        run(args.base_url, args.requests, args.concurrency, True, config, args.backend)
+    run(args.base_url, args.requests, args.concurrency, False, TransportConfig(deadline_s=args.deadline_s), args.backend)
@@ -0,0 +1,216 @@
+"""
+Lokalny stub Vision API (Anthropic /v1/messages + OpenAI /v1/chat/completions)
+
+Do benchmarków puli połączeń i opóźnień bez sieci i bez kosztów API.
+Opóźnienie: stałe + rzadki "ogon" (tail) + czas zależny od rozmiaru
+zapytania (--ms-per-mb: wysyłka i przetwarzanie obrazów), opcjonalnie
+losowe błędy 529. Gdy zapytanie ma narzędzia, odpowiada tool_use;
+--prose-prob: odsetek odpowiedzi tekstem z komentarzem wokół JSON
+(jak model, który nie trzyma się formatu). System prompt z cache_control
+jest "cache'owany" jak w API (cache_creation/cache_read_input_tokens).
+Zapytanie zbiorcze (narzędzie/schemat zapisz_dane_faktur, nagłówki
+"Faktura k:") dostaje wynik dla każdej faktury; --ms-per-output-token
+dolicza czas generowania odpowiedzi (~120 tokenów na fakturę).
+
+Uruchomienie:
+    python scripts/vision_stub_server.py --port 8900 --latency-ms 80 --tail-ms 3000 --tail-prob 0.02
+
+Potem np. ANTHROPIC_BASE_URL=http://127.0.0.1:8900 albo
+python scripts/bench_transport.py --base-url http://127.0.0.1:8900
+"""
+import argparse
+import asyncio
+import json
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Odpowiedź jak z prawdziwej faktury (JSON w formacie OCR_PROMPT)
+INVOICE_JSON = json.dumps({
+    "energia_bierna_kwh": 612.0,
+    "tg_phi": 0.57,
+    "okres_mc": 2,
+    "energia_czynna_kwh": 1074.0,
+    "dostawca": "Tauron",
+    "data_faktury": "2025-03-31",
+    "success": True,
+    "error": None
+})
+
+# Odpowiedź "gadatliwego" modelu: JSON w markdown z komentarzem i usterkami
+PROSE_RESPONSE = (
+    "Przeanalizowałem fakturę. Oto wynik:\n```json\n"
+    + INVOICE_JSON.replace("612.0", "612,0").replace("true", "True").rstrip("}") + ",}\n```\n"
+    + "Wartość energii biernej pochodzi z załącznika."
+)
+
+# Tokeny odpowiedzi na jedną fakturę, wejścia na obraz i na resztę zapytania
+OUTPUT_TOKENS_PER_INVOICE = 120
+INPUT_TOKENS_PER_IMAGE = 1400
+INPUT_TOKENS_BASE = 100
+
+app = FastAPI(title="Vision API stub")
+settings = {
+    "latency_ms": 80.0, "tail_ms": 0.0, "tail_prob": 0.0, "ms_per_mb": 0.0,
+    "error_rate": 0.0, "error_status": 529, "prose_prob": 0.0, "ms_per_output_token": 0.0
+}
+stats = {"requests": 0, "errors": 0, "connections": set(), "bytes": 0}
+prompt_cache = set()
+
+
+def cached_prefix_usage(payload: dict) -> dict:
+    """Tokeny prefiksu (tools + system) zapisane do cache albo z niego odczytane"""
+    system = payload.get("system")
+    if not isinstance(system, list) or not any("cache_control" in block for block in system):
+        return {"cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+
+    prefix = json.dumps([payload.get("tools"), system], sort_keys=True)
+    tokens = len(prefix) // 3
+    if prefix in prompt_cache:
+        return {"cache_creation_input_tokens": 0, "cache_read_input_tokens": tokens}
+    prompt_cache.add(prefix)
+    return {"cache_creation_input_tokens": tokens, "cache_read_input_tokens": 0}
+
+
+def batch_size(payload: dict) -> int:
+    """Liczba faktur w zapytaniu zbiorczym (0 = zwykłe zapytanie o jedną fakturę)"""
+    choice = (payload.get("tool_choice") or {}).get("name") or \
+        ((payload.get("response_format") or {}).get("json_schema") or {}).get("name")
+    if choice != "zapisz_dane_faktur":
+        return 0
+    content = payload["messages"][-1]["content"]
+    return sum(1 for block in content if block.get("type") == "text" and block["text"].startswith("Faktura "))
+
+
+def invoice_output(payload: dict) -> dict:
+    """Wynik dla jednej faktury albo {"faktury": [...]} dla zapytania zbiorczego"""
+    count = batch_size(payload)
+    if not count:
+        return json.loads(INVOICE_JSON)
+    return {"faktury": [{"indeks": i, **json.loads(INVOICE_JSON)} for i in range(1, count + 1)]}
+
+
+async def simulate(request: Request):
+    """Opóźnienie/błąd jak w API; None = odpowiedz normalnie"""
+    stats["requests"] += 1
+    stats["connections"].add(tuple(request.scope["client"] or ()))
+    body = await request.body()
+    stats["bytes"] += len(body)
+    request.state.payload = json.loads(body or b"{}")
+
+    content = (request.state.payload.get("messages") or [{}])[-1].get("content")
+    images = sum(1 for block in content if block.get("type") in ("image", "image_url")) if isinstance(content, list) else 0
+    request.state.input_tokens = INPUT_TOKENS_BASE + INPUT_TOKENS_PER_IMAGE * images
+    request.state.output_tokens = OUTPUT_TOKENS_PER_INVOICE * max(1, batch_size(request.state.payload))
+    delay = settings["latency_ms"] + settings["ms_per_mb"] * len(body) / 1e6 \
+        + settings["ms_per_output_token"] * request.state.output_tokens
+    if random.random() < settings["tail_prob"]:
+        delay += settings["tail_ms"]
+    await asyncio.sleep(delay / 1000)
+
+    if random.random() < settings["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse(
+            status_code=settings["error_status"],
+            content={"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}
+        )
+    return None
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    error = await simulate(request)
+    if error is not None:
+        return error
+
+    tools = request.state.payload.get("tools")
+    if random.random() < settings["prose_prob"]:
+        content = [{"type": "text", "text": PROSE_RESPONSE}]
+    elif tools:
+        name = (request.state.payload.get("tool_choice") or {}).get("name", tools[0]["name"])
+        content = [{"type": "tool_use", "id": "toolu_stub", "name": name, "input": invoice_output(request.state.payload)}]
+    else:
+        content = [{"type": "text", "text": json.dumps(invoice_output(request.state.payload))}]
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": "claude-sonnet-4-5",
+        "content": content,
+        "stop_reason": "tool_use" if content[0]["type"] == "tool_use" else "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": request.state.input_tokens, "output_tokens": request.state.output_tokens, **cached_prefix_usage(request.state.payload)}
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    error = await simulate(request)
+    if error is not None:
+        return error
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [{
+            "index": 0,
+            "message": {
+                "role": "assistant",
+                "content": PROSE_RESPONSE if random.random() < settings["prose_prob"]
+                else json.dumps(invoice_output(request.state.payload))
+            },
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": request.state.input_tokens,
+            "completion_tokens": request.state.output_tokens,
+            "total_tokens": request.state.input_tokens + request.state.output_tokens
+        }
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    """Liczba zapytań, błędów, otwartych połączeń TCP (różne porty klienta) i odebranych bajtów"""
+    return {
+        "requests": stats["requests"],
+        "errors": stats["errors"],
+        "connections": len(stats["connections"]),
+        "bytes": stats["bytes"]
+    }
+
+
+@app.post("/settings")
+async def update_settings(request: Request):
+    """Zmiana opóźnień/błędów w trakcie działania (np. symulacja awarii)"""
+    settings.update(await request.json())
+    return settings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--tail-ms", type=float, default=0.0)
+    parser.add_argument("--tail-prob", type=float, default=0.0)
+    parser.add_argument("--ms-per-mb", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=529)
+    parser.add_argument("--prose-prob", type=float, default=0.0)
+    parser.add_argument("--ms-per-output-token", type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings.update(
+        latency_ms=args.latency_ms,
+        tail_ms=args.tail_ms,
+        tail_prob=args.tail_prob,
+        ms_per_mb=args.ms_per_mb,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        prose_prob=args.prose_prob,
+        ms_per_output_token=args.ms_per_output_token
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,5 @@
+import os
+
+# Testy API nie mogą wołać prawdziwego Vision (klucze z .env nie nadpisują pustych)
+os.environ["ANTHROPIC_API_KEY"] = ""
+os.environ["OPENAI_API_KEY"] = ""
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def calculate(**body):
+    """Wynik /api/calculate bez pola źródła - do porównań z wsadem"""
+    result = client.post("/api/calculate", json=body).json()
+    result.pop("zrodlo_danych")
+    return result
+
+
+def without_row_fields(line):
+    return {k: v for k, v in line.items() if k not in ("index", "id", "zrodlo_danych")}
+
+
+def test_json_rows_are_sized_like_calculate():
+    rows = [
+        {"id": "sklep-1", "energia_bierna": 12000, "tg_phi": 0.6},
+        {"id": "sklep-2", "energia_bierna": 250000, "okres_mc": 2, "tg_phi": 0.45, "ma_pv": True},
+    ]
+    response = client.post("/api/calculate-batch", json=rows)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    result = lines(response)
+    assert [(line["index"], line["id"], line["zrodlo_danych"]) for line in result] == [
+        (0, "sklep-1", "batch"), (1, "sklep-2", "batch")
+    ]
+    for row, line in zip(rows, result):
+        assert without_row_fields(line) == calculate(**{k: v for k, v in row.items() if k != "id"})
+        zestaw = line["rekomendacja"]["zestaw"]
+        assert sum(z["moc_kvar"] * z["ilosc"] for z in zestaw) >= line["obliczenia"]["moc_wymagana"]
+
+
+def test_invalid_rows_get_errors_without_stopping_the_batch():
+    body = "\n".join([
+        '{"id": 1, "energia_bierna": 500, "tg_phi": 0.5}',
+        '{"id": 2, "energia_bierna": 500, "tg_phi": 0.5, "okres_mc": 1.5}',
+        'to nie jest json',
+        '{"id": 4, "tg_phi": 0.5}',
+        '{"id": 5, "energia_bierna": -1, "tg_phi": 0.5}',
+        '{"id": 6, "energia_bierna": 700, "tg_phi": 0.5}',
+    ])
+    response = client.post("/api/calculate-batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == 200
+    result = lines(response)
+    assert [line["index"] for line in result] == list(range(6))
+    assert ["error" in line for line in result] == [False, True, True, True, True, False]
+    assert "okres_mc" in result[1]["error"]
+    assert result[3]["id"] == 4
+
+
+def test_csv_with_polish_decimal_comma():
+    body = "id;energia_bierna;okres_mc;tg_phi;ma_pv\nA;12000,5;1;0,6;tak\nB;800;2;0,4;nie\n"
+    response = client.post("/api/calculate-batch", content=body.encode(), headers={"Content-Type": "text/csv"})
+
+    result = lines(response)
+    assert [line["id"] for line in result] == ["A", "B"]
+    assert result[0]["dane"] == {"energia_bierna": 12000.5, "tg_phi": 0.6, "ma_pv": True, "okres_mc": 1}
+    assert without_row_fields(result[1]) == calculate(energia_bierna=800, okres_mc=2, tg_phi=0.4)
+
+
+def test_multipart_file_upload():
+    files = {"file": ("sklepy.ndjson", b'{"energia_bierna": 500, "tg_phi": 0.5}\n', "application/octet-stream")}
+    result = lines(client.post("/api/calculate-batch", files=files))
+
+    assert len(result) == 1 and "error" not in result[0]
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ('{"energia_bierna": 500}', "application/json"),
+    ("[1, 2", "application/json"),
+    (b"\xff\xfe\x00", "text/csv"),
+])
+def test_malformed_batch_is_400(body, content_type):
+    response = client.post("/api/calculate-batch", content=body, headers={"Content-Type": content_type})
+    assert response.status_code == 400
+
+
+def test_multipart_without_file_is_400():
+    assert client.post("/api/calculate-batch", data={"inne": "x"}).status_code == 400
@@ -0,0 +1,15 @@
+import pytest
+
+from app.services.batch_calculator import normalize_row
+
+
+@pytest.mark.parametrize("okres_mc", [1.5, 12.9, "2,5"])
+def test_fractional_period_is_a_row_error(okres_mc):
+    with pytest.raises(ValueError):
+        normalize_row({"energia_bierna": 500, "tg_phi": 0.5, "okres_mc": okres_mc})
+
+
+@pytest.mark.parametrize("okres_mc, expected", [(3, 3), (3.0, 3), ("12", 12), ("2,0", 2), (None, 1), ("", 1)])
+def test_whole_period_is_accepted(okres_mc, expected):
+    row = normalize_row({"energia_bierna": 500, "tg_phi": 0.5, "okres_mc": okres_mc})
+    assert row["okres_mc"] == expected
@@ -0,0 +1,99 @@
+import math
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import app
+
+CENNIK_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "generator-ofert", "cennik.json")
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def catalog_sources(monkeypatch):
+    """Podmienia pliki katalogu; po teście katalog wraca do stanu z konfiguracji"""
+    def use(*paths):
+        monkeypatch.setattr(main.compensator_catalog, "sources", [str(p) for p in paths])
+        return client.post("/api/compensators/reload").json()
+
+    yield use
+    monkeypatch.undo()
+    main.compensator_catalog.reload()
+
+
+def cheapest_price(items, kvar: int) -> int:
+    """Najniższa cena zestawu o mocy >= kvar - niezależnie od optymalizatora"""
+    best = [0] + [math.inf] * kvar
+    for t in range(1, kvar + 1):
+        best[t] = min(best[max(0, t - item["moc_kvar"])] + item["cena"] for item in items)
+    return best[kvar]
+
+
+def test_public_catalog_lists_sale_prices_only():
+    response = client.get("/api/compensators")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["producenci"] == ["LOPI"]
+    assert data["compensators"]
+    for item in data["compensators"]:
+        assert set(item) == {"model", "moc_kvar", "cena", "typ", "producent", "zrodlo"}
+        assert item["cena"] > 0 and isinstance(item["moc_kvar"], int)
+
+
+def test_catalog_filters():
+    everything = client.get("/api/compensators").json()["compensators"]
+    assert client.get("/api/compensators", params={"producent": "LOPI", "typ": "dynamiczny"}).json()["compensators"] == everything
+    assert client.get("/api/compensators", params={"producent": "ABB"}).json()["compensators"] == []
+
+
+def test_reload_adds_vendor_from_file(tmp_path, catalog_sources):
+    path = tmp_path / "abb.csv"
+    path.write_text("model;moc_kvar;cena;typ\nABB DynaCOMP 60;60;31000;dynamiczny\nABB Q 25;25;7000;klasyczny\n")
+    builtin = len(client.get("/api/compensators").json()["compensators"])
+
+    result = catalog_sources(path)
+
+    assert result["bledy"] == [] and result["pozycji"] == builtin + 2
+    data = client.get("/api/compensators", params={"producent": "ABB", "typ": "klasyczny"}).json()
+    assert "ABB" in data["producenci"] and data["wersja"] == result["wersja"]
+    assert [item["model"] for item in data["compensators"]] == ["ABB Q 25"]
+
+
+def test_reload_skips_invalid_files(tmp_path, catalog_sources):
+    fractional = tmp_path / "ulamkowe.csv"
+    fractional.write_text("model,moc_kvar,cena\nXYZ 7.5,7.5,5000\n")
+    builtin = len(client.get("/api/compensators").json()["compensators"])
+
+    result = catalog_sources(fractional, CENNIK_PATH, tmp_path / "brak.json")
+
+    assert len(result["bledy"]) == 3
+    assert "całkowite kvar" in result["bledy"][0] and "ceny zakupu" in result["bledy"][1]
+    assert result["pozycji"] == builtin
+    assert all("koszt_zakupu" not in item for item in client.get("/api/compensators").json()["compensators"])
+
+
+@pytest.mark.parametrize("energia_bierna, tg_phi", [(500, 0.5), (12000, 0.6), (90_000, 0.8), (400_000, 1.2)])
+def test_recommended_set_is_the_cheapest_cover(energia_bierna, tg_phi):
+    result = client.post("/api/calculate", json={"energia_bierna": energia_bierna, "tg_phi": tg_phi}).json()
+    rekomendacja = result["rekomendacja"]
+    zestaw = rekomendacja["zestaw"]
+    kvar = max(math.ceil(result["obliczenia"]["moc_wymagana"]), 1)
+
+    assert rekomendacja["moc_kvar"] == sum(z["moc_kvar"] * z["ilosc"] for z in zestaw) >= kvar
+    assert rekomendacja["cena_szacunkowa"] == sum(z["cena"] * z["ilosc"] for z in zestaw)
+    catalog = client.get("/api/compensators", params={"producent": "LOPI", "typ": "dynamiczny"}).json()["compensators"]
+    assert rekomendacja["cena_szacunkowa"] == cheapest_price(catalog, kvar)
+
+
+@pytest.mark.parametrize("body", [
+    {"energia_bierna": 500},
+    {"tg_phi": 0.5},
+    {"energia_bierna": "dużo", "tg_phi": 0.5},
+    {"energia_bierna": 500, "tg_phi": 0.5, "okres_mc": 1.5},
+])
+def test_invalid_calculation_request_is_422(body):
+    assert client.post("/api/calculate", json=body).status_code == 422
@@ -0,0 +1,39 @@
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.calculator import CompensatorCalculator
+
+client = TestClient(app)
+
+
+def test_cached_result_is_not_shared_with_callers():
+    optimizer = CompensatorCalculator().optimizer
+    first = optimizer.optimize(137)
+    expected = optimizer.optimize(137)
+
+    first["zestaw"][0]["ilosc"] = 999
+    first["zestaw"].clear()
+    first["cena"] = 0
+
+    assert optimizer.optimize(137) == expected
+
+
+@pytest.mark.parametrize("moc", [math.inf, -math.inf, math.nan])
+def test_non_finite_power_is_rejected(moc):
+    with pytest.raises(ValueError):
+        CompensatorCalculator().optimizer.optimize(moc)
+
+
+def test_calculate_rejects_non_finite_input():
+    body = '{"energia_bierna": NaN, "tg_phi": 0.5}'
+    response = client.post("/api/calculate", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+
+def test_calculate_reports_overflowing_power_as_bad_request():
+    response = client.post("/api/calculate", json={"energia_bierna": 1e308, "tg_phi": 0.5})
+    assert response.status_code == 400
+    assert "skończoną" in response.json()["detail"]
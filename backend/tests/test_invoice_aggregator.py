@@ -0,0 +1,50 @@
+import random
+
+from app.services.invoice_aggregator import InvoiceAggregator
+
+
+def test_sum_does_not_depend_on_order():
+    invoices = [{"energia_bierna_kwh": value, "okres_mc": 1} for value in (1e16, 1.0, -1e16, 0.1, 0.2)]
+    shuffled = invoices[:]
+    random.Random(1).shuffle(shuffled)
+
+    assert InvoiceAggregator(invoices).energia_bierna_kwh == InvoiceAggregator(shuffled).energia_bierna_kwh == 1.3
+
+
+def test_tg_phi_weighted_then_from_active_energy_then_default():
+    aggregator = InvoiceAggregator()
+    assert aggregator.tg_phi(default=0.5) == 0.5
+
+    aggregator.add({"energia_bierna_kwh": 300.0, "energia_czynna_kwh": 1000.0})
+    assert aggregator.tg_phi() == 0.3
+
+    aggregator.add({"energia_bierna_kwh": 100.0, "tg_phi": 0.8, "okres_mc": 2})
+    assert aggregator.tg_phi() == 0.2
+    assert (len(aggregator), aggregator.okres_mc, aggregator.energia_bierna_kwh) == (2, 3, 400.0)
+
+
+def test_add_remove_restores_totals_exactly():
+    base = [{"energia_bierna_kwh": 0.1, "tg_phi": 0.6, "okres_mc": 1}, {"energia_bierna_kwh": 0.2, "okres_mc": 2}]
+    aggregator = InvoiceAggregator(base)
+    before = (aggregator.energia_bierna_kwh, aggregator.okres_mc, aggregator.tg_phi())
+
+    key = aggregator.add({"energia_bierna_kwh": 1e16, "tg_phi": 1.3, "energia_czynna_kwh": 5.0, "okres_mc": 3})
+    assert aggregator.energia_bierna_kwh == 1e16
+    removed = aggregator.remove(key)
+
+    assert removed["tg_phi"] == 1.3
+    assert (aggregator.energia_bierna_kwh, aggregator.okres_mc, aggregator.tg_phi()) == before
+    assert len(aggregator) == 2
+
+
+def test_replace_matches_fresh_aggregator():
+    aggregator = InvoiceAggregator()
+    key = aggregator.add({"energia_bierna_kwh": 500.0, "tg_phi": 0.9})
+    aggregator.add({"energia_bierna_kwh": 300.0, "tg_phi": 0.5, "okres_mc": 2})
+    corrected = {"energia_bierna_kwh": 700.0, "tg_phi": 0.7}
+    aggregator.replace(key, corrected)
+
+    fresh = InvoiceAggregator([corrected, {"energia_bierna_kwh": 300.0, "tg_phi": 0.5, "okres_mc": 2}])
+    assert (aggregator.energia_bierna_kwh, aggregator.okres_mc, aggregator.tg_phi()) == \
+        (fresh.energia_bierna_kwh, fresh.okres_mc, fresh.tg_phi())
+    assert aggregator.invoices[0] is corrected
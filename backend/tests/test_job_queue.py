@@ -0,0 +1,57 @@
+import socket
+import threading
+
+import pytest
+
+from app.services import job_queue as jq
+from app.services.job_queue import JobQueue, JobQueueFullError, validate_webhook_url
+from app.services.upload_ingest import IngestedUpload
+
+
+def fake_resolver(address):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+    return getaddrinfo
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.0.0.5", "192.168.1.10", "169.254.169.254", "::1"])
+def test_webhook_to_internal_address_is_rejected(monkeypatch, address):
+    monkeypatch.setattr(jq.socket, "getaddrinfo", fake_resolver(address))
+    with pytest.raises(ValueError):
+        validate_webhook_url("http://hooks.example.com/done")
+
+
+def test_webhook_to_public_address_is_accepted(monkeypatch):
+    monkeypatch.setattr(jq.socket, "getaddrinfo", fake_resolver("93.184.216.34"))
+    validate_webhook_url("https://hooks.example.com/done")
+
+
+def test_webhook_allowlist_and_scheme(monkeypatch):
+    monkeypatch.setattr(jq.socket, "getaddrinfo", fake_resolver("93.184.216.34"))
+    with pytest.raises(ValueError):
+        validate_webhook_url("https://other.example.com/", ["hooks.example.com"])
+    with pytest.raises(ValueError):
+        validate_webhook_url("file:///etc/passwd")
+
+
+def test_pending_cap_holds_under_concurrent_submits(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), str(tmp_path / "jobs"), processor=None, max_pending=5)
+    accepted, rejected = [], []
+
+    def submit(i):
+        path = tmp_path / f"upload-{i}.pdf"
+        path.write_bytes(b"%PDF")
+        upload = IngestedUpload(str(path), f"{i}.pdf", "0" * 64, "application/pdf", 4)
+        try:
+            accepted.append(queue.submit([upload], ma_pv=False))
+        except JobQueueFullError:
+            rejected.append(i)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(accepted) == 5
+    assert len(rejected) == 15
@@ -0,0 +1,20 @@
+from app.services.ocr_cache import OCRCache
+
+
+def test_lookup_over_several_versions_counts_once(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite3"))
+    keys = [OCRCache.make_key("abc", version) for version in ("text-v1", "claude-v3", "openai-v2")]
+
+    assert cache.get_first(keys) is None
+    cache.set(keys[1], {"success": True, "backend": "claude"})
+    assert cache.get_first(keys) == {"success": True, "backend": "claude"}
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_first_key_wins(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite3"))
+    cache.set("b:abc", {"backend": "b"})
+    cache.set("a:abc", {"backend": "a"})
+    assert cache.get_first(["b:abc", "a:abc"]) == {"backend": "b"}
@@ -0,0 +1,25 @@
+import pytest
+
+from app.services.ocr_parsing import _to_number, normalize_invoice_result
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.234,56", 1234.56),
+    ("1 234,56", 1234.56),
+    ("1 234,56 kWh", 1234.56),
+    ("1.234.567,8 kvarh", 1234567.8),
+    ("612,5", 612.5),
+    ("612.5 kWh", 612.5),
+    ("-12,5", -12.5),
+    ("0.570", 0.57),
+    ("brak", None),
+])
+def test_to_number_polish_format(text, expected):
+    assert _to_number(text) == expected
+
+
+def test_normalize_reads_thousands_separator():
+    """"1.234,56" z odpowiedzi tekstowej to 1234.56 kvarh, nie 1.234"""
+    result = normalize_invoice_result({"energia_bierna_kwh": "1.234,56", "okres_mc": "2", "success": True})
+    assert result["success"]
+    assert result["energia_bierna_kwh"] == 1234.56
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from app.services.ocr_backends import OCRBackend
+from app.services.ocr_router import OCRRouter
+
+
+class SlowBackend(OCRBackend):
+    """Pełne zapytanie trwa slow_s, lekkie odpowiada od razu"""
+
+    name = "slow"
+    version = "slow:1"
+
+    def __init__(self, slow_s: float):
+        self.slow_s = slow_s
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def analyze_file(self, path, deadline=None, lite=False):
+        with self._lock:
+            self.calls.append(lite)
+        if not lite:
+            time.sleep(self.slow_s)
+        return {"success": True, "energia_bierna_kwh": 100.0}
+
+
+def make_router(backend, max_backend_calls):
+    return OCRRouter(
+        [backend], free_backends=[], invoice_deadline_s=5, lite_hedge_delay_s=0.05,
+        max_backend_calls=max_backend_calls
+    )
+
+
+def test_lite_hedge_wins_and_frees_caller():
+    backend = SlowBackend(0.5)
+    result = make_router(backend, 4).analyze_invoice("faktura.pdf")
+
+    assert result["success"] and result["hedge"] == "lite"
+    assert backend.calls == [False, True]
+
+
+def test_hedge_is_skipped_without_free_slot():
+    backend = SlowBackend(0.3)
+    router = make_router(backend, 1)
+    result = router.analyze_invoice("faktura.pdf")
+
+    assert result["success"] and "hedge" not in result
+    assert backend.calls == [False]
+    assert router.counters["slow"]["hedge_pominiety"] == 1
+
+
+def test_abandoned_call_is_not_sent():
+    backend = SlowBackend(0.0)
+    router = make_router(backend, 2)
+    abandoned = threading.Event()
+    abandoned.set()
+
+    result = router._call(backend, "faktura.pdf", abandoned=abandoned)
+
+    assert not result["success"]
+    assert backend.calls == []
+
+
+class PackBackend(OCRBackend):
+    """Zapytanie zbiorcze zawsze zawodzi, pojedyncze się udaje - zapisuje deadline'y"""
+
+    name = "pack"
+    version = "pack:1"
+    supports_packing = True
+
+    def __init__(self):
+        self.batch_deadlines = []
+        self.file_deadlines = []
+
+    def pack_estimate(self, path):
+        return 1, 100
+
+    def analyze_batch(self, paths, deadline=None):
+        self.batch_deadlines.append(deadline)
+        return [{"success": False, "error": "nieczytelna"} for _ in paths]
+
+    def analyze_file(self, path, deadline=None, lite=False):
+        self.file_deadlines.append(deadline)
+        return {"success": True, "energia_bierna_kwh": 100.0}
+
+
+def test_pack_waits_for_a_backend_slot():
+    backend = PackBackend()
+    router = make_router(backend, 1)
+    router._slots.acquire()
+    try:
+        results = router._call_pack(backend, ["a.pdf", "b.pdf"], time.monotonic() + 0.1)
+    finally:
+        router._slots.release()
+
+    assert [r["success"] for r in results] == [False, False]
+    assert backend.batch_deadlines == []
+
+
+def test_pack_retry_keeps_the_pack_deadline():
+    backend = PackBackend()
+    router = OCRRouter([backend], free_backends=[], invoice_deadline_s=5, pack_mode="always")
+
+    results = router.analyze_multiple_invoices(["a.pdf", "b.pdf"])
+
+    assert all(r["success"] for r in results)
+    assert len(backend.batch_deadlines) == 1
+    assert backend.file_deadlines == backend.batch_deadlines * 2
+    assert router.pack_counters["ponowione_osobno"] == 2
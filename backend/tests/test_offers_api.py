@@ -0,0 +1,94 @@
+import json
+import math
+import os
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+CENNIK_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "generator-ofert", "cennik.json")
+
+client = TestClient(app)
+
+
+def expected_brutto(units: int, metry_przewodu: int = 5) -> float:
+    """Cena brutto z cennika liczona niezależnie od generatora (model sinexcel_15kvar)"""
+    with open(CENNIK_PATH, encoding="utf-8") as f:
+        cennik = json.load(f)
+    mat = cennik["koszty_materialow"]
+    koszt = (
+        units * cennik["kompensatory"]["sinexcel_15kvar"]["koszt_zakupu"]
+        + mat["przekladnik_50_5A"]["koszt_jednostkowy"] * mat["przekladnik_50_5A"]["ilosc"]
+        + mat["zabezpieczenie_3f"]["koszt_jednostkowy"] * mat["zabezpieczenie_3f"]["ilosc"]
+        + mat["przewod_6x2_5_za_mb"]["koszt_jednostkowy"] * metry_przewodu
+        + units * cennik["koszty_pracy"]["montaz_i_konfiguracja"]["koszt"]
+    )
+    return round(round(koszt * (1 + cennik["marza_procent"] / 100)) * 1.23)
+
+
+def offer(**body):
+    return client.post("/api/offers", json={"klient": {"nazwa": "Test Sp. z o.o."}, **body})
+
+
+def offered(html: str):
+    """(liczba sztuk, cena brutto) z HTML oferty"""
+    model = re.search(r"Kompensator aktywny (?:(\d+)x )?Sinexcel", html)
+    brutto = re.search(r'cena-wartosc">([\d,]+) ', html)
+    return int(model.group(1) or 1), float(brutto.group(1).replace(",", ""))
+
+
+@pytest.mark.parametrize("energia_bierna, units", [(500, 1), (50_000, 7)])
+def test_raw_energy_is_sized_like_calculate(energia_bierna, units):
+    calculation = client.post("/api/calculate", json={"energia_bierna": energia_bierna, "tg_phi": 0.5}).json()
+    assert math.ceil(calculation["obliczenia"]["moc_wymagana"] / 15) == units
+
+    response = offer(energia_bierna=energia_bierna, okres_mc=1)
+
+    assert response.status_code == 200
+    assert offered(response.text) == (units, expected_brutto(units))
+    # Ten sam wynik co z gotowej analizy
+    assert offered(offer(analiza=calculation).text) == (units, expected_brutto(units))
+
+
+def test_tg_phi_and_pv_increase_the_offered_power():
+    base = offered(offer(energia_bierna=50_000, tg_phi=0.45).text)[0]
+    assert offered(offer(energia_bierna=50_000, tg_phi=0.45, ma_pv=True).text)[0] > base
+
+
+def test_oversized_installation_is_422():
+    response = offer(energia_bierna=5_000_000, okres_mc=1)
+    assert response.status_code == 422
+    assert "indywidualnej wyceny" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("body", [
+    {"energia_bierna": 0},
+    {"energia_bierna": -5},
+    {"energia_bierna": 500, "okres_mc": 0},
+    {"energia_bierna": 500, "tg_phi": -0.1},
+    {"energia_bierna": 500, "format": "docx"},
+])
+def test_invalid_offer_request_is_422(body):
+    assert offer(**body).status_code == 422
+
+
+def test_offer_without_energy_or_analysis_is_400():
+    assert offer().status_code == 400
+
+
+def test_cli_generator_quotes_the_same_as_the_api():
+    from datetime import datetime
+
+    from app.main import offer_engine
+
+    generator = offer_engine._generator
+    cennik = generator.load_cennik()
+    for energia_bierna, tg_phi, ma_pv in [(500, 0.5, False), (50_000, 0.45, True), (20_000, 0.8, False)]:
+        cli = generator.przygotuj_dane_oferty(
+            cennik, {"nazwa": "Test"}, energia_bierna, 1, 5, "OF/TEST", datetime(2026, 1, 1), tg_phi, ma_pv
+        )
+        api = offer(energia_bierna=energia_bierna, tg_phi=tg_phi, ma_pv=ma_pv)
+        units = int(cli["kompensator"]["model"].split("x ")[0]) if "x " in cli["kompensator"]["model"] else 1
+        assert offered(api.text) == (units, cli["cena"]["brutto"])
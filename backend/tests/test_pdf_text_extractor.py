@@ -0,0 +1,31 @@
+from app.services.pdf_text_extractor import extract_invoice_from_text
+
+OKRES = "Okres rozliczeniowy: 2025-01-01 - 2025-02-28\n"
+
+
+def test_reads_reactive_energy_after_label():
+    text = "Tauron Sprzedaż\n" + OKRES + "Energia bierna indukcyjna kvarh 1 234,5\n"
+    result = extract_invoice_from_text([text])
+    assert result["energia_bierna_kwh"] == 1234.5
+    assert result["okres_mc"] == 2
+
+
+def test_number_before_unit():
+    text = "PGE Obrót\n" + OKRES + "Energia bierna indukcyjna 612 kvarh\n"
+    assert extract_invoice_from_text([text])["energia_bierna_kwh"] == 612
+
+
+def test_tg_threshold_is_not_the_quantity():
+    """"ponad tg 0,4 kvarh 350" - 0,4 to próg; bez pewnej ilości faktura idzie do Vision"""
+    text = "Enea\n" + OKRES + "Energia bierna indukcyjna ponad tg 0,4 kvarh 350\n"
+    assert extract_invoice_from_text([text]) is None
+
+
+def test_active_energy_kwh_is_not_reactive():
+    text = "PGE Obrót\n" + OKRES + "Energia bierna indukcyjna\nEnergia czynna 15 000 kWh\n"
+    assert extract_invoice_from_text([text]) is None
+
+
+def test_implausible_ratio_falls_back_to_vision():
+    text = "PGE Obrót\n" + OKRES + "Energia bierna indukcyjna 50 000 kvarh\nEnergia czynna 1 000 kWh\n"
+    assert extract_invoice_from_text([text]) is None
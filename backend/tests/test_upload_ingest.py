@@ -0,0 +1,34 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.services.upload_ingest import RequestSizeLimitMiddleware
+
+
+def make_client(max_bytes: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware, max_bytes=max_bytes)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_rejects_by_content_length():
+    response = make_client(1000).post("/echo", content=b"x" * 1001)
+    assert response.status_code == 413
+
+
+def test_rejects_chunked_body_while_receiving():
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 500
+
+    response = make_client(1000).post("/echo", content=chunks())
+    assert response.status_code == 413
+
+
+def test_passes_body_within_limit():
+    response = make_client(1000).post("/echo", content=b"x" * 1000)
+    assert response.json() == {"size": 1000}
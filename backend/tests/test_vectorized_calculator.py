@@ -0,0 +1,36 @@
+import json
+import random
+
+from app.services.calculator import CompensatorCalculator
+from app.services.vectorized_calculator import VectorizedCalculator
+
+
+def random_rows(count: int, seed: int):
+    """Losowy korpus z wartościami brzegowymi (zero, progi tgφ, pełne kvarh)"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        energia = rng.choice([
+            0.0,
+            float(rng.randint(1, 500000)),
+            rng.uniform(0, 2000),
+            rng.uniform(0, 1e7),
+            10 ** rng.uniform(-3, 9)
+        ])
+        tg_phi = rng.choice([0.0, 0.4, 0.5, 0.6, 0.8, 1.0, round(rng.uniform(0, 3), 3), rng.uniform(0, 10)])
+        rows.append((energia, rng.randint(1, 12), tg_phi, rng.random() < 0.3))
+    return rows
+
+
+def test_vectorized_matches_scalar_bit_for_bit():
+    calculator = CompensatorCalculator()
+    vectorized = VectorizedCalculator(catalog=calculator.catalog, optimizer=calculator.optimizer)
+    rows = random_rows(2000, seed=8)
+
+    results = vectorized.calculate_rows(*(list(column) for column in zip(*rows)))
+
+    assert len(results) == len(rows)
+    for row, result in zip(rows, results):
+        expected = calculator._calculate_raw(*row)
+        # json - żeby wyłapać też 0.0 vs -0.0 i int vs float
+        assert json.dumps(result, sort_keys=True) == json.dumps(expected, sort_keys=True), row
@@ -4,11 +4,21 @@ Generator Ofert na Kompensatory Mocy Biernej
 Sundek Energia 2025
 
 Uzycie:
-    python generator.py
+    python generator.py                      # interaktywnie, jedna oferta
+    python generator.py --batch leady.csv    # wsadowo z CSV/NDJSON
 """
 
+import argparse
+import csv
+import hashlib
 import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from html import escape
 from pathlib import Path
 
 # Sciezka do plikow
@@ -16,6 +26,34 @@ BASE_DIR = Path(__file__).parent
 CENNIK_PATH = BASE_DIR / "cennik.json"
 OUTPUT_DIR = BASE_DIR / "oferty"
 
+# Kolumny pliku wsadowego (CSV z naglowkiem albo NDJSON z tymi kluczami)
+KOLUMNY_WSADU = (
+    "nazwa", "adres", "nip", "telefon", "energia_bierna_kwh", "okres_mc", "tg_phi", "ma_pv", "metry_przewodu"
+)
+
+# Ile wierszy wysylamy do procesu naraz (mniej narzutu na przesylanie)
+WSAD_CHUNK = 64
+
+# Stawka kary, domyslny tg phi i wymagana moc - z kalkulatora backendu
+# (backend/app/services/calculator.py), zeby CLI i API liczyly tak samo
+BACKEND_DIR = BASE_DIR.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+from app.services.calculator import STAWKA_KARY_KVARH, TG_PHI_DOMYSLNY, oblicz_moc_wymagana  # noqa: E402
+
+# ROI, gdy nie ma oszczednosci (jak w kalkulatorze backendu)
+ROI_BRAK_OSZCZEDNOSCI = 999
+
+# Najwiecej sztuk jednego modelu na ofercie - wieksze instalacje wyceniamy indywidualnie
+MAKS_SZTUK = 10
+
+# Wartosci uznawane za "tak" (PV w pliku wsadowym i w trybie interaktywnym)
+TAK = {"1", "true", "t", "tak", "yes", "y"}
+
+
+class ZaDuzaMocError(ValueError):
+    """Wymagana moc przekracza MAKS_SZTUK sztuk najwiekszego modelu z cennika"""
+
 
 def load_cennik():
     """Wczytaj cennik z pliku JSON"""
@@ -23,16 +61,59 @@ def load_cennik():
         return json.load(f)
 
 
-def oblicz_koszty(cennik: dict, metry_przewodu: int = 5) -> dict:
+def dobierz_kompensator(cennik: dict, moc_kvar: float) -> tuple:
+    """
+    Model z cennika i liczba sztuk pokrywajace moc_kvar - najtansza taka para
+
+    Wspolne dla CLI, trybu wsadowego i API - ten sam lead dostaje ten sam produkt.
+    Montaz liczony jest od sztuki (oblicz_koszty), wiec wchodzi w porownanie.
+
+    Returns:
+        (klucz modelu w cennik['kompensatory'], liczba sztuk)
+
+    Raises:
+        ZaDuzaMocError: nawet MAKS_SZTUK sztuk najwiekszego modelu nie wystarcza
+    """
+    montaz = float(cennik['koszty_pracy']['montaz_i_konfiguracja']['koszt'])
+    modele = sorted(
+        (float(komp['moc_kvar']), float(komp['koszt_zakupu']), klucz)
+        for klucz, komp in cennik['kompensatory'].items()
+    )
+    opcje = []
+    for moc, koszt, klucz in modele:
+        ilosc = max(1, math.ceil(moc_kvar / moc))
+        if ilosc <= MAKS_SZTUK:
+            opcje.append((ilosc * (koszt + montaz), ilosc * moc, ilosc, klucz))
+    if not opcje:
+        raise ZaDuzaMocError(
+            f"Wymagana moc {moc_kvar:.1f} kvar przekracza {MAKS_SZTUK} x {modele[-1][0]:g} kvar "
+            f"z cennika - taka instalacja wymaga indywidualnej wyceny"
+        )
+    _, _, ilosc, klucz = min(opcje)
+    return klucz, ilosc
+
+
+def oblicz_koszty(cennik: dict, metry_przewodu: int, kompensator: str, ilosc: int = 1) -> dict:
     """
     Oblicz calkowite koszty instalacji kompensatora.
 
+    Args:
+        kompensator: Klucz modelu w cennik['kompensatory']
+        ilosc: Liczba sztuk (gdy jeden kompensator nie pokrywa wymaganej mocy)
+
     Returns:
         Slownik z kosztami i cena dla klienta
     """
     mat = cennik['koszty_materialow']
     praca = cennik['koszty_pracy']
-    komp = cennik['kompensatory']['sinexcel_15kvar']  # Na razie tylko ten model
+    komp = cennik['kompensatory'][kompensator]
+    if ilosc > 1:
+        komp = {
+            **komp,
+            "model": f"{ilosc}x {komp['model']}",
+            "moc_kvar": komp['moc_kvar'] * ilosc,
+            "koszt_zakupu": komp['koszt_zakupu'] * ilosc
+        }
 
     # Koszty materialow
     koszt_przekladnikow = mat['przekladnik_50_5A']['koszt_jednostkowy'] * mat['przekladnik_50_5A']['ilosc']
@@ -42,7 +123,7 @@ def oblicz_koszty(cennik: dict, metry_przewodu: int = 5) -> dict:
     # Suma kosztow
     koszt_kompensatora = komp['koszt_zakupu']
     koszt_materialow = koszt_przekladnikow + koszt_zabezpieczenia + koszt_przewodu
-    koszt_pracy = praca['montaz_i_konfiguracja']['koszt']
+    koszt_pracy = praca['montaz_i_konfiguracja']['koszt'] * ilosc  # montaz i konfiguracja kazdej sztuki
 
     koszt_calkowity = koszt_kompensatora + koszt_materialow + koszt_pracy
 
@@ -67,10 +148,8 @@ def oblicz_koszty(cennik: dict, metry_przewodu: int = 5) -> dict:
     }
 
 
-def oblicz_oszczednosci(energia_bierna_kwh: float, okres_mc: int) -> dict:
+def oblicz_oszczednosci(energia_bierna_kwh: float, okres_mc: int, stawka_kary: float = STAWKA_KARY_KVARH) -> dict:
     """Oblicz szacunkowe oszczednosci po instalacji kompensatora."""
-    stawka_kary = 0.30  # PLN/kvarh - srednia
-
     kary_w_okresie = energia_bierna_kwh * stawka_kary
     kary_miesieczne = kary_w_okresie / okres_mc
     kary_roczne = kary_miesieczne * 12
@@ -85,169 +164,193 @@ def oblicz_oszczednosci(energia_bierna_kwh: float, okres_mc: int) -> dict:
 def oblicz_roi(cena_brutto: float, oszczednosc_roczna: float) -> float:
     """Oblicz zwrot z inwestycji w latach"""
     if oszczednosc_roczna <= 0:
-        return 99
+        return ROI_BRAK_OSZCZEDNOSCI
     return round(cena_brutto / oszczednosc_roczna, 1)
 
 
-def generuj_numer_oferty() -> str:
-    """Generuj unikalny numer oferty"""
-    now = datetime.now()
-    return f"OF/{now.year}/{now.month:02d}/{now.strftime('%d%H%M%S')}"
+def generuj_numer_oferty(data: datetime = None, partia: str = None, nr: int = None) -> str:
+    """
+    Generuj unikalny numer oferty
 
+    Bez partii: numer z data i godzina (tryb interaktywny, jedna oferta).
+    Z partia: OF/RRRR/MM/DD-<partia>-<nr> - deterministyczny (ta sama
+    partia i wiersz = ten sam numer) i bez kolizji w obrebie partii,
+    niezaleznie od tego, ile ofert powstaje w tej samej sekundzie.
+    """
+    now = data or datetime.now()
+    if partia is None:
+        return f"OF/{now.year}/{now.month:02d}/{now.strftime('%d%H%M%S')}"
+    return f"OF/{now.year}/{now.month:02d}/{now.day:02d}-{partia}-{nr:05d}"
 
-def generuj_oferte_html(dane: dict) -> str:
-    """Generuj oferte w formacie HTML - TYLKO SUMA, bez rozbicia cen"""
 
-    html = f"""<!DOCTYPE html>
-<html lang="pl">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Oferta {dane['numer_oferty']} - Kompensator mocy biernej</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
+# Statyczny CSS oferty - osadzany w <style> albo podawany osobno do PDF (generator_pdf)
+OFERTA_CSS = """        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
             font-family: 'Segoe UI', Arial, sans-serif;
             line-height: 1.6;
             color: #333;
             background: #f5f5f5;
             padding: 20px;
-        }}
-        .oferta {{
+        }
+        .oferta {
             max-width: 800px;
             margin: 0 auto;
             background: white;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }}
-        .header {{
+        }
+        .header {
             background: linear-gradient(135deg, #2563eb, #7c3aed);
             color: white;
             padding: 30px;
-        }}
-        .header h1 {{ font-size: 24px; margin-bottom: 5px; }}
-        .header .subtitle {{ opacity: 0.9; font-size: 14px; }}
-        .meta {{
+        }
+        .header h1 { font-size: 24px; margin-bottom: 5px; }
+        .header .subtitle { opacity: 0.9; font-size: 14px; }
+        .meta {
             display: flex;
             justify-content: space-between;
             padding: 20px 30px;
             background: #f8fafc;
             border-bottom: 1px solid #e2e8f0;
-        }}
-        .meta-item {{ text-align: center; }}
-        .meta-label {{ font-size: 12px; color: #64748b; text-transform: uppercase; }}
-        .meta-value {{ font-size: 16px; font-weight: 600; color: #1e293b; }}
-        .section {{
+        }
+        .meta-item { text-align: center; }
+        .meta-label { font-size: 12px; color: #64748b; text-transform: uppercase; }
+        .meta-value { font-size: 16px; font-weight: 600; color: #1e293b; }
+        .section {
             padding: 25px 30px;
             border-bottom: 1px solid #e2e8f0;
-        }}
-        .section:last-child {{ border-bottom: none; }}
-        .section-title {{
+        }
+        .section:last-child { border-bottom: none; }
+        .section-title {
             font-size: 16px;
             font-weight: 600;
             color: #374151;
             margin-bottom: 15px;
-        }}
-        .klient-info {{
+        }
+        .klient-info {
             background: #f1f5f9;
             padding: 15px;
             border-radius: 8px;
-        }}
-        .klient-info p {{ margin: 5px 0; }}
+        }
+        .klient-info p { margin: 5px 0; }
 
-        .cena-box {{
+        .cena-box {
             background: linear-gradient(135deg, #059669, #10b981);
             color: white;
             padding: 30px;
             border-radius: 12px;
             text-align: center;
-        }}
-        .cena-tytul {{ font-size: 18px; margin-bottom: 10px; opacity: 0.9; }}
-        .cena-wartosc {{ font-size: 48px; font-weight: 700; }}
-        .cena-wartosc small {{ font-size: 20px; opacity: 0.8; }}
-        .cena-netto {{ font-size: 14px; margin-top: 10px; opacity: 0.8; }}
+        }
+        .cena-tytul { font-size: 18px; margin-bottom: 10px; opacity: 0.9; }
+        .cena-wartosc { font-size: 48px; font-weight: 700; }
+        .cena-wartosc small { font-size: 20px; opacity: 0.8; }
+        .cena-netto { font-size: 14px; margin-top: 10px; opacity: 0.8; }
 
-        .zakres {{
+        .zakres {
             background: #f8fafc;
             padding: 20px;
             border-radius: 8px;
             margin-top: 20px;
-        }}
-        .zakres h4 {{ margin-bottom: 10px; color: #374151; }}
-        .zakres ul {{ margin-left: 20px; }}
-        .zakres li {{ margin: 8px 0; color: #4b5563; }}
+        }
+        .zakres h4 { margin-bottom: 10px; color: #374151; }
+        .zakres ul { margin-left: 20px; }
+        .zakres li { margin: 8px 0; color: #4b5563; }
 
-        .grid {{ display: grid; grid-template-columns: repeat(2, 1fr); gap: 15px; }}
-        .stat-box {{
+        .grid { display: grid; grid-template-columns: repeat(2, 1fr); gap: 15px; }
+        .stat-box {
             background: #f8fafc;
             padding: 15px;
             border-radius: 8px;
             text-align: center;
-        }}
-        .stat-value {{ font-size: 24px; font-weight: 700; color: #2563eb; }}
-        .stat-label {{ font-size: 12px; color: #64748b; margin-top: 5px; }}
-        .oszczednosci {{ background: #ecfdf5; border: 1px solid #6ee7b7; }}
-        .oszczednosci .stat-value {{ color: #059669; }}
+        }
+        .stat-value { font-size: 24px; font-weight: 700; color: #2563eb; }
+        .stat-label { font-size: 12px; color: #64748b; margin-top: 5px; }
+        .oszczednosci { background: #ecfdf5; border: 1px solid #6ee7b7; }
+        .oszczednosci .stat-value { color: #059669; }
 
-        .roi-highlight {{
+        .roi-highlight {
             background: #fef3c7;
             border: 2px solid #f59e0b;
             padding: 20px;
             border-radius: 8px;
             text-align: center;
             margin-top: 20px;
-        }}
-        .roi-value {{ font-size: 32px; font-weight: 700; color: #d97706; }}
+        }
+        .roi-value { font-size: 32px; font-weight: 700; color: #d97706; }
 
-        .valid-info {{
+        .valid-info {
             background: #fef9c3;
             padding: 12px;
             border-radius: 6px;
             text-align: center;
             font-size: 14px;
             color: #854d0e;
-        }}
-        .footer {{
+        }
+        .footer {
             background: #1e293b;
             color: white;
             padding: 25px 30px;
             text-align: center;
-        }}
-        .footer a {{ color: #60a5fa; text-decoration: none; }}
-        @media print {{
-            body {{ background: white; padding: 0; }}
-            .oferta {{ box-shadow: none; }}
-        }}
-    </style>
+        }
+        .footer a { color: #60a5fa; text-decoration: none; }
+        @media print {
+            body { background: white; padding: 0; }
+            .oferta { box-shadow: none; }
+        }
+"""
+
+def generuj_oferte_html(dane: dict, escapuj: bool = True, css: bool = True) -> str:
+    """
+    Generuj oferte w formacie HTML - TYLKO SUMA, bez rozbicia cen
+
+    Args:
+        dane: Dane oferty (przygotuj_dane_oferty)
+        escapuj: Escapowanie pol tekstowych (nazwa klienta, adres...) - domyslnie wlaczone
+        css: Czy osadzic OFERTA_CSS w <style> (False = arkusz podawany osobno, np. do PDF)
+    """
+    t = (lambda wartosc: escape(str(wartosc))) if escapuj else str
+    klient = dane['klient']
+    style = OFERTA_CSS if css else ""
+    nip_html = f"<p>NIP: {t(klient['nip'])}</p>" if klient.get('nip') else ""
+    telefon_html = f"<p>Tel: {t(klient['telefon'])}</p>" if klient.get('telefon') else ""
+
+    return f"""<!DOCTYPE html>
+<html lang="pl">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Oferta {t(dane['numer_oferty'])} - Kompensator mocy biernej</title>
+    <style>
+{style}    </style>
 </head>
 <body>
     <div class="oferta">
         <div class="header">
             <h1>OFERTA - KOMPENSACJA MOCY BIERNEJ</h1>
-            <p class="subtitle">{dane['firma']['nazwa']} | {dane['numer_oferty']}</p>
+            <p class="subtitle">{t(dane['firma']['nazwa'])} | {t(dane['numer_oferty'])}</p>
         </div>
 
         <div class="meta">
             <div class="meta-item">
                 <div class="meta-label">Numer oferty</div>
-                <div class="meta-value">{dane['numer_oferty']}</div>
+                <div class="meta-value">{t(dane['numer_oferty'])}</div>
             </div>
             <div class="meta-item">
                 <div class="meta-label">Data wystawienia</div>
-                <div class="meta-value">{dane['data_wystawienia']}</div>
+                <div class="meta-value">{t(dane['data_wystawienia'])}</div>
             </div>
             <div class="meta-item">
                 <div class="meta-label">Wazna do</div>
-                <div class="meta-value">{dane['data_waznosci']}</div>
+                <div class="meta-value">{t(dane['data_waznosci'])}</div>
             </div>
         </div>
 
         <div class="section">
             <div class="section-title">DANE KLIENTA</div>
             <div class="klient-info">
-                <p><strong>{dane['klient']['nazwa']}</strong></p>
-                <p>{dane['klient']['adres']}</p>
-                {f"<p>NIP: {dane['klient']['nip']}</p>" if dane['klient'].get('nip') else ""}
-                {f"<p>Tel: {dane['klient']['telefon']}</p>" if dane['klient'].get('telefon') else ""}
+                <p><strong>{t(dane['klient']['nazwa'])}</strong></p>
+                <p>{t(dane['klient']['adres'])}</p>
+                {nip_html}
+                {telefon_html}
             </div>
         </div>
 
@@ -255,7 +358,7 @@ def generuj_oferte_html(dane: dict) -> str:
             <div class="section-title">OFERTA CENOWA</div>
 
             <div class="cena-box">
-                <div class="cena-tytul">Kompensator mocy biernej {dane['kompensator']['moc_kvar']} kvar<br>z montazem i uruchomieniem</div>
+                <div class="cena-tytul">Kompensator mocy biernej {t(dane['kompensator']['moc_kvar'])} kvar<br>z montazem i uruchomieniem</div>
                 <div class="cena-wartosc">{dane['cena']['brutto']:,.0f} <small>PLN brutto</small></div>
                 <div class="cena-netto">({dane['cena']['netto']:,.0f} PLN netto + 23% VAT)</div>
             </div>
@@ -263,7 +366,7 @@ def generuj_oferte_html(dane: dict) -> str:
             <div class="zakres">
                 <h4>Zakres uslugi obejmuje:</h4>
                 <ul>
-                    <li>Kompensator aktywny {dane['kompensator']['model']}</li>
+                    <li>Kompensator aktywny {t(dane['kompensator']['model'])}</li>
                     <li>Przekladniki pradowe (3 szt.)</li>
                     <li>Zabezpieczenie 3-fazowe</li>
                     <li>Przewody i okablowanie</li>
@@ -278,11 +381,11 @@ def generuj_oferte_html(dane: dict) -> str:
             <div class="section-title">DANE Z FAKTURY KLIENTA</div>
             <div class="grid">
                 <div class="stat-box">
-                    <div class="stat-value">{dane['analiza']['energia_bierna']} kWh</div>
+                    <div class="stat-value">{t(dane['analiza']['energia_bierna'])} kWh</div>
                     <div class="stat-label">Energia bierna z faktury</div>
                 </div>
                 <div class="stat-box">
-                    <div class="stat-value">{dane['analiza']['okres_mc']} mc</div>
+                    <div class="stat-value">{t(dane['analiza']['okres_mc'])} mc</div>
                     <div class="stat-label">Okres rozliczeniowy</div>
                 </div>
             </div>
@@ -302,7 +405,7 @@ def generuj_oferte_html(dane: dict) -> str:
             </div>
             <div class="roi-highlight">
                 <div>Szacowany zwrot inwestycji</div>
-                <div class="roi-value">{dane['roi']} lat</div>
+                <div class="roi-value">{t(dane['roi'])} lat</div>
                 <div style="font-size: 14px; margin-top: 5px; opacity: 0.8;">
                     Oszczednosc w ciagu 5 lat: <strong>~{dane['oszczednosci']['oszczednosc_5_lat']:,.0f} PLN</strong>
                 </div>
@@ -311,32 +414,31 @@ def generuj_oferte_html(dane: dict) -> str:
 
         <div class="section">
             <div class="valid-info">
-                Oferta wazna do: <strong>{dane['data_waznosci']}</strong>
+                Oferta wazna do: <strong>{t(dane['data_waznosci'])}</strong>
             </div>
         </div>
 
         <div class="footer">
-            <p><strong>{dane['firma']['nazwa']}</strong></p>
-            <p>{dane['firma']['adres']}</p>
-            <p>Tel: {dane['firma']['telefon']} | Email: <a href="mailto:{dane['firma']['email']}">{dane['firma']['email']}</a></p>
-            <p><a href="{dane['firma']['www']}">{dane['firma']['www']}</a></p>
+            <p><strong>{t(dane['firma']['nazwa'])}</strong></p>
+            <p>{t(dane['firma']['adres'])}</p>
+            <p>Tel: {t(dane['firma']['telefon'])} | Email: <a href="mailto:{t(dane['firma']['email'])}">{t(dane['firma']['email'])}</a></p>
+            <p><a href="{t(dane['firma']['www'])}">{t(dane['firma']['www'])}</a></p>
         </div>
     </div>
 </body>
 </html>"""
 
-    return html
 
-
-def zapisz_oferte(html: str, numer_oferty: str, nazwa_klienta: str) -> Path:
+def zapisz_oferte(html: str, numer_oferty: str, nazwa_klienta: str, output_dir: Path = None) -> Path:
     """Zapisz oferte do pliku"""
-    OUTPUT_DIR.mkdir(exist_ok=True)
+    output_dir = Path(output_dir or OUTPUT_DIR)
+    output_dir.mkdir(exist_ok=True)
 
     safe_nazwa = "".join(c if c.isalnum() or c in ' -_' else '' for c in nazwa_klienta)
     safe_numer = numer_oferty.replace('/', '-')
 
     filename = f"oferta_{safe_numer}_{safe_nazwa}.html"
-    filepath = OUTPUT_DIR / filename
+    filepath = output_dir / filename
 
     with open(filepath, 'w', encoding='utf-8') as f:
         f.write(html)
@@ -344,6 +446,248 @@ def zapisz_oferte(html: str, numer_oferty: str, nazwa_klienta: str) -> Path:
     return filepath
 
 
+def przygotuj_dane_oferty(
+    cennik: dict,
+    klient: dict,
+    energia_bierna: float,
+    okres_mc: int,
+    metry_przewodu: int,
+    numer_oferty: str,
+    data: datetime,
+    tg_phi: float = TG_PHI_DOMYSLNY,
+    ma_pv: bool = False,
+    moc_kvar: float = None,
+    stawka_kary: float = STAWKA_KARY_KVARH
+) -> dict:
+    """
+    Dobierz kompensator, policz koszty, oszczednosci i ROI i zloz dane do szablonu oferty
+
+    Wspolne dla CLI i endpointu ofert w backendzie (ten sam wynik dla tych samych danych).
+    Wymagana moc liczona jest kalkulatorem backendu (oblicz_moc_wymagana z tg phi
+    i PV), chyba ze podano gotowa moc_kvar (np. z wyniku analizy faktur).
+
+    Returns:
+        Slownik dla generuj_oferte_html (plus 'koszty' - tylko do wgladu)
+
+    Raises:
+        ZaDuzaMocError: wymagana moc za duza na oferte z cennika
+    """
+    if moc_kvar is None:
+        moc_kvar = oblicz_moc_wymagana(energia_bierna, okres_mc, tg_phi, ma_pv)["moc_wymagana"]
+    kompensator, ilosc = dobierz_kompensator(cennik, moc_kvar)
+    koszty = oblicz_koszty(cennik, metry_przewodu, kompensator, ilosc)
+    oszczednosci = oblicz_oszczednosci(energia_bierna, okres_mc, stawka_kary)
+    roi = oblicz_roi(koszty['cena_klient']['brutto'], oszczednosci['kary_roczne'])
+
+    return {
+        "numer_oferty": numer_oferty,
+        "data_wystawienia": data.strftime("%Y-%m-%d"),
+        "data_waznosci": (data + timedelta(days=30)).strftime("%Y-%m-%d"),
+        "klient": klient,
+        "analiza": {
+            "energia_bierna": energia_bierna,
+            "okres_mc": okres_mc
+        },
+        "kompensator": koszty['kompensator'],
+        "cena": koszty['cena_klient'],
+        "oszczednosci": oszczednosci,
+        "roi": roi,
+        "firma": cennik['firma'],
+        "koszty": koszty
+    }
+
+
+def wczytaj_wsad(path: Path) -> list:
+    """
+    Wczytaj klientow z pliku CSV (naglowek = KOLUMNY_WSADU) albo NDJSON
+
+    Returns:
+        Lista slownikow (wiersze w kolejnosci pliku)
+    """
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.suffix.lower() in ('.ndjson', '.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        sample = f.read(4096)
+        f.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        return list(csv.DictReader(f, dialect=dialect))
+
+
+def parsuj_wiersz(wiersz: dict) -> dict:
+    """
+    Dane klienta i faktury z wiersza wsadu (te same zasady co w trybie interaktywnym)
+
+    Raises:
+        ValueError: brak nazwy klienta albo niepoprawna energia bierna
+    """
+    def tekst(klucz):
+        return str(wiersz.get(klucz) or '').strip()
+
+    nazwa = tekst('nazwa')
+    if not nazwa:
+        raise ValueError("brak nazwy klienta")
+    try:
+        energia_bierna = float(tekst('energia_bierna_kwh').replace(',', '.'))
+    except ValueError:
+        raise ValueError(f"niepoprawna energia bierna: {wiersz.get('energia_bierna_kwh')!r}")
+
+    try:
+        okres_mc = max(1, min(4, int(tekst('okres_mc') or 1)))
+    except ValueError:
+        okres_mc = 2
+    try:
+        metry_przewodu = int(tekst('metry_przewodu') or 5)
+    except ValueError:
+        metry_przewodu = 5
+    try:
+        tg_phi = float(tekst('tg_phi').replace(',', '.') or TG_PHI_DOMYSLNY)
+    except ValueError:
+        raise ValueError(f"niepoprawny tg phi: {wiersz.get('tg_phi')!r}")
+
+    return {
+        "klient": {
+            "nazwa": nazwa,
+            "adres": tekst('adres'),
+            "nip": tekst('nip'),
+            "telefon": tekst('telefon')
+        },
+        "energia_bierna": energia_bierna,
+        "okres_mc": okres_mc,
+        "metry_przewodu": metry_przewodu,
+        "tg_phi": tg_phi,
+        "ma_pv": tekst('ma_pv').lower() in TAK
+    }
+
+
+_cennik_procesu = None
+_pdf_procesu = False
+
+
+def _init_procesu(cennik: dict, pdf: bool = False) -> None:
+    """Cennik (i rozgrzany renderer PDF) raz na proces puli, nie przy kazdym wierszu"""
+    global _cennik_procesu, _pdf_procesu
+    _cennik_procesu = cennik
+    _pdf_procesu = pdf
+    if pdf:
+        from generator_pdf import init_workera_pdf
+        init_workera_pdf(OFERTA_CSS)
+
+
+def _generuj_z_wiersza(zadanie: tuple) -> tuple:
+    """
+    Oferta dla jednego wiersza wsadu (uruchamiane w procesie puli)
+
+    Returns:
+        (nr wiersza, numer oferty albo None, plik albo komunikat bledu, cena brutto, ROI)
+    """
+    nr, wiersz, partia, data, output_dir = zadanie
+    numer_oferty = generuj_numer_oferty(data, partia, nr)
+    try:
+        pola = parsuj_wiersz(wiersz)
+        dane = przygotuj_dane_oferty(
+            _cennik_procesu, pola['klient'], pola['energia_bierna'], pola['okres_mc'],
+            pola['metry_przewodu'], numer_oferty, data, pola['tg_phi'], pola['ma_pv']
+        )
+    except ValueError as e:
+        return nr, None, str(e), None, None
+
+    filepath = zapisz_oferte(generuj_oferte_html(dane), numer_oferty, pola['klient']['nazwa'], output_dir)
+    if _pdf_procesu:
+        # PDF prosto z HTML w pamieci - bez ponownego czytania pliku i parsowania CSS
+        from generator_pdf import renderuj_pdf
+        renderuj_pdf(generuj_oferte_html(dane, css=False), filepath.with_suffix('.pdf'))
+    return nr, numer_oferty, str(filepath), dane['cena']['brutto'], dane['roi']
+
+
+def generuj_wsadowo(
+    wsad_path: Path,
+    output_dir: Path = None,
+    workers: int = None,
+    data: datetime = None,
+    pdf: bool = False
+) -> dict:
+    """
+    Generuj oferty dla wszystkich klientow z pliku CSV/NDJSON
+
+    Oferty renderowane sa rownolegle w puli procesow (z pdf=True kazdy
+    proces ma tez rozgrzany renderer WeasyPrint i zapisuje PDF obok
+    HTML). Numer partii to
+    skrot zawartosci pliku - ponowne uruchomienie na tym samym pliku
+    (i z ta sama data) daje te same numery i nazwy plikow. Wiersze
+    z bledami sa pomijane i wypisane w podsumowaniu.
+
+    Args:
+        wsad_path: Plik CSV/NDJSON z kolumnami KOLUMNY_WSADU
+        output_dir: Folder na oferty (domyslnie OUTPUT_DIR)
+        workers: Liczba procesow (domyslnie liczba rdzeni, 1 = bez puli)
+        data: Data wystawienia (domyslnie dzisiaj)
+        pdf: Czy od razu renderowac PDF (wymaga WeasyPrint)
+
+    Returns:
+        Slownik z liczba ofert, bledami, czasem i sciezka podsumowania CSV
+    """
+    wsad_path = Path(wsad_path)
+    output_dir = Path(output_dir or OUTPUT_DIR)
+    output_dir.mkdir(exist_ok=True)
+    data = data or datetime.now()
+    workers = workers or os.cpu_count() or 1
+
+    with open(wsad_path, 'rb') as f:
+        partia = hashlib.sha256(f.read()).hexdigest()[:6].upper()
+    wiersze = wczytaj_wsad(wsad_path)
+    cennik = load_cennik()
+
+    start = time.perf_counter()
+    zadania = [(nr, wiersz, partia, data, output_dir) for nr, wiersz in enumerate(wiersze, 1)]
+    if workers <= 1:
+        _init_procesu(cennik, pdf)
+        wyniki = [_generuj_z_wiersza(z) for z in zadania]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_procesu, initargs=(cennik, pdf)) as pool:
+            wyniki = list(pool.map(_generuj_z_wiersza, zadania, chunksize=WSAD_CHUNK))
+    czas = time.perf_counter() - start
+
+    podsumowanie = output_dir / f"partia_{data.strftime('%Y%m%d')}_{partia}.csv"
+    bledy = []
+    with open(podsumowanie, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["wiersz", "numer_oferty", "plik", "cena_brutto", "roi_lat", "blad"])
+        for nr, numer_oferty, plik, brutto, roi in wyniki:
+            if numer_oferty is None:
+                bledy.append((nr, plik))
+                writer.writerow([nr, "", "", "", "", plik])
+            else:
+                writer.writerow([nr, numer_oferty, plik, brutto, roi, ""])
+
+    return {
+        "partia": partia,
+        "oferty": len(wyniki) - len(bledy),
+        "bledy": bledy,
+        "czas_s": czas,
+        "podsumowanie": podsumowanie
+    }
+
+
+def main_wsadowy(args) -> dict:
+    """Tryb wsadowy - oferty dla wszystkich klientow z pliku"""
+    data = datetime.strptime(args.data, "%Y-%m-%d") if args.data else None
+    if args.pdf:
+        from generator_pdf import WEASYPRINT_AVAILABLE
+        if not WEASYPRINT_AVAILABLE:
+            args.pdf = False
+            print("   (PDF pominiete - tylko HTML)\n")
+    wynik = generuj_wsadowo(Path(args.batch), args.output, args.workers, data, args.pdf)
+
+    for nr, blad in wynik['bledy']:
+        print(f"[ERROR] wiersz {nr}: {blad}")
+    tempo = wynik['oferty'] / wynik['czas_s'] if wynik['czas_s'] else 0
+    print(f"\n   Partia {wynik['partia']}: {wynik['oferty']} ofert, {len(wynik['bledy'])} bledow, "
+          f"{wynik['czas_s']:.1f} s ({tempo:,.0f} ofert/s)")
+    print(f"   Podsumowanie: {wynik['podsumowanie']}\n")
+    return wynik
+
+
 def main():
     """Glowna funkcja - interaktywny generator ofert"""
 
@@ -387,6 +731,14 @@ def main():
         okres_mc = 2
         print(f"   (uzyto wartosci: {okres_mc})")
 
+    try:
+        tg_phi = float(input(f"Wspolczynnik tg phi [domyslnie {TG_PHI_DOMYSLNY}]: ").replace(',', '.') or TG_PHI_DOMYSLNY)
+    except ValueError:
+        tg_phi = TG_PHI_DOMYSLNY
+        print(f"   (uzyto wartosci: {tg_phi})")
+
+    ma_pv = input("Czy klient ma instalacje PV? [t/n]: ").strip().lower() in TAK
+
     # METRY PRZEWODU
     print("\n" + "-" * 40)
     print("3. PARAMETRY INSTALACJI")
@@ -402,9 +754,26 @@ def main():
     print("4. KALKULACJA")
     print("-" * 40)
 
-    koszty = oblicz_koszty(cennik, metry_przewodu)
-    oszczednosci = oblicz_oszczednosci(energia_bierna, okres_mc)
-    roi = oblicz_roi(koszty['cena_klient']['brutto'], oszczednosci['kary_roczne'])
+    try:
+        dane_oferty = przygotuj_dane_oferty(
+            cennik,
+            {
+                "nazwa": klient_nazwa,
+                "adres": klient_adres,
+                "nip": klient_nip,
+                "telefon": klient_telefon
+            },
+            energia_bierna, okres_mc, metry_przewodu,
+            generuj_numer_oferty(), datetime.now(), tg_phi, ma_pv
+        )
+    except ZaDuzaMocError as e:
+        print(f"\n[ERROR] {e}")
+        return
+    koszty = dane_oferty.pop('koszty')
+    oszczednosci = dane_oferty['oszczednosci']
+    roi = dane_oferty['roi']
+
+    print(f"\n   Dobrany kompensator: {dane_oferty['kompensator']['model']} ({dane_oferty['kompensator']['moc_kvar']} kvar)")
 
     print(f"\n   --- KOSZTY (wewnetrzne, NIE pokazywac klientowi!) ---")
     print(f"   Kompensator:  {koszty['koszty']['kompensator']:>8} PLN")
@@ -426,30 +795,7 @@ def main():
     print("5. GENEROWANIE OFERTY")
     print("-" * 40)
 
-    numer_oferty = generuj_numer_oferty()
-    data_wystawienia = datetime.now().strftime("%Y-%m-%d")
-    data_waznosci = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
-
-    dane_oferty = {
-        "numer_oferty": numer_oferty,
-        "data_wystawienia": data_wystawienia,
-        "data_waznosci": data_waznosci,
-        "klient": {
-            "nazwa": klient_nazwa,
-            "adres": klient_adres,
-            "nip": klient_nip,
-            "telefon": klient_telefon
-        },
-        "analiza": {
-            "energia_bierna": energia_bierna,
-            "okres_mc": okres_mc
-        },
-        "kompensator": koszty['kompensator'],
-        "cena": koszty['cena_klient'],
-        "oszczednosci": oszczednosci,
-        "roi": roi,
-        "firma": cennik['firma']
-    }
+    numer_oferty = dane_oferty['numer_oferty']
 
     # Generuj HTML
     html = generuj_oferte_html(dane_oferty)
@@ -471,4 +817,15 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generator ofert na kompensatory mocy biernej")
+    parser.add_argument("--batch", help="Plik CSV/NDJSON z klientami - tryb wsadowy bez pytan")
+    parser.add_argument("--output", help="Folder na oferty (domyslnie oferty/)")
+    parser.add_argument("--workers", type=int, help="Liczba procesow (domyslnie liczba rdzeni)")
+    parser.add_argument("--data", help="Data wystawienia RRRR-MM-DD (domyslnie dzisiaj)")
+    parser.add_argument("--pdf", action="store_true", help="Tryb wsadowy: od razu PDF obok HTML (WeasyPrint)")
+    args = parser.parse_args()
+
+    if args.batch:
+        main_wsadowy(args)
+    else:
+        main()
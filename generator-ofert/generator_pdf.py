@@ -7,19 +7,46 @@ Alternatywnie mozna uzyc przegladarki:
 - Otworz plik HTML
 - Drukuj (Ctrl+P)
 - Zapisz jako PDF
+
+Uzycie:
+    python generator_pdf.py oferty/oferta.html    # jeden plik
+    python generator_pdf.py [--workers 4]         # oferty ze zmienionym HTML, rownolegle
+    python generator_pdf.py --bench 200           # PDF/min i pamiec workerow
 """
 
+import argparse
+import hashlib
+import json
+import os
+import resource
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 try:
-    from weasyprint import HTML, CSS
+    from weasyprint import HTML, CSS, __version__ as WEASYPRINT_VERSION
+    from weasyprint.text.fonts import FontConfiguration
     WEASYPRINT_AVAILABLE = True
 except ImportError:
     WEASYPRINT_AVAILABLE = False
     print("WeasyPrint nie jest zainstalowany.")
     print("Zainstaluj: pip install weasyprint")
     print("Lub uzyj przegladarki do zapisu PDF.\n")
+    WEASYPRINT_VERSION = None
+except OSError as e:
+    # Pakiet jest, ale brakuje bibliotek systemowych (Pango)
+    WEASYPRINT_AVAILABLE = False
+    print(f"WeasyPrint nie moze zaladowac bibliotek systemowych: {e}")
+    print("Zainstaluj Pango (np. apt install libpango-1.0-0 libpangoft2-1.0-0)")
+    print("Lub uzyj przegladarki do zapisu PDF.\n")
+    WEASYPRINT_VERSION = None
+
+# Manifest przebudowy PDF w folderze ofert (hash kazdego HTML + wersja renderera)
+MANIFEST_NAME = ".manifest_pdf.json"
+
+# Zmiana sposobu renderowania (opcje write_pdf itp.) = przebudowa wszystkich PDF
+RENDER_VERSION = 1
 
 
 def html_to_pdf(html_path: Path, pdf_path: Path = None) -> Path:
@@ -52,48 +79,330 @@ def html_to_pdf(html_path: Path, pdf_path: Path = None) -> Path:
     return pdf_path
 
 
-def konwertuj_wszystkie_oferty(oferty_dir: Path = None):
-    """Konwertuj wszystkie oferty HTML w folderze na PDF"""
+class RendererPDF:
+    """
+    Rendering PDF prosto z HTML w pamieci
+
+    Konfiguracja fontow i wspolny arkusz CSS ladowane sa raz - przy
+    tworzeniu - a pierwsze (rozgrzewkowe) renderowanie laduje fonty
+    z systemu. Kolejne oferty placa tylko za uklad strony.
+    """
+
+    def __init__(self, css: str = None, base_url: str = None):
+        """
+        Args:
+            css: Wspolny arkusz stylow (np. OFERTA_CSS) - HTML moze byc wtedy bez <style>
+            base_url: Bazowy adres dla wzglednych linkow/obrazow w HTML
+        """
+        self.css = css
+        self.font_config = FontConfiguration()
+        self.stylesheets = [CSS(string=css, font_config=self.font_config)] if css else []
+        self.base_url = base_url or str(Path(__file__).parent)
+        self.render("<p>rozgrzewka</p>")
+
+    def render(self, html: str, wspolny_css: bool = True) -> bytes:
+        """
+        PDF z tekstu HTML
+
+        Args:
+            wspolny_css: Czy dolaczyc wspolny arkusz (False - HTML ma wlasny, inny <style>)
+        """
+        return HTML(string=html, base_url=self.base_url).write_pdf(
+            stylesheets=self.stylesheets if wspolny_css else [], font_config=self.font_config
+        )
+
+
+def odklej_css(html: str, css: str):
+    """
+    HTML oferty z pliku bez osadzonego arkusza css (jak generuj_oferte_html(css=False))
+
+    Returns:
+        HTML bez <style> z css albo None, gdy plik ma inny arkusz (np. starsza oferta)
+    """
+    osadzony = "<style>\n" + css + "    </style>"
+    if osadzony not in html:
+        return None
+    return html.replace(osadzony, "<style>\n    </style>", 1)
+
+
+# Renderer procesu (rozgrzany raz na proces puli)
+_renderer = None
+
+
+def init_workera_pdf(css: str = None) -> None:
+    """Initializer procesu: rozgrzany RendererPDF na cale zycie procesu"""
+    global _renderer
+    _renderer = RendererPDF(css)
+
+
+def renderuj_pdf(html: str, pdf_path: Path = None, wspolny_css: bool = True):
+    """
+    PDF z HTML w rozgrzanym rendererze biezacego procesu
+
+    Returns:
+        Sciezka zapisanego PDF (gdy podano pdf_path) albo PDF jako bytes
+    """
+    if _renderer is None:
+        init_workera_pdf()
+    pdf = _renderer.render(html, wspolny_css)
+    if pdf_path is None:
+        return pdf
+    Path(pdf_path).write_bytes(pdf)
+    return Path(pdf_path)
+
+
+def _zadanie_pdf(zadanie: tuple) -> tuple:
+    """Jedno zadanie puli: (html albo sciezka .html, sciezka PDF) -> (pid, pamiec MB, PDF albo blad)"""
+    html, pdf_path = zadanie
+    try:
+        wspolny_css = True
+        if isinstance(html, Path):
+            # Plik oferty ma osadzony arkusz - bez niego korzystamy z raz sparsowanego
+            # arkusza procesu; inny (starszy) arkusz renderujemy tak, jak jest w pliku
+            html = html.read_text(encoding='utf-8')
+            bez_css = odklej_css(html, _renderer.css) if _renderer is not None and _renderer.css else None
+            if bez_css is None:
+                wspolny_css = False
+            else:
+                html = bez_css
+        wynik = renderuj_pdf(html, pdf_path, wspolny_css)
+    except Exception as e:
+        wynik = e
+    return os.getpid(), max_rss_mb(), wynik
+
+
+def max_rss_mb() -> float:
+    """Szczytowa pamiec biezacego procesu w MB (ru_maxrss: Linux - KB, macOS - bajty)"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+class PulaPDF:
+    """
+    Pula rozgrzanych procesow WeasyPrint
+
+    Kazdy proces raz laduje fonty i parsuje wspolny arkusz CSS
+    (RendererPDF), potem renderuje kolejne oferty z HTML w pamieci.
+    Uklad strony w WeasyPrint to czysty Python (GIL) - rownolegle
+    tylko w osobnych procesach.
+    """
+
+    def __init__(self, workers: int = None, css: str = None):
+        """
+        Args:
+            workers: Liczba procesow (domyslnie liczba rdzeni)
+            css: Wspolny arkusz stylow dla wszystkich dokumentow
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.pamiec_mb = {}
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=init_workera_pdf, initargs=(css,)
+        )
+
+    def renderuj_wiele(self, zadania: list) -> list:
+        """
+        Renderuje wiele dokumentow rownolegle
+
+        Args:
+            zadania: Lista (html albo Path do pliku .html, sciezka PDF albo None)
+
+        Returns:
+            Lista wynikow w kolejnosci zadan: sciezka PDF, bytes albo wyjatek
+        """
+        wyniki = []
+        for pid, pamiec, wynik in self._pool.map(_zadanie_pdf, zadania, chunksize=4):
+            self.pamiec_mb[pid] = max(pamiec, self.pamiec_mb.get(pid, 0))
+            wyniki.append(wynik)
+        return wyniki
 
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def wersja_renderowania() -> str:
+    """Wszystko poza trescia HTML, od czego zalezy PDF (zmiana = przebudowa wszystkich)"""
+    return f"weasyprint-{WEASYPRINT_VERSION}/render-{RENDER_VERSION}"
+
+
+def wczytaj_manifest(oferty_dir: Path) -> dict:
+    """Manifest z poprzedniego uruchomienia (pusty, gdy go nie ma albo jest uszkodzony)"""
+    try:
+        with open(oferty_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"wersja": None, "pliki": {}}
+    manifest.setdefault("pliki", {})
+    return manifest
+
+
+def zapisz_manifest(oferty_dir: Path, manifest: dict) -> None:
+    """Zapis atomowy - przerwane uruchomienie nie zostawia uszkodzonego manifestu"""
+    tmp = oferty_dir / (MANIFEST_NAME + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, oferty_dir / MANIFEST_NAME)
+
+
+def _sha256(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def zaplanuj_przebudowe(oferty_dir: Path, manifest: dict, wersja: str, force: bool = False) -> tuple:
+    """
+    Ktore oferty trzeba (prze)renderowac - jak maly system budowania
+
+    Jeden przebieg os.scandir po folderze. Hash HTML liczymy tylko, gdy
+    zmienil sie rozmiar albo mtime pliku (jak indeks gita), wiec przebieg
+    bez zmian to tylko stat kazdego pliku. PDF jest nieaktualny, gdy
+    zmienila sie tresc HTML, wersja renderera albo PDF zniknal. Gdy
+    manifestu jeszcze nie ma, PDF nowszy od HTML przyjmujemy jako aktualny
+    (pierwsze uruchomienie na starym folderze nie renderuje wszystkiego).
+
+    Returns:
+        (zadania [(html, pdf)], nowe wpisy manifestu {nazwa: wpis}, czy manifest sie zmienil)
+    """
+    stare = manifest["pliki"] if manifest.get("wersja") == wersja and not force else {}
+    # Folder sprzed manifestu: PDF nowszy od HTML uznajemy za aktualny
+    adopcja = manifest.get("wersja") is None and not force
+    pliki, zadania, zmiany = {}, [], stare is not manifest["pliki"]
+
+    with os.scandir(oferty_dir) as it:
+        wpisy = {entry.name: entry for entry in it if entry.is_file()}
+
+    for nazwa, entry in wpisy.items():
+        if not nazwa.endswith(".html"):
+            continue
+        st = entry.stat()
+        pdf_nazwa = nazwa[:-5] + ".pdf"
+        wpis = stare.get(nazwa)
+
+        if wpis is not None and wpis["mtime_ns"] == st.st_mtime_ns and wpis["size"] == st.st_size:
+            sha = wpis["sha256"]
+        else:
+            sha = _sha256(Path(entry.path))
+            zmiany = True
+
+        nowy = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": sha}
+        if pdf_nazwa in wpisy and wpis is not None and wpis["sha256"] == sha:
+            pliki[nazwa] = nowy
+        elif adopcja and pdf_nazwa in wpisy and wpisy[pdf_nazwa].stat().st_mtime_ns >= st.st_mtime_ns:
+            pliki[nazwa] = nowy
+        else:
+            zadania.append((Path(entry.path), Path(oferty_dir) / pdf_nazwa, nazwa, nowy))
+
+    zmiany = zmiany or len(pliki) + len(zadania) != len(stare)
+    return zadania, pliki, zmiany
+
+
+def konwertuj_wszystkie_oferty(oferty_dir: Path = None, workers: int = None, force: bool = False):
+    """
+    Przebuduj PDF ofert, ktorych HTML sie zmienil (rownolegle, w puli rozgrzanych procesow)
+
+    Stan trzymany w MANIFEST_NAME w folderze ofert - patrz zaplanuj_przebudowe.
+    """
     if oferty_dir is None:
         oferty_dir = Path(__file__).parent / "oferty"
+    oferty_dir = Path(oferty_dir)
 
     if not oferty_dir.exists():
         print(f"Folder nie istnieje: {oferty_dir}")
         return
 
-    html_files = list(oferty_dir.glob("*.html"))
-    if not html_files:
-        print("Brak plikow HTML do konwersji")
+    wersja = wersja_renderowania()
+    manifest = wczytaj_manifest(oferty_dir)
+    zadania, pliki, zmiany = zaplanuj_przebudowe(oferty_dir, manifest, wersja, force)
+
+    if not zadania:
+        if zmiany:
+            zapisz_manifest(oferty_dir, {"wersja": wersja, "pliki": pliki})
+        print(f"Wszystkie PDF aktualne ({len(pliki)} ofert)" if pliki else "Brak plikow HTML do konwersji")
         return
 
-    print(f"Znaleziono {len(html_files)} plikow HTML\n")
+    print(f"Do przebudowy: {len(zadania)} z {len(zadania) + len(pliki)} ofert\n")
+    if not WEASYPRINT_AVAILABLE:
+        print("WeasyPrint niedostepny - uzyj przegladarki do zapisu PDF")
+        return
 
-    for html_file in html_files:
-        pdf_file = html_file.with_suffix('.pdf')
-        if pdf_file.exists():
-            print(f"[SKIP] {html_file.name} -> juz istnieje PDF")
-            continue
+    # Pliki z generatora maja osadzony OFERTA_CSS - workery parsuja go raz (odklej_css)
+    from generator import OFERTA_CSS
+    with PulaPDF(workers, css=OFERTA_CSS) as pula:
+        wyniki = pula.renderuj_wiele([(html_file, pdf_file) for html_file, pdf_file, _, _ in zadania])
+    for (html_file, pdf_file, nazwa, wpis), wynik in zip(zadania, wyniki):
+        if isinstance(wynik, Exception):
+            # Bez wpisu w manifescie - sprobujemy ponownie przy nastepnym uruchomieniu
+            print(f"[ERROR] {html_file.name}: {wynik}")
+        else:
+            pliki[nazwa] = wpis
+            print(f"[OK] {html_file.name} -> {pdf_file.name}")
+
+    zapisz_manifest(oferty_dir, {"wersja": wersja, "pliki": pliki})
+
+
+def benchmark(ile: int, workers: int = None) -> None:
+    """
+    PDF/min i pamiec workerow na ofertach z generatora
 
-        try:
-            result = html_to_pdf(html_file, pdf_file)
-            if result:
-                print(f"[OK] {html_file.name} -> {pdf_file.name}")
-        except Exception as e:
-            print(f"[ERROR] {html_file.name}: {e}")
+    Ta sama sciezka co konwertuj_wszystkie_oferty: pliki HTML z osadzonym
+    CSS na dysku, pula ze wspolnym arkuszem (PDF nie sa zapisywane).
+    """
+    import tempfile
+    from datetime import datetime
+    from generator import OFERTA_CSS, generuj_oferte_html, load_cennik, przygotuj_dane_oferty
+
+    cennik = load_cennik()
+    with tempfile.TemporaryDirectory() as tmp:
+        pliki = []
+        for i in range(ile):
+            plik = Path(tmp) / f"oferta_{i:05d}.html"
+            plik.write_text(generuj_oferte_html(przygotuj_dane_oferty(
+                cennik, {"nazwa": f"Klient {i}", "adres": "ul. Przemyslowa 10, 40-000 Katowice", "nip": "", "telefon": ""},
+                500 + i, 2, 5, f"OF/BENCH/{i:05d}", datetime.now()
+            )), encoding='utf-8')
+            pliki.append(plik)
+
+        start = time.perf_counter()
+        with PulaPDF(workers, css=OFERTA_CSS) as pula:
+            rozgrzanie = time.perf_counter() - start
+            start = time.perf_counter()
+            wyniki = pula.renderuj_wiele([(plik, None) for plik in pliki])
+            czas = time.perf_counter() - start
+
+    bledy = [w for w in wyniki if isinstance(w, Exception)]
+    print(f"{pula.workers} workerow: {ile - len(bledy)} PDF w {czas:.1f} s = {(ile - len(bledy)) / czas * 60:,.0f} PDF/min "
+          f"(rozgrzanie puli {rozgrzanie:.1f} s, bledy: {len(bledy)})")
+    for pid, pamiec in sorted(pula.pamiec_mb.items()):
+        print(f"   worker {pid}: max RSS {pamiec:.0f} MB")
 
 
 def main():
     """Glowna funkcja"""
-    if len(sys.argv) > 1:
+    parser = argparse.ArgumentParser(description="Konwersja ofert HTML -> PDF (WeasyPrint)")
+    parser.add_argument("html", nargs="?", help="Plik HTML (bez argumentu: wszystkie oferty z oferty/)")
+    parser.add_argument("--workers", type=int, help="Liczba procesow (domyslnie liczba rdzeni)")
+    parser.add_argument("--bench", type=int, metavar="N", help="Benchmark: N ofert z plikow HTML (bez zapisu PDF)")
+    parser.add_argument("--force", action="store_true", help="Przebuduj wszystkie PDF (ignoruj manifest)")
+    args = parser.parse_args()
+
+    if args.bench:
+        if WEASYPRINT_AVAILABLE:
+            benchmark(args.bench, args.workers)
+        else:
+            print("WeasyPrint niedostepny - benchmark niemozliwy")
+    elif args.html:
         # Konwertuj konkretny plik
-        html_path = Path(sys.argv[1])
-        pdf_path = html_to_pdf(html_path)
+        pdf_path = html_to_pdf(Path(args.html))
         if pdf_path:
             print(f"PDF zapisany: {pdf_path}")
     else:
         # Konwertuj wszystkie
-        konwertuj_wszystkie_oferty()
+        konwertuj_wszystkie_oferty(workers=args.workers, force=args.force)
 
 
 if __name__ == "__main__":